@@ -1,6 +1,18 @@
 import pandas as pd
 import sys
+import os
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from cache_sources import lire_avec_cache
+from jointures import fusion_multiple, afficher_rapport
+from code_commune import (
+    depuis_dep_et_commune, filtrer_invalides, vers_code_insee
+)
+from geographie import remapper_communes
+from stockage import lire_table, ecrire_table, chemin_au_format, format_depuis_arguments
+import instrumentation
+from instrumentation import etape, instrumenter
 
 
 
@@ -31,6 +43,32 @@ BLOC_GAUCHE_ECOLO_2020 = [
     'LDVG'   # Divers Gauche
 ]
 
+# Autres blocs (2014)
+BLOC_CENTRE_2014 = ['LUDI', 'LMDM', 'LUC']
+BLOC_DROITE_2014 = ['LUMP', 'LUD', 'LDVD']
+BLOC_EXTREME_DROITE_2014 = ['LFN', 'LEXD']
+
+# Autres blocs (2020)
+BLOC_CENTRE_2020 = ['LREM', 'LMDM', 'LUDI', 'LUC', 'LDVC']
+BLOC_DROITE_2020 = ['LLR', 'LUD', 'LDVD', 'LDLF']
+BLOC_EXTREME_DROITE_2020 = ['LRN', 'LEXD']
+
+# Tous les blocs calculés en une seule passe, par année.
+# Le nom du bloc donne la colonne de sortie: 'Score_<nom>_<année>'
+BLOCS_2014 = {
+    'Bloc_Gauche': BLOC_GAUCHE_2014,
+    'Bloc_Centre': BLOC_CENTRE_2014,
+    'Bloc_Droite': BLOC_DROITE_2014,
+    'Bloc_Extreme_Droite': BLOC_EXTREME_DROITE_2014
+}
+
+BLOCS_2020 = {
+    'Gauche_Ecolo': BLOC_GAUCHE_ECOLO_2020,
+    'Centre': BLOC_CENTRE_2020,
+    'Droite': BLOC_DROITE_2020,
+    'Extreme_Droite': BLOC_EXTREME_DROITE_2020
+}
+
 # Dictionnaire des colonnes
 
 COLS_2020 = {
@@ -48,214 +86,438 @@ COLS_2014 = {
     'names': ['Tour', 'DEP', 'COM_simple', 'Bureau', 'Exprimes', 'Nuance', 'Voix']
 }
 
+# Lecture en flux du .txt 2014 (nombre de lignes par morceau, None = tout en mémoire)
+CHUNKSIZE_2014 = 1_000_000
+
+# Sources électorales: une entrée par année, décrite une fois pour toutes.
+#   path, format ('excel' ou 'csv'), encoding, sep, entete (False: pas de ligne d'en-tête,
+#   colonnes désignées par leur position)
+#   colonnes: champ standard -> nom ou position de la colonne dans le fichier.
+#     Obligatoires: 'dep', 'com_simple', 'nuance', 'voix', 'exp'.
+#     Optionnels: 'tour' (avec la clé tour), 'bureau' (niveau 'bureau')
+#   tour: valeur du tour à garder (None: pas de filtre)
+#   niveau: 'bureau' (une ligne par bureau et par liste: les exprimés de chaque bureau sont
+#     sommés) ou 'commune' (une ligne par commune et par liste: exprimés de la commune)
+#   blocs: nuances de chaque bloc (Score_<bloc>_<année>)
+#   chunksize: lecture en flux (csv uniquement)
+# Ajouter une année (2008, 2026...) = ajouter une entrée ici.
+SOURCES_ELECTIONS = {
+    2020: {
+        'path': PATH_ELEC_2020,
+        'format': 'excel',
+        'colonnes': COLS_2020,
+        'tour': None,
+        'niveau': 'commune',
+        'blocs': BLOCS_2020
+    },
+    2014: {
+        'path': PATH_ELEC_2014,
+        'format': 'csv',
+        'encoding': 'latin1',
+        'sep': ';',
+        'entete': False,
+        'colonnes': dict(zip(['tour', 'dep', 'com_simple', 'bureau', 'exp', 'nuance', 'voix'], COLS_2014['usecols'])),
+        'tour': 1,
+        'niveau': 'bureau',
+        'blocs': BLOCS_2014,
+        'chunksize': CHUNKSIZE_2014
+    }
+}
 
+CHAMPS_OBLIGATOIRES = ['dep', 'com_simple', 'nuance', 'voix', 'exp']
 
+# Nombre de processus pour charger les années (une année par processus)
+N_WORKERS_ELECTIONS = min(len(SOURCES_ELECTIONS), os.cpu_count() or 1)
 
-def process_elec_2020(path, col_map, nuance_list):
-    
-    # Charge et traite le fichier Excel 2020.
-    # Reconstruit la clé COM à 5 chiffres.
-    
-    print(f"Traitement de {path}...")
-    try:
-        df = pd.read_excel(path, dtype={
-            col_map['dep']: str, 
-            col_map['com_simple']: str
-        })
-    except FileNotFoundError:
-        print(f"ERREUR FATALE: Fichier introuvable {path}"); sys.exit()
-    except Exception as e:
-        print(f"ERREUR lors de la lecture de {path}: {e}"); sys.exit()
 
-    required_cols = list(col_map.values())
-    missing_cols = [col for col in required_cols if col not in df.columns]
-    if missing_cols:
-        print(f"ERREUR FATALE: Colonnes manquantes dans {path}: {missing_cols}")
-        print("Veuillez corriger le dictionnaire COLS_2020.")
-        sys.exit()
-        
-    print("Harmonisation de la clé COM pour 2020...")
-    df['DEP_harmonise'] = df[col_map['dep']].astype(str).str.zfill(2)
-    df['COM_simple_harmonise'] = df[col_map['com_simple']].astype(str).str.zfill(3)
-    df['COM'] = df['DEP_harmonise'] + df['COM_simple_harmonise']
-        
-    df[col_map['voix']] = pd.to_numeric(df[col_map['voix']], errors='coerce').fillna(0)
-    df[col_map['exp']] = pd.to_numeric(df[col_map['exp']], errors='coerce').fillna(0)
 
-    df['voix_bloc'] = df.apply(
-        lambda row: row[col_map['voix']] if row[col_map['nuance']] in nuance_list else 0,
-        axis=1
-    )
+
+# Moteur de scores par bloc (partagé par toutes les années)
+
+def voix_par_bloc(nuances, voix, blocs):
     
-    print("Agrégation des scores 2020 par commune...")
-    grouped = df.groupby('COM')
+    # Projette les voix de chaque ligne sur tous les blocs à la fois.
+    # Renvoie un tableau (n_lignes, n_blocs): les voix de la ligne si sa nuance
+    # appartient au bloc, 0 sinon. Une nuance peut appartenir à plusieurs blocs.
     
-    df_agg = grouped.agg(
-        Voix_Bloc=('voix_bloc', 'sum'),
-        Exprim_Total=(col_map['exp'], 'first') 
-    )
+    codes, uniques = pd.factorize(nuances)
     
-    df_agg['Score_Gauche_Ecolo_2020'] = (
-        df_agg['Voix_Bloc'] / df_agg['Exprim_Total'].replace(0, np.nan)
-    ) * 100
+    # Matrice d'appartenance (nuance x bloc). La dernière ligne (toute à False)
+    # sert aux nuances manquantes, que factorize code -1.
+    appartenance = np.zeros((len(uniques) + 1, len(blocs)), dtype=bool)
+    for j, nuance_list in enumerate(blocs.values()):
+        appartenance[:-1, j] = pd.Index(uniques).isin(nuance_list)
     
-    df_agg = df_agg.reset_index()
+    voix = np.asarray(voix, dtype='float64')
+    return np.where(appartenance[codes], voix[:, None], 0.0)
+
+
+def colonnes_voix(blocs):
+    return [f'Voix_{nom}' for nom in blocs]
+
+
+def calculer_scores(df_agg, blocs, annee):
     
-    print(f"-> Traitement de {path} terminé.")
-    return df_agg[['COM', 'Score_Gauche_Ecolo_2020']]
+    # Calcule le score (en % des exprimés) de chaque bloc à partir des colonnes
+    # 'Voix_<bloc>' et 'Exprim_Total' agrégées par commune.
+    
+    exprimes = df_agg['Exprim_Total'].replace(0, np.nan)
+    scores = {'COM': df_agg['COM']}
+    for nom, col_voix in zip(blocs, colonnes_voix(blocs)):
+        scores[f'Score_{nom}_{annee}'] = (df_agg[col_voix] / exprimes) * 100
+    
+    return pd.DataFrame(scores)
+
+
+def verifier_source(annee, spec):
+
+    # Erreurs de description d'une source (avant de lire quoi que ce soit)
+
+    manquants = [champ for champ in CHAMPS_OBLIGATOIRES if champ not in spec['colonnes']]
+    if manquants:
+        raise ValueError(f"Source {annee}: colonnes non décrites {manquants}")
+    if spec['format'] not in ('excel', 'csv'):
+        raise ValueError(f"Source {annee}: format inconnu '{spec['format']}'")
+    if spec['niveau'] not in ('bureau', 'commune'):
+        raise ValueError(f"Source {annee}: niveau inconnu '{spec['niveau']}'")
+    if spec['niveau'] == 'bureau' and 'bureau' not in spec['colonnes']:
+        raise ValueError(f"Source {annee}: niveau 'bureau' sans colonne 'bureau'")
+    if spec.get('tour') is not None and 'tour' not in spec['colonnes']:
+        raise ValueError(f"Source {annee}: filtre sur le tour sans colonne 'tour'")
+
+
+def lire_source(spec):
 
+    # Lit le fichier d'une source et renvoie une suite de morceaux (un seul sans chunksize)
+    # dont les colonnes portent les noms standard ('dep', 'com_simple', 'nuance'...).
+    # On ne lit que les colonnes décrites; codes en texte, voix en float32, nuance en catégorie.
 
-def process_elec_2014(path, col_map, nuance_list):
+    colonnes = spec['colonnes']
+    dtype = {colonnes[champ]: str for champ in ['dep', 'com_simple', 'bureau', 'tour'] if champ in colonnes}
+    dtype.update({colonnes['voix']: 'float32', colonnes['exp']: 'float32', colonnes['nuance']: 'category'})
+    renommage = {colonne: champ for champ, colonne in colonnes.items()}
+    header = 0 if spec.get('entete', True) else None
+
+    if spec['format'] == 'excel':
+        df = lire_avec_cache(
+            pd.read_excel, spec['path'], header=header, usecols=list(colonnes.values()), dtype=dtype
+        )
+        return [df.rename(columns=renommage)]
+
+    lecteur = pd.read_csv(
+        spec['path'],
+        sep=spec.get('sep', ';'),
+        encoding=spec.get('encoding'),
+        header=header,
+        usecols=list(colonnes.values()),
+        dtype=dtype,
+        chunksize=spec.get('chunksize')
+    )
+    # Sans chunksize, read_csv renvoie directement tout le fichier
+    chunks = lecteur if spec.get('chunksize') else [lecteur]
+    return (chunk.rename(columns=renommage) for chunk in chunks)
+
+
+@instrumenter
+def agreger_morceau(df, spec, annee):
     
-    # Charge et traite le fichier TXT 2014 par bureau de vote.
-    # Reconstruit la clé COM à 5 chiffres (excel mangeait des zéros)
+    # Filtre le tour d'un morceau de fichier et l'agrège:
+    # - exprimés uniques par bureau (COM, bureau, exp), ou par commune (COM, exp), sur le
+    #   code de la source (le dédoublonnage se fait avant le passage à la géographie 2020)
+    # - voix de tous les blocs par commune de la géographie 2020 (voir geographie): les voix
+    #   des communes fusionnées s'ajoutent à celles de la commune nouvelle
     
+    if spec.get('tour') is not None:
+        df = df[pd.to_numeric(df['tour'], errors='coerce') == spec['tour']]
+    if df.empty:
+        return None, None
+
+    df = df.assign(COM=depuis_dep_et_commune(df['dep'], df['com_simple']))
+    df = filtrer_invalides(df, 'COM', f'Élections {annee}')
+        
+    voix = pd.to_numeric(df['voix'], errors='coerce').fillna(0).astype('int32')
+    exprimes = pd.to_numeric(df['exp'], errors='coerce').fillna(0).astype('int32')
+
+    # Exprimés UNIQUES par bureau de vote, ou premier exprimés rencontré par commune
+    if spec['niveau'] == 'bureau':
+        df_exp = pd.DataFrame({'COM': df['COM'], 'bureau': df['bureau'], 'exp': exprimes})
+        df_exp = df_exp.drop_duplicates()
+    else:
+        df_exp = pd.DataFrame({'COM': df['COM'], 'exp': exprimes}).drop_duplicates(subset='COM')
+
+    # Voix de tous les blocs, en un seul groupby
+    df_voix = pd.DataFrame(
+        voix_par_bloc(df['nuance'], voix, spec['blocs']),
+        columns=colonnes_voix(spec['blocs']),
+        index=df.index
+    )
+    df_voix['COM'] = remapper_communes(df['COM'].to_numpy())
+    with etape('agregation_communes', lignes_entree=len(df_voix)) as mesure:
+        df_voix_blocs = df_voix.groupby('COM').sum()
+        mesure['lignes_sortie'] = len(df_voix_blocs)
     
-    print(f"Traitement de {path}...")
+    return df_exp, df_voix_blocs
+
+
+@instrumenter
+def process_election(annee, spec):
+
+    # Charge une source électorale (voir SOURCES_ELECTIONS) et calcule les scores de
+    # tous ses blocs par commune: COM, Score_<bloc>_<annee>.
+    # Avec chunksize, le fichier est lu par morceaux et agrégé au fil de l'eau:
+    # la mémoire dépend de la taille des morceaux (et du nombre de bureaux), plus de
+    # la taille du fichier.
+
+    verifier_source(annee, spec)
+    path = spec['path']
+    print(f"Traitement de {path} ({annee})...")
+    if spec.get('chunksize'):
+        print(f"Lecture en flux par morceaux de {spec['chunksize']} lignes...")
+
+    df_exp = None
+    df_voix_blocs = None
     try:
-        df = pd.read_csv(
-            path,
-            sep=';',
-            encoding='latin1',
-            header=None,
-            usecols=col_map['usecols'],
-            names=col_map['names'],
-            dtype={'DEP': str, 'COM_simple': str, 'Bureau': str, 'Tour': str}
-        )
+        for chunk in lire_source(spec):
+            exp_chunk, voix_chunk = agreger_morceau(chunk, spec, annee)
+            if exp_chunk is None:
+                continue
+            
+            if df_exp is None:
+                df_exp, df_voix_blocs = exp_chunk, voix_chunk
+            else:
+                # Un bureau (ou une commune) peut être coupé entre deux morceaux: on dédoublonne à nouveau
+                df_exp = pd.concat([df_exp, exp_chunk])
+                if spec['niveau'] == 'bureau':
+                    df_exp = df_exp.drop_duplicates()
+                else:
+                    df_exp = df_exp.drop_duplicates(subset='COM')
+                df_voix_blocs = df_voix_blocs.add(voix_chunk, fill_value=0)
     except FileNotFoundError:
         print(f"ERREUR FATALE: Fichier introuvable {path}"); sys.exit()
     except Exception as e:
         print(f"ERREUR lors de la lecture de {path}: {e}"); sys.exit()
 
-    
-    # Garder UNIQUEMENT les données du premier tour
-    df['Tour'] = pd.to_numeric(df['Tour'], errors='coerce')
-    df = df[df['Tour'] == 1].copy()
-    
-    if df.empty:
-        print("ERREUR FATALE: Le filtrage du Tour 1 n'a retourné aucune donnée.")
-        print("Vérifiez la colonne 'Tour' (index 0) dans le .txt.")
+    if df_exp is None:
+        print(f"ERREUR FATALE: Aucune donnée pour {annee} après filtrage (tour {spec.get('tour')}).")
+        print(f"Vérifiez la colonne 'tour' ({spec['colonnes'].get('tour')}) de {path}.")
         sys.exit()
-    
 
-    print("Harmonisation de la clé COM pour 2014 (Tour 1)...")
-    df['DEP_harmonise'] = df['DEP'].astype(str).str.zfill(2)
-    df['COM_simple_harmonise'] = df['COM_simple'].astype(str).str.zfill(3)
-    df['COM'] = df['DEP_harmonise'] + df['COM_simple_harmonise']
-        
-    df['Voix'] = pd.to_numeric(df['Voix'], errors='coerce').fillna(0)
-    df['Exprimes'] = pd.to_numeric(df['Exprimes'], errors='coerce').fillna(0)
+    print(f"Agrégation des scores {annee} par commune ({len(spec['blocs'])} blocs)...")
 
-    print("Agrégation des scores 2014 par commune (Logique V9 Corrigée)...")
-    
-    # 1. Obtenir les Exprimés UNIQUES par bureau de vote 
-    df_exp_par_bureau = df[['COM', 'Bureau', 'Exprimes']].drop_duplicates()
+    # Sommer les Exprimés de TOUS les bureaux d'une commune (et des communes fusionnées
+    # dans une même commune de 2020)
+    with etape('agregation_communes', lignes_entree=len(df_exp)) as mesure:
+        df_exp = df_exp.assign(COM=remapper_communes(df_exp['COM'].to_numpy()))
+        df_exp_total = df_exp.groupby('COM')['exp'].sum()
+        mesure['lignes_sortie'] = len(df_exp_total)
+
+    # Aligner les voix des blocs sur les exprimés et calculer les scores
+    df_agg = df_voix_blocs.reindex(df_exp_total.index, fill_value=0)
+    df_agg['Exprim_Total'] = df_exp_total
+    df_agg = df_agg.reset_index()
+
+    df_scores = calculer_scores(df_agg, spec['blocs'], annee)
+
+    print(f"-> Traitement de {path} terminé.")
+    return df_scores
+
+
+def process_elec_2020(path, col_map, blocs):
     
-    # 2. Sommer les Exprimés de TOUS les bureaux d'une commune
-    df_exp_total = df_exp_par_bureau.groupby('COM')['Exprimes'].sum().reset_index()
-    df_exp_total = df_exp_total.rename(columns={'Exprimes': 'Exprim_Total'})
-
-    # 3. Calculer les Voix du Bloc (sur T1 uniquement)
-    df_bloc = df[df['Nuance'].isin(nuance_list)]
-    df_voix_bloc = df_bloc.groupby('COM')['Voix'].sum().reset_index()
-    df_voix_bloc = df_voix_bloc.rename(columns={'Voix': 'Voix_Bloc'})
+    # Fichier Excel 2020 (une ligne par commune et par liste), voir SOURCES_ELECTIONS
     
-    # 4. Fusionner les deux et calculer le score
-    df_agg = pd.merge(df_exp_total, df_voix_bloc, on='COM', how='left')
-    df_agg['Voix_Bloc'] = df_agg['Voix_Bloc'].fillna(0)
+    spec = dict(SOURCES_ELECTIONS[2020], path=path, colonnes=col_map, blocs=blocs)
+    return process_election(2020, spec)
+
+
+def process_elec_2014(path, col_map, blocs, chunksize=None):
     
-    df_agg['Score_Bloc_Gauche_2014'] = (
-        df_agg['Voix_Bloc'] / df_agg['Exprim_Total'].replace(0, np.nan)
-    ) * 100
+    # Fichier TXT 2014 par bureau de vote (col_map au format de COLS_2014), voir SOURCES_ELECTIONS
     
-    print(f"-> Traitement de {path} terminé.")
-    return df_agg[['COM', 'Score_Bloc_Gauche_2014']]
+    colonnes = dict(zip(['tour', 'dep', 'com_simple', 'bureau', 'exp', 'nuance', 'voix'], col_map['usecols']))
+    spec = dict(SOURCES_ELECTIONS[2014], path=path, colonnes=colonnes, blocs=blocs, chunksize=chunksize)
+    return process_election(2014, spec)
+
+
+def table_longue(annee, df_scores, blocs):
+
+    # Scores larges (COM, Score_<bloc>_<annee>) -> lignes (COM, Annee, Bloc, Score)
+
+    n = len(df_scores)
+    return pd.DataFrame({
+        'COM': np.tile(df_scores['COM'].to_numpy(), len(blocs)),
+        'Annee': np.full(n * len(blocs), annee, dtype='int16'),
+        'Bloc': np.repeat(list(blocs), n),
+        'Score': np.concatenate([df_scores[f'Score_{nom}_{annee}'].to_numpy() for nom in blocs])
+    })
+
+
+def scores_larges(table, annee, blocs):
+
+    # Inverse de table_longue pour une année: COM, Score_<bloc>_<annee> (ordre des blocs de la source)
+
+    df = table[table['Annee'] == annee].pivot(index='COM', columns='Bloc', values='Score')
+    df = df[list(blocs)]
+    df.columns = [f'Score_{nom}_{annee}' for nom in blocs]
+    return df.reset_index().rename_axis(columns=None)
+
+
+@instrumenter
+def charger_elections(sources=None, n_workers=N_WORKERS_ELECTIONS):
+
+    # Charge toutes les années de 'sources' (par défaut SOURCES_ELECTIONS), une année par
+    # processus, et renvoie une seule table commune x année x bloc:
+    # COM (int32), Annee (int16), Bloc (catégorie), Score (% des exprimés)
+
+    sources = SOURCES_ELECTIONS if sources is None else sources
+    for annee, spec in sources.items():
+        verifier_source(annee, spec)
+
+    if n_workers > 1 and len(sources) > 1:
+        print(f"Chargement parallèle de {len(sources)} élections ({n_workers} processus)...")
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {
+                annee: executor.submit(
+                    instrumentation.appel_instrumente, process_election, annee, spec,
+                    memoire=instrumentation.memoire_suivie()
+                )
+                for annee, spec in sources.items()
+            }
+            scores = {}
+            for annee, future in futures.items():
+                scores[annee], etapes = future.result()
+                instrumentation.ajouter_etapes(etapes)
+    else:
+        scores = {annee: process_election(annee, spec) for annee, spec in sources.items()}
+
+    table = pd.concat(
+        [table_longue(annee, scores[annee], spec['blocs']) for annee, spec in sources.items()],
+        ignore_index=True
+    )
+    table['Bloc'] = table['Bloc'].astype('category')
+    return table
 
 
 # pipeline
 
-def main():
-    print("DÉBUT DU SCRIPT D'AJOUT DES DONNÉES ÉLECTORALES")
+@instrumenter
+def charger_regresseurs(input_x_file):
     
-    # Étape 1: Charger les régresseurs X
-    print(f"Chargement des régresseurs X depuis {INPUT_X_FILE}...")
+    # Lit le fichier X écrit par calcul_deltas_et_NaN.py (CSV à la virgule, ou feather/parquet)
+    
+    print(f"Chargement des régresseurs X depuis {input_x_file}...")
     try:
-        df_model = pd.read_csv(
-            INPUT_X_FILE, 
-            sep=';', 
-            decimal=',', 
-            dtype={'COM': str}
-        )
+        df_model = lire_table(input_x_file)
     except FileNotFoundError:
-        print(f"ERREUR FATALE: Fichier '{INPUT_X_FILE}' introuvable.")
+        print(f"ERREUR FATALE: Fichier '{input_x_file}' introuvable.")
         print("Veuillez d'abord exécuter le script 'clean_and_transform_data.py'.")
         sys.exit()
         
-    df_model['COM'] = df_model['COM'].astype(str).str.zfill(5)
     print(f"-> Fichier X chargé et harmonisé: {df_model.shape[0]} communes.")
-
-    # Étape 2: Traiter les données électorales
-    df_y_2020 = process_elec_2020(
-        PATH_ELEC_2020, 
-        COLS_2020, 
-        BLOC_GAUCHE_ECOLO_2020 
-    )
     
-    df_x_2014 = process_elec_2014(
-        PATH_ELEC_2014, 
-        COLS_2014, 
-        BLOC_GAUCHE_2014
-    )
+    return df_model
 
-    # Étape 3: Fusionner Y et X_contrôle avec les régresseurs
+
+def fusionner_elections(df_model, sources):
+    
+    # Étapes 2 à 4 avec pandas. Renvoie le DataFrame final.
+    
+    # Étape 2: Traiter les données électorales (toutes les années de SOURCES_ELECTIONS)
+    table_elections = charger_elections(sources)
+    scores = {
+        annee: scores_larges(table_elections, annee, spec['blocs'])
+        for annee, spec in sources.items()
+    }
+
+    # Étape 3: Fusionner Y (2020) et X_contrôle (2014) avec les régresseurs
     print("\nFusion des données électorales avec les régresseurs...")
     
-    print(f"Clés 2020 (aperçu): {df_y_2020['COM'].head().tolist()}")
-    print(f"Clés 2014 (aperçu): {df_x_2014['COM'].head().tolist()}")
-    print(f"Clés Régresseurs (aperçu): {df_model['COM'].head().tolist()}")
+    for annee, df_scores in scores.items():
+        print(f"Clés {annee} (aperçu): {vers_code_insee(df_scores['COM'].head()).tolist()}")
+    print(f"Clés Régresseurs (aperçu): {vers_code_insee(df_model['COM'].head()).tolist()}")
     
-    df_final = pd.merge(
-        df_model, 
-        df_y_2020, 
-        on='COM', 
-        how='inner' 
-    )
-    print(f"-> Après fusion Y (2020): {df_final.shape[0]} communes restantes.")
+    with etape('fusion_elections', lignes_entree=len(df_model)) as mesure:
+        try:
+            df_final, rapport = fusion_multiple(
+                [df_model] + list(scores.values()),
+                'COM',
+                ['Régresseurs X'] + [f'Élections {annee}' for annee in scores]
+            )
+        except (KeyError, ValueError) as e:
+            print(f"ERREUR FATALE: {e}")
+            sys.exit()
+        mesure['lignes_sortie'] = len(df_final)
+        mesure['details'] = rapport
     
-    df_final = pd.merge(
-        df_final, 
-        df_x_2014, 
-        on='COM', 
-        how='inner' 
-    )
-    print(f"-> Après fusion X (2014): {df_final.shape[0]} communes restantes.")
+    afficher_rapport(rapport)
+    print(f"-> Après fusion Y (2020) et X (2014): {df_final.shape[0]} communes restantes.")
 
     # Étape 4: Nettoyage final
     nb_avant = len(df_final)
-    df_final = df_final.dropna()
+    with etape('dropna', lignes_entree=nb_avant) as mesure:
+        df_final = df_final.dropna()
+        mesure['lignes_sortie'] = len(df_final)
     nb_apres = len(df_final)
     print(f"Nettoyage final des NaN: {nb_avant - nb_apres} lignes supprimées.")
+    
+    return df_final
+
+
+@instrumenter
+def ajouter_donnees_electorales(df_model, output_file=None, sources=None, backend=None):
+    
+    # Ajoute les scores électoraux 2020 (Y) et 2014 (X de contrôle) aux régresseurs.
+    # df_model: DataFrame des régresseurs (clé COM entière), lu depuis le CSV
+    # ou reçu directement de clean_and_transform().
+    # output_file: écriture optionnelle du résultat en CSV.
+    # sources: années à ajouter (par défaut SOURCES_ELECTIONS).
+    # Renvoie le DataFrame final, prêt pour la régression.
+    
+    # Étapes 2 à 4: scores de toutes les années, fusion avec les régresseurs, dropna
+    # backend: 'pandas' ou 'polars' (None: moteur_polars.BACKEND)
+    # (moteur_polars importé ici: il importe ce module, pas d'import circulaire au chargement)
+    import moteur_polars
+    sources = SOURCES_ELECTIONS if sources is None else sources
+    if moteur_polars.choisir_backend(backend) == 'polars':
+        print("Moteur Polars: élections, fusion et nettoyage en un seul plan...")
+        df_final = moteur_polars.collecter(
+            moteur_polars.plan_elections(moteur_polars.depuis_pandas(df_model), sources), 'fusion_elections'
+        )
+        print(f"-> Après fusion et nettoyage: {df_final.shape[0]} communes restantes.")
+    else:
+        df_final = fusionner_elections(df_model, sources)
 
     if df_final.empty:
         print("ERREUR FATALE: Le DataFrame final est vide après fusion.")
         sys.exit()
 
-    # Étape 5: Sauvegarde
-    df_final.to_csv(
-        OUTPUT_FINAL_FILE, 
-        index=False, 
-        sep=';', 
-        decimal=','
-    )
+    # Étape 5: Sauvegarde (optionnelle)
+    if output_file is not None:
+        # CSV, feather ou parquet selon l'extension (voir stockage)
+        ecrire_table(df_final, output_file)
+        print(f"Le fichier '{output_file}' est prêt pour l'analyse.")
     
     print(f"\n--- PIPELINE TERMINÉ ---")
-    print(f"Le fichier '{OUTPUT_FINAL_FILE}' est prêt pour l'analyse.")
     print(f"Taille finale: {df_final.shape[0]} communes, {df_final.shape[1]} variables.")
     print("\nAperçu des données finales:")
     print(df_final.head())
     print("\nVariables prêtes pour la régression:")
     print(df_final.columns.tolist())
+    
+    return df_final
+
+
+def main(input_x_file=INPUT_X_FILE, output_file=OUTPUT_FINAL_FILE):
+    print("DÉBUT DU SCRIPT D'AJOUT DES DONNÉES ÉLECTORALES")
+    
+    # Étape 1: Charger les régresseurs X
+    df_model = charger_regresseurs(input_x_file)
+    
+    return ajouter_donnees_electorales(df_model, output_file)
 
 # exécution du script
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # python agregation_resultats_elec.py [--feather | --parquet]
+    instrumentation.demarrer_rapport()
+    main(output_file=chemin_au_format(OUTPUT_FINAL_FILE, format_depuis_arguments(sys.argv)))
+    instrumentation.ecrire_rapport()
\ No newline at end of file
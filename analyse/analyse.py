@@ -1,8 +1,640 @@
-# BUT: analyser le 'master_data.csv' propre et tester nos hypothèses par regression lineaire
+# BUT: analyser le fichier final (data_deltas_pour_regression.csv) et tester nos hypothèses par regression lineaire
+# Moindres carrés ordinaires en NumPy (plus besoin de repasser par R ni de relire le CSV:
+# la régression part directement du DataFrame final, voir regression()).
+# Même spécification que formula_v2 dans regression.R.
+# Les matrices de plan et les estimations sont mises en cache (voir cache_modeles):
+# relancer une spécification déjà estimée sur les mêmes données est immédiat.
+# Effets fixes (département, tranche de taille): absorbés par transformation within
+# plutôt que par ~96 indicatrices, voir mco_effets_fixes().
 
-import pandas as pd
-import statsmodels.formula.api as smf #bibliothèque pour les régressions
+import math
+import re
 import sys
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import cache_modeles
+import code_commune
+from code_commune import departement, vers_code_departement
+from stockage import lire_table
+
+# Nom du fichier de données en entrée (celui créé par agregation_resultats_elec.py)
+INPUT_DATA = 'data_deltas_pour_regression.csv'
+
+# Spécification du modèle: Y et liste des X. Un X peut être transformé: 'log(P20_POP)'.
+# La constante est ajoutée automatiquement.
+# On explique Y (Score 2020) par les Deltas (X), les Stocks (X) et le Vote passé (X)
+SPEC_V2 = {
+    'y': 'Score_Gauche_Ecolo_2020',
+    'x': [
+        'Delta_Cadres',
+        'Delta_Diplomes',
+        'MED13',          # On garde que 2013 pour éviter la multicollinéarité
+        'log(P20_POP)',   # On log-transforme la population
+        'Score_Bloc_Gauche_2014'
+    ]
+}
+
+# Transformations autorisées dans les noms de variables
+TRANSFORMATIONS = {
+    'log': np.log,
+    'sqrt': np.sqrt,
+    'carre': np.square
+}
+
+# Écarts-types robustes à l'hétéroscédasticité: 'HC0', 'HC1' (HC0 corrigé des degrés de liberté) ou 'HC3'
+COV_ROBUSTE = 'HC1'
+
+CONSTANTE = 'const'
+
+# Régressions par département: en dessous de ce nombre de communes, le département
+# est signalé et non estimé
+MIN_COMMUNES_DEPARTEMENT = 30
+
+# Conditionnement de X'X au-delà duquel un département est jugé colinéaire
+CONDITIONNEMENT_MAX = 1e12
+
+# Effets fixes absorbables (et variables de cluster): nom -> colonne dont ils sont dérivés
+#   'departement': département de la commune (voir code_commune.departement)
+#   'taille': tranche de population 2020, bornes BORNES_TAILLE
+FACTEURS = {
+    'departement': 'COM',
+    'taille': 'P20_POP'
+}
+BORNES_TAILLE = [500, 2000, 10000, 50000]
+
+# Options par défaut de --effets-fixes: effets absorbés et cluster des écarts-types
+EFFETS_FIXES = ('departement',)
+CLUSTER = 'departement'
+
+# Projections alternées (plusieurs effets fixes): arrêt quand plus aucune colonne ne bouge
+# de plus de TOLERANCE_PROJECTIONS (relatif à son amplitude)
+TOLERANCE_PROJECTIONS = 1e-12
+MAX_ITERATIONS_PROJECTIONS = 10_000
+
+
+
+def charger_donnees(input_path=INPUT_DATA):
+
+    # Lit le fichier final, clé COM entière. Le .feather (voir stockage) est relu
+    # en mémoire projetée, sans parsing: à préférer au CSV pour les analyses répétées.
+
+    print(f"Chargement de {input_path}...")
+    try:
+        df = lire_table(input_path)
+    except FileNotFoundError:
+        print(f"ERREUR FATALE: Fichier '{input_path}' introuvable.")
+        print("Veuillez d'abord exécuter le script 'agregation_resultats_elec.py'.")
+        sys.exit()
+
+    print(f"-> {df.shape[0]} communes, {df.shape[1]} colonnes.")
+    return df
+
+
+def analyser_terme(terme):
+
+    # 'MED13' -> (None, 'MED13'), 'log(P20_POP)' -> ('log', 'P20_POP')
+
+    match = re.fullmatch(r'\s*(\w+)\((\w+)\)\s*', terme)
+    if match:
+        transformation, col = match.groups()
+        if transformation not in TRANSFORMATIONS:
+            raise ValueError(f"Transformation inconnue '{transformation}' dans '{terme}'.")
+        return transformation, col
+    return None, terme.strip()
+
+
+def colonne_variable(df, terme):
+
+    # 'MED13' -> df['MED13'], 'log(P20_POP)' -> np.log(df['P20_POP']) (en float64)
+
+    transformation, col = analyser_terme(terme)
+    if col not in df.columns:
+        raise KeyError(f"Colonne '{col}' absente des données (terme '{terme}').")
+
+    valeurs = df[col].to_numpy(dtype='float64')
+    if transformation is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            valeurs = TRANSFORMATIONS[transformation](valeurs)
+    return valeurs
+
+
+def colonnes_spec(spec):
+
+    # Colonnes du DataFrame lues par la spécification
+
+    return sorted({analyser_terme(terme)[1] for terme in [spec['y'], *spec['x']]})
+
+
+def cle_plan(df, spec, colonnes_en_plus=()):
+
+    # Clé de cache de la matrice de plan: données utilisées + spécification + code de ce fichier
+
+    return cache_modeles.cle_cache(
+        cache_modeles.empreinte_donnees(df, colonnes_spec(spec) + list(colonnes_en_plus)),
+        spec['y'], list(spec['x']),
+        cache_modeles.empreinte_code(__file__)
+    )
+
+
+def matrice_plan(df, spec=SPEC_V2):
+
+    # Construit (y, X, noms) à partir du DataFrame: X contient la constante en
+    # première colonne. Les lignes avec un NaN ou un inf (ex: log(0)) sont écartées,
+    # comme le fait lm() en R. Renvoie aussi le masque des lignes gardées.
+
+    noms = [CONSTANTE] + list(spec['x'])
+    X = np.empty((len(df), len(noms)), dtype='float64')
+    X[:, 0] = 1.0
+    for j, terme in enumerate(spec['x'], start=1):
+        X[:, j] = colonne_variable(df, terme)
+    y = colonne_variable(df, spec['y'])
+
+    garde = np.isfinite(y) & np.isfinite(X).all(axis=1)
+    return y[garde], X[garde], noms, garde
+
+
+def mco(y, X, noms=None, cov_robuste=COV_ROBUSTE, methode='qr', nb_absorbes=0, levier_absorbe=0.0):
+
+    # Moindres carrés ordinaires.
+    # methode='qr': X = QR, beta = R^-1 Q'y (stable numériquement)
+    # methode='cholesky': équations normales X'X = LL' (plus rapide si n est très grand,
+    # moins précis si les X sont mal conditionnés)
+    # nb_absorbes: paramètres retirés avant l'appel (effets fixes, voir mco_effets_fixes),
+    # décomptés des degrés de liberté; levier_absorbe: leur part du levier de chaque ligne
+    # (ajoutée à celui de X, pour HC3)
+    # Renvoie un dict: coefficients, écarts-types classiques et robustes, t, p-valeurs, R²...
+
+    n, k = X.shape
+    if noms is None:
+        noms = [f'x{j}' for j in range(k)]
+    if n <= k + nb_absorbes:
+        raise ValueError(f"Pas assez d'observations ({n}) pour {k + nb_absorbes} coefficients.")
+
+    if methode == 'qr':
+        Q, R = np.linalg.qr(X)
+        if np.abs(np.diag(R)).min() <= 1e-10 * np.abs(np.diag(R)).max():
+            raise ValueError("Matrice X de rang incomplet (variables colinéaires).")
+        beta = np.linalg.solve(R, Q.T @ y)
+        R_inv = np.linalg.inv(R)
+        XtX_inv = R_inv @ R_inv.T
+        levier = np.einsum('ij,ij->i', Q, Q) # diagonale de la matrice chapeau
+    elif methode == 'cholesky':
+        try:
+            L = np.linalg.cholesky(X.T @ X)
+        except np.linalg.LinAlgError:
+            raise ValueError("Matrice X de rang incomplet (variables colinéaires).")
+        beta = np.linalg.solve(L.T, np.linalg.solve(L, X.T @ y))
+        L_inv = np.linalg.inv(L)
+        XtX_inv = L_inv.T @ L_inv
+        levier = np.einsum('ij,jk,ik->i', X, XtX_inv, X)
+    else:
+        raise ValueError(f"Méthode inconnue '{methode}' (attendu: 'qr' ou 'cholesky').")
+
+    residus = y - X @ beta
+    levier = levier + levier_absorbe
+    ddl = n - k - nb_absorbes
+    scr = residus @ residus
+    sigma2 = scr / ddl
+
+    # Écarts-types classiques
+    se_classique = np.sqrt(sigma2 * np.diag(XtX_inv))
+
+    # Écarts-types robustes (sandwich): (X'X)^-1 X' diag(w e²) X (X'X)^-1
+    if cov_robuste == 'HC0':
+        poids = residus**2
+    elif cov_robuste == 'HC1':
+        poids = residus**2 * n / ddl
+    elif cov_robuste == 'HC3':
+        poids = (residus / (1 - levier))**2
+    else:
+        raise ValueError(f"Type de covariance robuste inconnu '{cov_robuste}'.")
+    sandwich = XtX_inv @ ((X * poids[:, None]).T @ X) @ XtX_inv
+    se_robuste = np.sqrt(np.diag(sandwich))
+
+    sct = ((y - y.mean())**2).sum()
+    r2 = 1 - scr / sct
+    r2_ajuste = 1 - (1 - r2) * (n - 1) / ddl
+
+    t_robuste = beta / se_robuste
+
+    return {
+        'coefficients': pd.Series(beta, index=noms),
+        'se_classique': pd.Series(se_classique, index=noms),
+        'se_robuste': pd.Series(se_robuste, index=noms),
+        't_robuste': pd.Series(t_robuste, index=noms),
+        'p_robuste': pd.Series(p_valeurs(t_robuste, ddl), index=noms),
+        'cov_robuste': cov_robuste,
+        'r2': r2,
+        'r2_ajuste': r2_ajuste,
+        'sigma': math.sqrt(sigma2),
+        'n': n,
+        'ddl': ddl,
+        'nb_absorbes': nb_absorbes
+    }
+
+
+def p_valeurs(t, ddl):
+
+    # p-valeurs bilatérales, loi de Student à 'ddl' degrés de liberté (comme summary(lm)
+    # dans regression.R; compte pour les petits échantillons, ex: un département)
+
+    return 2 * stats.t.sf(np.abs(np.atleast_1d(t)), ddl)
+
+
+def codes_facteur(df, nom):
+
+    # Code entier du groupe de chaque ligne pour le facteur 'nom' (voir FACTEURS), -1 si inconnu
+
+    if nom not in FACTEURS:
+        raise ValueError(f"Effet fixe inconnu '{nom}' (attendu: {list(FACTEURS)}).")
+    if FACTEURS[nom] not in df.columns:
+        raise KeyError(f"Colonne '{FACTEURS[nom]}' absente des données (effet fixe '{nom}').")
+
+    if nom == 'departement':
+        codes = departement(df['COM'].to_numpy())
+        codes[df['COM'].to_numpy() < 0] = -1
+        return codes
+    population = df[FACTEURS[nom]].to_numpy(dtype='float64')
+    codes = np.digitize(population, BORNES_TAILLE)
+    codes[~np.isfinite(population)] = -1
+    return codes
+
+
+def moyennes_par_groupe(M, groupes, effectifs):
+
+    # Moyenne de chaque colonne de M par groupe (groupes codés 0..G-1): une somme par bincount
+
+    return np.column_stack([
+        np.bincount(groupes, weights=M[:, j], minlength=len(effectifs)) for j in range(M.shape[1])
+    ]) / effectifs[:, None]
+
+
+def absorber(M, facteurs, tolerance=TOLERANCE_PROJECTIONS, max_iterations=MAX_ITERATIONS_PROJECTIONS):
+
+    # Transformation within: retire de chaque colonne de M ses moyennes par groupe.
+    # Un facteur: une passe, exacte. Plusieurs facteurs: projections alternées (on retire
+    # les moyennes de chaque facteur à tour de rôle) jusqu'à ce que plus rien ne bouge.
+
+    M = np.array(M, dtype='float64')
+    effectifs = [np.bincount(groupes) for groupes in facteurs]
+    amplitude = np.maximum(np.abs(M).max(axis=0), 1e-300)
+
+    for _ in range(max_iterations):
+        ecart = 0.0
+        for groupes, nb in zip(facteurs, effectifs):
+            moyennes = moyennes_par_groupe(M, groupes, nb)[groupes]
+            M -= moyennes
+            ecart = max(ecart, (np.abs(moyennes).max(axis=0) / amplitude).max())
+        if len(facteurs) == 1 or ecart <= tolerance:
+            break
+    else:
+        print(f"ATTENTION: projections alternées non convergées après {max_iterations} itérations "
+              f"(écart relatif {ecart:.2g})")
+    return M
+
+
+def nb_composantes(a, b):
+
+    # Composantes connexes du graphe biparti niveaux de a - niveaux de b (un lien par paire
+    # observée), par propagation de la plus petite étiquette
+
+    decalage = a.max() + 1
+    paires = np.unique(np.column_stack([a, b + decalage]), axis=0)
+    etiquettes = np.arange(decalage + b.max() + 1)
+    while True:
+        plus_petite = np.minimum(etiquettes[paires[:, 0]], etiquettes[paires[:, 1]])
+        nouvelles = etiquettes.copy()
+        np.minimum.at(nouvelles, paires[:, 0], plus_petite)
+        np.minimum.at(nouvelles, paires[:, 1], plus_petite)
+        nouvelles = nouvelles[nouvelles]
+        if np.array_equal(nouvelles, etiquettes):
+            return len(np.unique(etiquettes))
+        etiquettes = nouvelles
+
+
+def niveaux_absorbes(facteurs):
+
+    # Paramètres absorbés par les effets fixes (pour les degrés de liberté):
+    # G niveaux pour le premier facteur; pour chaque facteur suivant, ses niveaux moins
+    # le nombre de composantes connexes qu'il forme avec le premier (niveaux redondants).
+    # Exact pour deux facteurs, comme reghdfe.
+
+    nb = len(np.unique(facteurs[0]))
+    for groupes in facteurs[1:]:
+        nb += len(np.unique(groupes)) - nb_composantes(facteurs[0], groupes)
+    return nb
+
+
+def emboite(groupes, clusters):
+
+    # Chaque groupe est-il entièrement dans un seul cluster ? (ex: départements dans départements)
+
+    paires = np.unique(np.column_stack([groupes, clusters]), axis=0)
+    return len(paires) == len(np.unique(groupes))
+
+
+def se_clusters(X, residus, clusters, nb_absorbes=0):
+
+    # Écarts-types robustes à la corrélation intra-cluster (CR1, comme Stata/reghdfe):
+    # (X'X)^-1 (somme sur g de X_g' e_g e_g' X_g) (X'X)^-1 * G/(G-1) * (n-1)/(n-k-nb_absorbes)
+    # (nb_absorbes: effets fixes non emboîtés dans les clusters)
+    # Renvoie (écarts-types, nombre de clusters G)
+
+    n, k = X.shape
+    nb_clusters = int(clusters.max()) + 1
+    scores = np.column_stack([
+        np.bincount(clusters, weights=X[:, j] * residus, minlength=nb_clusters) for j in range(k)
+    ])
+    R_inv = np.linalg.inv(np.linalg.qr(X)[1])
+    XtX_inv = R_inv @ R_inv.T
+    correction = nb_clusters / (nb_clusters - 1) * (n - 1) / (n - k - nb_absorbes)
+    sandwich = XtX_inv @ (scores.T @ scores) @ XtX_inv * correction
+    return np.sqrt(np.diag(sandwich)), nb_clusters
+
+
+def mco_effets_fixes(df, spec=SPEC_V2, effets_fixes=EFFETS_FIXES, cluster=CLUSTER,
+                     cov_robuste=COV_ROBUSTE, methode='qr', cache=True):
+
+    # MCO avec effets fixes absorbés: y et X (sans la constante) sont centrés par groupe
+    # (absorber), puis le système réduit (k coefficients au lieu de k + ~96) est résolu par mco.
+    # Degrés de liberté: n - k - niveaux absorbés. R² 'within' (variance intra-groupes).
+    # cluster: ajoute les écarts-types par cluster (se_cluster, t_cluster, p_cluster;
+    # p-valeurs de Student à G - 1 degrés de liberté, G: nombre de clusters, comme Stata)
+    # Les lignes dont un groupe est inconnu (population manquante...) sont écartées.
+
+    y, X, noms, garde = plan(df, spec, cache)
+    facteurs = [codes_facteur(df, nom)[garde] for nom in effets_fixes]
+    clusters = codes_facteur(df, cluster)[garde] if cluster else None
+
+    valides = np.ones(len(y), dtype=bool)
+    for codes in facteurs + ([clusters] if cluster else []):
+        valides &= codes >= 0
+    y, X = y[valides], X[valides]
+    facteurs = [pd.factorize(codes[valides])[0] for codes in facteurs]
+
+    nb_absorbes = 0
+    levier_absorbe = 0.0
+    if effets_fixes:
+        # Levier (HC3): celui des indicatrices d'un seul facteur vaut 1/n_g (n_g: effectif
+        # du groupe de la ligne); avec plusieurs facteurs il n'a pas de forme simple
+        if cov_robuste == 'HC3':
+            if len(facteurs) > 1:
+                raise ValueError("HC3 indisponible avec plusieurs effets fixes absorbés "
+                                 "(levier des effets fixes inconnu): utiliser HC0 ou HC1.")
+            levier_absorbe = 1 / np.bincount(facteurs[0])[facteurs[0]]
+
+        # La constante est absorbée par les effets fixes
+        X, noms = X[:, 1:], noms[1:]
+        centre = absorber(np.column_stack([y, X]), facteurs)
+        y, X = centre[:, 0], centre[:, 1:]
+        nb_absorbes = niveaux_absorbes(facteurs)
+
+    resultats = mco(y, X, noms, cov_robuste, methode, nb_absorbes, levier_absorbe)
+    resultats['effets_fixes'] = {nom: int(codes.max()) + 1 for nom, codes in zip(effets_fixes, facteurs)}
+
+    if cluster:
+        clusters = pd.factorize(clusters[valides])[0]
+        # Effets fixes emboîtés dans les clusters: pas décomptés dans la correction (comme reghdfe)
+        nb_hors_clusters = nb_absorbes - sum(
+            int(codes.max()) + 1 for codes in facteurs if emboite(codes, clusters)
+        )
+        residus = y - X @ resultats['coefficients'].to_numpy()
+        se, nb_clusters = se_clusters(X, residus, clusters, max(nb_hors_clusters, 0))
+        t = resultats['coefficients'].to_numpy() / se
+        resultats.update({
+            'se_cluster': pd.Series(se, index=noms),
+            't_cluster': pd.Series(t, index=noms),
+            'p_cluster': pd.Series(p_valeurs(t, nb_clusters - 1), index=noms),
+            'cluster': cluster,
+            'nb_clusters': nb_clusters
+        })
+
+    return resultats
+
+
+def plan(df, spec=SPEC_V2, cache=True):
+
+    # matrice_plan, relue du cache si cache=True (voir cache_modeles)
+
+    if not cache:
+        return matrice_plan(df, spec)
+    return cache_modeles.memoiser('plan', cle_plan(df, spec), lambda: matrice_plan(df, spec))
+
+
+def regression(df, spec=SPEC_V2, cov_robuste=COV_ROBUSTE, methode='qr', cache=True,
+               effets_fixes=(), cluster=None):
+
+    # Régression de spec['y'] sur spec['x'] (+ constante) directement sur le DataFrame
+    # (celui renvoyé par ajouter_donnees_electorales ou lu par charger_donnees)
+    # cache=True: estimation et matrice de plan relues du cache si déjà calculées (voir cache_modeles)
+    # effets_fixes / cluster: facteurs de FACTEURS, voir mco_effets_fixes
+    # (ex: effets_fixes=('departement', 'taille'), cluster='departement')
+
+    effets_fixes = tuple(effets_fixes)
+
+    def estimer():
+        if effets_fixes or cluster:
+            return mco_effets_fixes(df, spec, effets_fixes, cluster, cov_robuste, methode, cache)
+        # La matrice de plan n'est construite (ou relue) que si l'estimation n'est pas en cache
+        y, X, noms, _ = plan(df, spec, cache)
+        return mco(y, X, noms, cov_robuste, methode)
+
+    if cache:
+        colonnes_facteurs = [FACTEURS[nom] for nom in (*effets_fixes, cluster) if nom in FACTEURS]
+        # (+ code de code_commune: le facteur 'departement' en dépend)
+        cle = cache_modeles.cle_cache(
+            cle_plan(df, spec, colonnes_facteurs), cov_robuste, methode, effets_fixes, cluster,
+            cache_modeles.empreinte_code(code_commune.__file__)
+        )
+        resultats = cache_modeles.memoiser('mco', cle, estimer)
+    else:
+        resultats = estimer()
+
+    nb_ecartees = len(df) - resultats['n']
+    if nb_ecartees:
+        print(f"  {nb_ecartees} lignes écartées (NaN ou inf dans les variables du modèle)")
+    resultats['spec'] = spec
+    return resultats
+
+
+def afficher_resultats(resultats):
+
+    spec = resultats['spec']
+    print(f"\nMCO: {spec['y']} ~ {' + '.join(spec['x'])}")
+    tableau = pd.DataFrame({
+        'Coef': resultats['coefficients'],
+        'SE': resultats['se_classique'],
+        f"SE {resultats['cov_robuste']}": resultats['se_robuste'],
+        't': resultats['t_robuste'],
+        'p': resultats['p_robuste']
+    })
+    if 'se_cluster' in resultats:
+        tableau[f"SE cluster {resultats['cluster']}"] = resultats['se_cluster']
+        tableau['p cluster'] = resultats['p_cluster']
+    print(tableau.to_string(float_format=lambda x: f"{x:.4g}"))
+
+    # Avec effets fixes, le R² est celui de la variance intra-groupes (within)
+    within = ' within' if resultats.get('effets_fixes') else ''
+    print(f"n = {resultats['n']}, R²{within} = {resultats['r2']:.4f}, "
+          f"R² ajusté{within} = {resultats['r2_ajuste']:.4f}, sigma = {resultats['sigma']:.4f}")
+    if resultats.get('effets_fixes'):
+        niveaux = ', '.join(f"{nom} ({nb} niveaux)" for nom, nb in resultats['effets_fixes'].items())
+        print(f"Effets fixes absorbés: {niveaux}; {resultats['nb_absorbes']} paramètres, ddl = {resultats['ddl']}")
+    if 'se_cluster' in resultats:
+        print(f"Écarts-types clusterisés par {resultats['cluster']} ({resultats['nb_clusters']} clusters)")
+
+
+def regression_par_departement(df, spec=SPEC_V2, min_communes=MIN_COMMUNES_DEPARTEMENT, cache=True,
+                               cov_robuste=COV_ROBUSTE):
+
+    # La même spécification estimée séparément dans chaque département, en un seul passage:
+    # tri unique par département, matrices X'X et X'y de tous les départements en une
+    # somme par segments (np.add.reduceat), puis résolution de tous les systèmes d'un coup.
+    # Les départements trop petits (< min_communes, ou pas plus de communes que de
+    # coefficients), à y constant (R² et t indéfinis) ou colinéaires sont signalés
+    # dans 'statut', avec des coefficients NaN.
+    # Renvoie un tableau long: une ligne par (département, variable).
+    # cache=True: tableau relu du cache si déjà calculé (voir cache_modeles)
+    # cov_robuste: 'HC0', 'HC1' ou 'HC3' (comme mco), colonne 'se_<cov_robuste>'
+
+    if cov_robuste not in ('HC0', 'HC1', 'HC3'):
+        raise ValueError(f"Type de covariance robuste inconnu '{cov_robuste}'.")
+
+    if cache:
+        return cache_modeles.memoiser(
+            'departements',
+            cache_modeles.cle_cache(
+                cle_plan(df, spec, ['COM']), min_communes, CONDITIONNEMENT_MAX, cov_robuste,
+                cache_modeles.empreinte_code(code_commune.__file__)
+            ),
+            lambda: regression_par_departement(df, spec, min_communes, cache=False, cov_robuste=cov_robuste)
+        )
+
+    y, X, noms, garde = matrice_plan(df, spec)
+    n, k = X.shape
+    deps = departement(df['COM'].to_numpy()[garde])
+
+    # Tri unique: chaque département devient un segment contigu
+    ordre = np.argsort(deps, kind='stable')
+    X, y, deps = X[ordre], y[ordre], deps[ordre]
+    debuts = np.flatnonzero(np.r_[True, deps[1:] != deps[:-1]])
+    tailles = np.diff(np.r_[debuts, n])
+    groupe = np.repeat(np.arange(len(debuts)), tailles) # numéro de segment de chaque ligne
+
+    # Matrices de Gram de tous les départements: (G, k, k) et (G, k)
+    XtX = np.add.reduceat(X[:, :, None] * X[:, None, :], debuts, axis=0)
+    Xty = np.add.reduceat(X * y[:, None], debuts, axis=0)
+
+    # Dispersion de y par département (sct = 0 à l'arrondi près: y constant)
+    moyenne_y = np.add.reduceat(y, debuts) / tailles
+    sct = np.add.reduceat((y - moyenne_y[groupe])**2, debuts)
+
+    statut = np.full(len(debuts), 'ok', dtype=object)
+    statut[tailles <= k] = 'trop_peu_de_communes'
+    statut[(tailles < min_communes) & (statut == 'ok')] = 'trop_peu_de_communes'
+    statut[(sct <= np.finfo(float).eps * np.add.reduceat(y**2, debuts)) & (statut == 'ok')] = 'y_constant'
+
+    # Mise à l'échelle D X'X D (diagonale à 1): MED13 (~20 000) et la constante n'ont pas
+    # le même ordre de grandeur, le conditionnement est mesuré et l'inversion faite sur la
+    # matrice mise à l'échelle
+    with np.errstate(divide='ignore'):
+        echelle = 1 / np.sqrt(np.diagonal(XtX, axis1=1, axis2=2))
+    XtX_reduit = XtX * echelle[:, :, None] * echelle[:, None, :]
+
+    a_tester = (statut == 'ok') & np.isfinite(echelle).all(axis=1)
+    conditionnement = np.full(len(debuts), np.inf)
+    conditionnement[a_tester] = np.linalg.cond(XtX_reduit[a_tester])
+    statut[(statut == 'ok') & ~(conditionnement < CONDITIONNEMENT_MAX)] = 'colineaire'
+    ok = statut == 'ok'
+
+    # Résolution groupée des départements estimables
+    beta = np.full((len(debuts), k), np.nan)
+    XtX_inv = np.full((len(debuts), k, k), np.nan)
+    if ok.any():
+        XtX_inv[ok] = np.linalg.inv(XtX_reduit[ok]) * echelle[ok][:, :, None] * echelle[ok][:, None, :]
+        beta[ok] = np.einsum('gij,gj->gi', XtX_inv[ok], Xty[ok])
+
+    # Résidus ligne à ligne (avec le beta du département de la ligne)
+    residus = y - np.einsum('ij,ij->i', X, beta[groupe])
+    scr = np.add.reduceat(residus**2, debuts)
+    ddl = tailles - k
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma2 = np.where(ok, scr / ddl, np.nan)
+        se_classique = np.sqrt(sigma2[:, None] * np.diagonal(XtX_inv, axis1=1, axis2=2))
+
+        # Sandwich par département: X' diag(w e²) X sommé par segments (poids w comme dans mco)
+        if cov_robuste == 'HC0':
+            poids = residus**2
+        elif cov_robuste == 'HC1':
+            poids = residus**2 * (tailles / ddl)[groupe]
+        else:
+            # Levier de chaque ligne dans son département: x_i' (X'X)^-1 x_i
+            levier = np.einsum('ij,ijk,ik->i', X, XtX_inv[groupe], X)
+            poids = (residus / (1 - levier))**2
+        ponderes = np.nan_to_num(poids)
+        viande = np.add.reduceat(X[:, :, None] * X[:, None, :] * ponderes[:, None, None], debuts, axis=0)
+        sandwich = XtX_inv @ viande @ XtX_inv
+        se_robuste = np.sqrt(np.diagonal(sandwich, axis1=1, axis2=2))
+
+        r2 = np.where(ok, 1 - scr / sct, np.nan)
+        t_robuste = beta / se_robuste
+
+    nb_signales = int((~ok).sum())
+    print(f"Régressions par département: {len(debuts)} départements, {int(ok.sum())} estimés, "
+          f"{nb_signales} signalés")
+
+    G = len(debuts)
+    return pd.DataFrame({
+        'departement': np.repeat(vers_code_departement(deps[debuts]), k),
+        'variable': np.tile(noms, G),
+        'coef': beta.ravel(),
+        'se_classique': se_classique.ravel(),
+        f'se_{cov_robuste}': se_robuste.ravel(),
+        't_robuste': t_robuste.ravel(),
+        'n': np.repeat(tailles, k),
+        'r2': np.repeat(r2, k),
+        'statut': np.repeat(statut, k)
+    })
+
+
+def main(input_path=INPUT_DATA, spec=SPEC_V2, par_departement=False, effets_fixes=(), cluster=None):
+
+    print("--- RÉGRESSION LINÉAIRE MCO ---")
+    df = charger_donnees(input_path)
+
+    # Analyse descriptive
+    print("\nSummary, analyse descriptive")
+    print(df.describe().T)
+
+    try:
+        resultats = regression(df, spec, effets_fixes=effets_fixes, cluster=cluster)
+    except (KeyError, ValueError) as e:
+        print(f"ERREUR: {e}")
+        sys.exit()
+
+    afficher_resultats(resultats)
+
+    if par_departement:
+        print("\n--- RÉGRESSIONS PAR DÉPARTEMENT ---")
+        tableau = regression_par_departement(df, spec)
+        print(tableau.pivot(index='departement', columns='variable', values='coef').to_string())
+        return resultats, tableau
+
+    return resultats
+
 
-# Nom du fichier de données en entrée (celui créé par prepare_data.py)
-INPUT_DATA = 'master_data.csv'
+if __name__ == "__main__":
+    # python analyse.py [fichier] [--departements] [--effets-fixes[=departement,taille]]
+    # (--effets-fixes seul: EFFETS_FIXES, écarts-types clusterisés par CLUSTER)
+    arguments = [a for a in sys.argv[1:] if not a.startswith('--')]
+    options = [a.split('=', 1) for a in sys.argv[1:] if a.startswith('--effets-fixes')]
+    effets_fixes = tuple(options[-1][1].split(',')) if options and len(options[-1]) == 2 else EFFETS_FIXES
+    main(
+        arguments[0] if arguments else INPUT_DATA,
+        par_departement='--departements' in sys.argv,
+        effets_fixes=effets_fixes if options else (),
+        cluster=CLUSTER if options else None
+    )
@@ -0,0 +1,202 @@
+import contextlib
+import io
+import os
+import shutil
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+import cache_sources
+import instrumentation
+import prepare_data
+import calcul_deltas_et_NaN
+import agregation_resultats_elec
+from jointures import fusion_multiple
+from generer_donnees_synthetiques import (
+    ECHELLES, DOSSIER_SORTIE, MANIFESTE, chemins_synthetiques, generer, sources_tronquees
+)
+
+# BUT: mesurer chaque étape du pipeline (temps et pic mémoire) sur les données synthétiques
+# de generer_donnees_synthetiques.py, pour voir les régressions de performance avant la production.
+#
+# Étapes mesurées: les six chargements de prepare_data (un par un, puis en parallèle),
+# la fusion INSEE, clean_and_transform, process_elec_2020, process_elec_2014
+# et la fusion finale avec les données électorales (+ dropna).
+#
+# Chaque étape est chronométrée REPETITIONS fois (on garde le meilleur temps), puis
+# relancée une fois sous tracemalloc pour le pic mémoire (tracemalloc ralentit les
+# allocations: temps et mémoire ne sont pas mesurés pendant la même exécution).
+# Par défaut le cache Parquet des sources est vidé avant chaque exécution (coût du parsing);
+# --chaud mesure au contraire les relectures depuis le cache.
+#
+# Les sources Excel sont bornées à une feuille: à 100x certaines sont tronquées (voir
+# generer_donnees_synthetiques). Elles sont listées dans la colonne 'sources_tronquees'.
+#
+# Usage: python benchmark.py [1x|10x|100x] [--chaud] [--regenerer]
+
+# PARAMETRES
+
+REPETITIONS = 3
+
+# Fichier de résultats (une ligne par étape), '{echelle}' est remplacé par l'échelle
+OUTPUT_FILE = 'benchmark_{echelle}.csv'
+
+
+
+def vider_cache():
+    shutil.rmtree(cache_sources.CACHE_DIR, ignore_errors=True)
+
+
+def executer_silencieux(fonction):
+
+    # Les scripts affichent leur progression: on la masque pendant les mesures
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fonction()
+
+
+def mesurer(nom, fonction, cache_chaud=False, memoire=True):
+
+    # Exécute fonction() (sans argument), renvoie (résultat, ligne de mesures).
+    # memoire=False: pas de pic mémoire (ex: étape qui travaille dans d'autres processus,
+    # invisibles pour tracemalloc)
+
+    print(f"Mesure de l'étape '{nom}'...")
+    if cache_chaud:
+        executer_silencieux(fonction) # remplit le cache
+
+    temps = []
+    temps_cpu = []
+    for _ in range(REPETITIONS):
+        if not cache_chaud:
+            vider_cache()
+        debut, debut_cpu = time.perf_counter(), time.process_time()
+        resultat = executer_silencieux(fonction)
+        temps.append(time.perf_counter() - debut)
+        temps_cpu.append(time.process_time() - debut_cpu)
+
+    pic = np.nan
+    if memoire:
+        if not cache_chaud:
+            vider_cache()
+        # Les étapes instrumentées remettent le pic de tracemalloc à zéro:
+        # on passe par instrumentation.etape, qui recompose le pic de ses sous-étapes
+        tracemalloc.start()
+        try:
+            with instrumentation.etape(nom) as mesure_memoire:
+                executer_silencieux(fonction)
+            pic = mesure_memoire['pic_memoire_mo']
+        finally:
+            tracemalloc.stop()
+
+    mesure = {
+        'etape': nom,
+        'secondes': min(temps),
+        'secondes_cpu': min(temps_cpu),
+        'pic_memoire_mo': pic,
+        'lignes_sortie': len(resultat)
+    }
+    print(f"  -> {mesure['secondes']:.3f} s, pic {pic:.1f} Mo, {mesure['lignes_sortie']} lignes")
+    return resultat, mesure
+
+
+def benchmark(echelle='1x', cache_chaud=False, regenerer=False):
+
+    # Mesure toutes les étapes à l'échelle demandée (données générées si absentes).
+    # Renvoie le DataFrame des mesures, aussi écrit dans OUTPUT_FILE.
+
+    dossier = os.path.join(DOSSIER_SORTIE, echelle)
+    chemins = chemins_synthetiques(dossier)
+    attendus = list(chemins.values()) + [os.path.join(dossier, MANIFESTE)]
+    if regenerer or not all(os.path.exists(path) for path in attendus):
+        generer(echelle, dossier)
+    tronquees = sources_tronquees(dossier)
+
+    # Cache propre au benchmark (vidé entre les mesures)
+    cache_sources.CACHE_DIR = os.path.join(dossier, 'cache_sources')
+
+    print(f"\n--- BENCHMARK {echelle} ({'cache chaud' if cache_chaud else 'cache froid'}) ---")
+    mesures = []
+
+    # Étape 1: chargements de prepare_data, un par un puis en parallèle
+    sources = {}
+    for nom, loader in prepare_data.LOADERS.items():
+        sources[nom], mesure = mesurer(
+            nom, lambda: loader(chemins[nom]), cache_chaud
+        )
+        mesures.append(mesure)
+
+    _, mesure = mesurer(
+        'chargement_parallele',
+        lambda: pd.concat(prepare_data.load_all_sources_parallel(chemins).values()),
+        cache_chaud,
+        memoire=False
+    )
+    mesures.append(mesure)
+
+    # Étape 2: fusion INSEE et deltas
+    master_df, mesure = mesurer(
+        'fusion_insee',
+        lambda: fusion_multiple(list(sources.values()), prepare_data.COLS['key_final'])[0],
+        cache_chaud
+    )
+    mesures.append(mesure)
+
+    df_model, mesure = mesurer(
+        'clean_and_transform',
+        lambda: calcul_deltas_et_NaN.clean_and_transform(master_df),
+        cache_chaud
+    )
+    mesures.append(mesure)
+
+    # Étape 3: données électorales et fusion finale
+    df_y_2020, mesure = mesurer(
+        'process_elec_2020',
+        lambda: agregation_resultats_elec.process_elec_2020(
+            chemins['elec_2020'], agregation_resultats_elec.COLS_2020, agregation_resultats_elec.BLOCS_2020
+        ),
+        cache_chaud
+    )
+    mesures.append(mesure)
+
+    df_x_2014, mesure = mesurer(
+        'process_elec_2014',
+        lambda: agregation_resultats_elec.process_elec_2014(
+            chemins['elec_2014'], agregation_resultats_elec.COLS_2014, agregation_resultats_elec.BLOCS_2014,
+            chunksize=agregation_resultats_elec.CHUNKSIZE_2014
+        ),
+        cache_chaud
+    )
+    mesures.append(mesure)
+
+    _, mesure = mesurer(
+        'fusion_elections',
+        lambda: fusion_multiple([df_model, df_y_2020, df_x_2014], 'COM')[0].dropna(),
+        cache_chaud
+    )
+    mesures.append(mesure)
+
+    resultats = pd.DataFrame(mesures)
+    resultats.insert(0, 'echelle', echelle)
+    resultats.insert(1, 'cache', 'chaud' if cache_chaud else 'froid')
+    resultats['sources_tronquees'] = ','.join(tronquees)
+
+    output_path = OUTPUT_FILE.format(echelle=echelle)
+    resultats.to_csv(output_path, index=False, sep=';', decimal=',')
+
+    print(f"\n--- BENCHMARK TERMINÉ ({output_path}) ---")
+    print(resultats.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    if tronquees:
+        print(f"ATTENTION: sources tronquées à une feuille Excel, pas à l'échelle {echelle}: {tronquees}")
+
+    return resultats
+
+
+if __name__ == "__main__":
+    arguments = [a for a in sys.argv[1:] if not a.startswith('--')]
+    echelle = arguments[0] if arguments else '1x'
+    if echelle not in ECHELLES:
+        print(f"ERREUR: échelle inconnue '{echelle}' (attendu: {list(ECHELLES)})"); sys.exit()
+    benchmark(echelle, cache_chaud='--chaud' in sys.argv, regenerer='--regenerer' in sys.argv)
@@ -0,0 +1,96 @@
+import functools
+import hashlib
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+from cache_sources import empreinte_fichier, evincer
+from instrumentation import instrumenter
+
+# BUT: ne pas ré-estimer un modèle déjà estimé sur les mêmes données (voir analyse.py).
+# Les matrices de plan (y, X) et les résultats d'estimation sont stockés (pickle) dans CACHE_DIR.
+# Clé = empreinte des colonnes utilisées du DataFrame + spécification (+ covariance, méthode)
+# + code de analyse.py: si les données, le modèle ou le code changent, on recalcule.
+# Une variante qui ne change que la covariance repart de la matrice de plan en cache.
+# Taille bornée: les fichiers les moins récemment utilisés sont supprimés (cache_sources.evincer).
+
+# PARAMETRES
+
+# Dossier à côté de ce fichier (comme spatial.PATH_ADJACENCE), quel que soit le dossier courant
+CACHE_DIR = os.environ.get(
+    'CACHE_MODELES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_modeles')
+)
+
+# Taille maximale du cache (en octets)
+CACHE_MAX_OCTETS = 256 * 1024**2
+
+
+
+def empreinte_donnees(df, colonnes):
+
+    # sha256 des 'colonnes' de df (noms, types et valeurs, dans l'ordre des lignes).
+    # Les autres colonnes n'entrent pas dans l'empreinte: en ajouter une ne vide pas le cache.
+    # Les colonnes absentes sont ignorées (l'erreur viendra de la construction du modèle).
+
+    colonnes = [col for col in colonnes if col in df.columns]
+    h = hashlib.sha256()
+    h.update(repr([(col, str(df[col].dtype)) for col in colonnes]).encode())
+    h.update(pd.util.hash_pandas_object(df[colonnes], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def empreinte_code(path):
+
+    # sha256 d'un script, calculé une fois par processus
+
+    return empreinte_fichier(path)
+
+
+def cle_cache(*parties):
+
+    # Clé = parties (repr) + version de NumPy
+
+    h = hashlib.sha256()
+    for partie in parties:
+        h.update(repr(partie).encode())
+        h.update(b'\0')
+    h.update(np.__version__.encode())
+    return h.hexdigest()
+
+
+@instrumenter
+def memoiser(categorie, cle, calculer):
+
+    # Renvoie le résultat en cache pour 'cle', ou calculer() (mis en cache).
+    # Une exception de calculer() est propagée et rien n'est écrit.
+
+    chemin_cache = os.path.join(CACHE_DIR, f"{categorie}_{cle}.pkl")
+
+    if os.path.exists(chemin_cache):
+        try:
+            with open(chemin_cache, 'rb') as f:
+                resultat = pickle.load(f)
+            os.utime(chemin_cache) # marque le fichier comme récemment utilisé
+            print(f"  (cache) {categorie}")
+            return resultat
+        except Exception as e:
+            print(f"ATTENTION: cache illisible pour {categorie}, nouveau calcul ({e})")
+
+    resultat = calculer()
+
+    # Écriture dans un fichier temporaire puis renommage (voir cache_sources)
+    chemin_tmp = f"{chemin_cache}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(chemin_tmp, 'wb') as f:
+            pickle.dump(resultat, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(chemin_tmp, chemin_cache)
+        evincer(CACHE_DIR, CACHE_MAX_OCTETS)
+    except Exception as e:
+        print(f"ATTENTION: {categorie} non mis en cache ({e})")
+        if os.path.exists(chemin_tmp):
+            os.remove(chemin_tmp)
+
+    return resultat
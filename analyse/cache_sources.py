@@ -0,0 +1,108 @@
+import hashlib
+import os
+import pandas as pd
+
+from instrumentation import instrumenter
+
+# BUT: éviter de re-parser les fichiers sources lents (Excel surtout) à chaque exécution.
+# Chaque source lue est stockée en Parquet (colonnes typées) dans CACHE_DIR.
+# La clé combine le contenu du fichier (sha256), le lecteur et ses arguments:
+# si le fichier ou les arguments changent, la clé change et on relit la source.
+
+# PARAMETRES
+
+# Dossier à côté de ce fichier (comme cache_modeles.CACHE_DIR), quel que soit le dossier courant
+CACHE_DIR = os.environ.get(
+    'CACHE_SOURCES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_sources')
+)
+
+# Taille maximale du cache (en octets). Au-delà, on supprime les fichiers
+# les moins récemment utilisés.
+CACHE_MAX_OCTETS = 2 * 1024**3
+
+TAILLE_BLOC_HASH = 1024**2
+
+
+
+def empreinte_fichier(path):
+
+    # sha256 du contenu du fichier, lu par blocs (pas de chargement complet en mémoire)
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloc in iter(lambda: f.read(TAILLE_BLOC_HASH), b''):
+            h.update(bloc)
+    return h.hexdigest()
+
+
+def cle_cache(lecteur, path, kwargs):
+
+    # Clé = contenu du fichier + lecteur + arguments du lecteur + version de pandas
+
+    h = hashlib.sha256()
+    h.update(empreinte_fichier(path).encode())
+    h.update(f"{lecteur.__module__}.{lecteur.__qualname__}".encode())
+    h.update(repr(sorted(kwargs.items())).encode())
+    h.update(pd.__version__.encode())
+    return h.hexdigest()
+
+
+def evincer(cache_dir=CACHE_DIR, max_octets=CACHE_MAX_OCTETS):
+
+    # Supprime les fichiers les moins récemment utilisés (mtime, mis à jour
+    # à chaque lecture) jusqu'à repasser sous max_octets.
+
+    if not os.path.isdir(cache_dir):
+        return
+
+    fichiers = []
+    for nom in os.listdir(cache_dir):
+        chemin = os.path.join(cache_dir, nom)
+        if os.path.isfile(chemin):
+            stat = os.stat(chemin)
+            fichiers.append((stat.st_mtime, stat.st_size, chemin))
+
+    total = sum(taille for _, taille, _ in fichiers)
+    for _, taille, chemin in sorted(fichiers):
+        if total <= max_octets:
+            break
+        os.remove(chemin)
+        total -= taille
+
+
+@instrumenter
+def lire_avec_cache(lecteur, path, **kwargs):
+
+    # Remplace un appel lecteur(path, **kwargs) (pd.read_excel, pd.read_csv...).
+    # Exécution "à chaud": relecture du Parquet, sans parser la source.
+    # FileNotFoundError est propagée comme avec le lecteur d'origine.
+
+    cle = cle_cache(lecteur, path, kwargs)
+    chemin_cache = os.path.join(CACHE_DIR, f"{cle}.parquet")
+
+    if os.path.exists(chemin_cache):
+        try:
+            df = pd.read_parquet(chemin_cache)
+            os.utime(chemin_cache) # marque le fichier comme récemment utilisé
+            print(f"  (cache) {path}")
+            return df
+        except Exception as e:
+            print(f"ATTENTION: cache illisible pour {path}, relecture de la source ({e})")
+
+    df = lecteur(path, **kwargs)
+
+    # Écriture dans un fichier temporaire puis renommage: pas de Parquet
+    # à moitié écrit si le script est interrompu
+    chemin_tmp = f"{chemin_cache}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_parquet(chemin_tmp)
+        os.replace(chemin_tmp, chemin_cache)
+        evincer(CACHE_DIR)
+    except Exception as e:
+        # pyarrow absent, colonne de types mélangés... : on continue sans cache
+        print(f"ATTENTION: {path} non mis en cache ({e})")
+        if os.path.exists(chemin_tmp):
+            os.remove(chemin_tmp)
+
+    return df
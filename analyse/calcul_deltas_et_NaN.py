@@ -2,6 +2,10 @@ import pandas as pd
 import numpy as np #
 import sys
 
+from stockage import lire_table, ecrire_table, chemin_au_format, format_depuis_arguments
+import instrumentation
+from instrumentation import etape, instrumenter
+
 # on va gérer les NaN et les inf (transforme les inf en NaN, puis solution radicale dropna() ) et calculer les deltas
 # cause des NaN et inf: secret statistique, divisions par zéro..
 
@@ -10,32 +14,45 @@ import sys
 INPUT_FILE = 'master_data_fusionne.csv'
 OUTPUT_FILE = 'master_data_pret_pour_analyse.csv'
 
+# Variables "Delta": nom -> spécification
+#   variable: préfixe des colonnes du fichier fusionné, une par année ('ratio_cadres_20', 'ratio_cadres_14')
+#   annees: (année récente, année ancienne), suffixes des colonnes
+#   type: 'difference' (x_t - x_t0, en points de % pour les ratios),
+#         'log_difference' (log x_t - log x_t0), 'taux' (croissance en %: (x_t / x_t0 - 1) * 100)
+# Ajouter un indicateur INSEE = ajouter une entrée ici (les colonnes doivent exister dans le fichier fusionné)
+SPECS_DELTAS = {
+    'Delta_Cadres': {'variable': 'ratio_cadres', 'annees': ('20', '14'), 'type': 'difference'},   # Notre variable "choc" #1
+    'Delta_Diplomes': {'variable': 'ratio_sup', 'annees': ('20', '14'), 'type': 'difference'}     # Notre variable "choc" #2
+}
+
 # Colonnes à garder pour l'analyse finale (nos variables 'X')
 # On y ajoute la variable Y (le score électoral) plus tard
 FINAL_COLS = [
     'COM',
     'P20_POP',           # Population 2020 (comme variable de contrôle)
-    'Delta_Cadres',      # Notre variable "choc" #1
-    'Delta_Diplomes',    # Notre variable "choc" #2
+    *SPECS_DELTAS,       # Les variables "Delta"
     'MED19',             # Revenu 2019 (variable de "stock")
     'MED13'              # Revenu 2013 (variable de "stock")
 ]
 
+# Opérations de delta, appliquées à des blocs (lignes x deltas du même type)
+OPERATIONS_DELTA = {
+    'difference': lambda recent, ancien: recent - ancien,
+    'log_difference': lambda recent, ancien: np.log(recent) - np.log(ancien),
+    'taux': lambda recent, ancien: (recent / ancien - 1) * 100
+}
 
 
-def clean_and_transform(input_path, output_path):
-    print(f"--- DÉBUT DU NETTOYAGE ET DE LA TRANSFORMATION ---")
+
+@instrumenter
+def charger_fichier_fusionne(input_path):
+    
+    # Lit le fichier écrit par prepare_data.py (CSV à la virgule, ou feather/parquet,
+    # voir stockage). Clé commune entière (voir code_commune), remise au format texte à la sauvegarde
     
-    # Étape 1: Charger le fichier fusionné
     print(f"Chargement de {input_path}...")
     try:
-        # On lit le fichier en spécifiant les formats de la sauvegarde précédente
-        df = pd.read_csv(
-            input_path, 
-            sep=';', 
-            decimal=',',
-            dtype={'COM': str} # Garder le code COM en string
-        )
+        df = lire_table(input_path)
     except FileNotFoundError:
         print(f"ERREUR FATALE: Fichier '{input_path}' introuvable.")
         print("Vérifiez que le script V3 a bien fonctionné.")
@@ -45,65 +62,158 @@ def clean_and_transform(input_path, output_path):
         sys.exit()
 
     print(f"Fichier chargé. {df.shape[0]} lignes et {df.shape[1]} colonnes.")
+    
+    return df
+
+
+def colonnes_delta(spec):
 
+    # (colonne récente, colonne ancienne) d'une spécification de SPECS_DELTAS
+
+    return tuple(f"{spec['variable']}_{annee}" for annee in spec['annees'])
+
+
+def verifier_specs(specs):
+
+    for nom, spec in specs.items():
+        if spec['type'] not in OPERATIONS_DELTA:
+            raise ValueError(f"Delta '{nom}': type inconnu '{spec['type']}' (attendu: {list(OPERATIONS_DELTA)})")
+        if len(spec['annees']) != 2:
+            raise ValueError(f"Delta '{nom}': il faut deux années (récente, ancienne)")
+
+
+def calculer_deltas(df, specs=SPECS_DELTAS, colonnes=FINAL_COLS):
+    
+    # Étapes 2 à 4 avec pandas. Renvoie le DataFrame nettoyé (colonnes 'colonnes').
+    # Tous les deltas sont calculés dans un seul bloc NumPy (lignes x deltas), et le masque
+    # des lignes complètes (ni NaN ni inf) est construit dans la même passe: df n'est pas
+    # modifié, et seules les lignes gardées sont recopiées, une fois, à la fin.
+    
     # Étape 2: Calculer les variables "Delta"
-    print("Calcul des variables 'Delta'...")
-    # Delta en points de pourcentage (ex: 25% - 20% = 5 points)
-    df['Delta_Cadres'] = df['ratio_cadres_20'] - df['ratio_cadres_14']
-    df['Delta_Diplomes'] = df['ratio_sup_20'] - df['ratio_sup_14']
+    print(f"Calcul des variables 'Delta' ({len(specs)})...")
+    noms = list(specs)
+    try:
+        verifier_specs(specs)
+        paires = {nom: colonnes_delta(spec) for nom, spec in specs.items()}
+        requises = [col for nom in noms for col in paires[nom]] + [col for col in colonnes if col not in specs]
+        manquantes = [col for col in requises if col not in df.columns]
+        if manquantes:
+            raise KeyError(manquantes)
+    except (KeyError, ValueError) as e:
+        print(f"ERREUR: Une colonne manque dans le fichier fusionné (ou delta mal décrit): {e}")
+        print("Vérifiez les noms dans SPECS_DELTAS et FINAL_COLS.")
+        sys.exit()
+
+    # Bloc (lignes x deltas), en float64
+    recent = np.empty((len(df), len(noms)))
+    ancien = np.empty((len(df), len(noms)))
+    for j, nom in enumerate(noms):
+        recent[:, j] = df[paires[nom][0]].to_numpy(dtype='float64', na_value=np.nan)
+        ancien[:, j] = df[paires[nom][1]].to_numpy(dtype='float64', na_value=np.nan)
+
+    # Une opération par type, sur toutes les colonnes de ce type à la fois
+    # (log de 0 ou division par 0: -inf / inf / NaN, écartés par le masque)
+    deltas = np.empty_like(recent)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for type_delta, operation in OPERATIONS_DELTA.items():
+            idx = [j for j, nom in enumerate(noms) if specs[nom]['type'] == type_delta]
+            if idx:
+                deltas[:, idx] = operation(recent[:, idx], ancien[:, idx])
     
     # (Rappel: on ne calcule pas de delta pour le revenu: à cause de la crise des gilets jaunes, l'INSEE prévient qu'elle a 
     # sous estimé le revenu total (pas prise en compte de défiscalsiation des heures supp, prime exceptionnelles,... etc.)
 
-    # Étape 3: Sélectionner les colonnes finales pour l'analyse
-    print("Sélection des colonnes pour l'analyse...")
-    # S'assurer que toutes les colonnes nécessaires existent
-    try:
-        df_model = df[FINAL_COLS]
-    except KeyError as e:
-        print(f"ERREUR: Une colonne manque dans le fichier fusionné: {e}")
-        print("Vérifiez les noms dans la liste FINAL_COLS.")
-        sys.exit()
-
-    # Étape 4: Gérer les NaN et infinis
+    # Étapes 3 et 4: colonnes finales et masque des lignes complètes, en une passe.
+    # Les 'inf' (divisions par zéro) comptent comme manquants: dropna() seul ne les supprimerait pas
     print("Inspection des données manquantes (NaN) et infinies (inf)...")
-    
-    # Remplacer les 'inf' (créés par division par zéro) par des NaN
-    # C'est crucial car dropna() ne supprime pas les 'inf' par défaut
-    df_clean = df_model.replace([np.inf, -np.inf], np.nan)
+    garde = np.ones(len(df), dtype=bool)
+    manquants = {}
+    for col in colonnes:
+        if col in specs:
+            valide = np.isfinite(deltas[:, noms.index(col)])
+        elif pd.api.types.is_float_dtype(df[col].dtype):
+            valide = np.isfinite(df[col].to_numpy(dtype='float64', na_value=np.nan))
+        else:
+            valide = df[col].notna().to_numpy()
+        manquants[col] = int((~valide).sum())
+        garde &= valide
 
     # Afficher le bilan des NaN AVANT suppression
     print("\nBilan des NaN AVANT suppression:")
-    print(df_clean.isnull().sum())
+    print(pd.Series(manquants))
     
-    nb_lignes_avant = len(df_clean)
+    nb_lignes_avant = len(df)
     print(f"\nNombre de communes avant nettoyage: {nb_lignes_avant}")
 
-    # Supprimer TOUTES les lignes où il manque AU MOINS UNE donnée
-    df_clean = df_clean.dropna()
+    # Supprimer TOUTES les lignes où il manque AU MOINS UNE donnée (une seule copie, des lignes gardées)
+    with etape('dropna', lignes_entree=nb_lignes_avant) as mesure:
+        df_clean = pd.DataFrame(
+            {
+                col: deltas[garde, noms.index(col)] if col in specs else df[col].array[garde]
+                for col in colonnes
+            },
+            index=df.index[garde]
+        )
+        mesure['lignes_sortie'] = len(df_clean)
     
     nb_lignes_apres = len(df_clean)
     print(f"Nombre de communes après nettoyage: {nb_lignes_apres}")
     print(f"-> {nb_lignes_avant - nb_lignes_apres} communes (lignes) supprimées.")
+    
+    return df_clean
+
+
+@instrumenter
+def clean_and_transform(source, output_path=None, backend=None):
+    
+    # source: chemin du fichier fusionné, ou directement le DataFrame renvoyé
+    # par prepare_data.main() (pas d'aller-retour CSV entre les étapes).
+    # output_path: écriture optionnelle du résultat en CSV.
+    # Renvoie le DataFrame nettoyé.
+    
+    print(f"--- DÉBUT DU NETTOYAGE ET DE LA TRANSFORMATION ---")
+    
+    # Étape 1: Charger le fichier fusionné (ou partir du DataFrame en mémoire)
+    # (DataFrame reçu: pas de copie, les deltas ne le modifient pas)
+    if isinstance(source, pd.DataFrame):
+        df = source
+        print(f"DataFrame reçu en mémoire. {df.shape[0]} lignes et {df.shape[1]} colonnes.")
+    else:
+        df = charger_fichier_fusionne(source)
+
+    # Étapes 2 à 4: deltas, sélection des colonnes, suppression des NaN et inf
+    # backend: 'pandas' ou 'polars' (None: moteur_polars.BACKEND)
+    # (moteur_polars importé ici: il importe ce module, pas d'import circulaire au chargement)
+    import moteur_polars
+    if moteur_polars.choisir_backend(backend) == 'polars':
+        print("Moteur Polars: deltas et nettoyage en un seul plan...")
+        df_clean = moteur_polars.collecter(
+            moteur_polars.plan_deltas(moteur_polars.depuis_pandas(df)), 'dropna'
+        )
+        print(f"Nombre de communes après nettoyage: {len(df_clean)} (sur {len(df)})")
+    else:
+        df_clean = calculer_deltas(df)
 
     if df_clean.empty:
         print("ATTENTION: Le DataFrame est vide après nettoyage. Aucun commune n'avait de données complètes.")
         sys.exit()
 
-    # Étape 5: Sauvegarder le fichier final prêt pour l'analyse
-    print(f"\nSauvegarde du fichier nettoyé dans '{output_path}'...")
-    df_clean.to_csv(
-        output_path, 
-        index=False, 
-        sep=';', 
-        decimal=','
-    )
+    # Étape 5: Sauvegarder le fichier final prêt pour l'analyse (optionnel)
+    if output_path is not None:
+        print(f"\nSauvegarde du fichier nettoyé dans '{output_path}'...")
+        # CSV, feather ou parquet selon l'extension (voir stockage)
+        ecrire_table(df_clean, output_path)
     
     print(f"--- TERMINÉ ---")
-    print(f"Le fichier est prêt pour l'analyse.")
+    print(f"Les données sont prêtes pour l'analyse.")
     print("\nAperçu des données nettoyées:")
     print(df_clean.head())
+    
+    return df_clean
 
 # --- 3. EXÉCUTION ---
 if __name__ == "__main__":
-    clean_and_transform(INPUT_FILE, OUTPUT_FILE)
\ No newline at end of file
+    # python calcul_deltas_et_NaN.py [--feather | --parquet]
+    instrumentation.demarrer_rapport()
+    clean_and_transform(INPUT_FILE, chemin_au_format(OUTPUT_FILE, format_depuis_arguments(sys.argv)))
+    instrumentation.ecrire_rapport()
\ No newline at end of file
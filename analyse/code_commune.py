@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import etape
+
+# BUT: une clé commune compacte (entier 32 bits) à la place des chaînes 'DDCCC'.
+# Toutes les agrégations et jointures se font sur cet entier, ce qui évite de
+# hacher des chaînes Python et divise la mémoire de la clé.
+#
+# Encodage: code = département * 1000 + numéro de commune
+#   - métropole: '01004' -> 1004, '75056' -> 75056
+#   - Corse (comme dans le notebook: 2A -> 201, 2B -> 202): '2A004' -> 201004
+#   - outre-mer (département sur 3 chiffres, commune sur 2): '97101' -> 971001
+# Comme dans le notebook, un département > 900 signale l'outre-mer (voir est_metropole).
+# Les codes illisibles (ex: 'ZA' des fichiers électoraux) valent CODE_INVALIDE.
+
+CODE_INVALIDE = -1
+
+DTYPE_CODE = 'int32'
+
+CORSE = {'2A': 201, '2B': 202}
+
+
+
+def _depuis_uniques(valeurs, parse_uniques):
+
+    # Les colonnes de codes ont peu de valeurs distinctes par rapport au nombre
+    # de lignes: on factorise (une passe de hachage en C), on ne décode que
+    # les valeurs uniques, puis on redistribue sur toutes les lignes.
+
+    codes, uniques = pd.factorize(pd.Series(valeurs).to_numpy(), use_na_sentinel=True)
+    decodes = np.append(parse_uniques(pd.Series(uniques)), CODE_INVALIDE)
+    return decodes[codes].astype(DTYPE_CODE) # code -1 de factorize -> dernière case (CODE_INVALIDE)
+
+
+def _parse_codes_insee(uniques):
+
+    texte = uniques.astype(str).str.strip().str.upper()
+    resultat = np.full(len(texte), CODE_INVALIDE, dtype='int64')
+
+    # Cas général: code numérique (les zéros de tête perdus ne gênent pas)
+    num = pd.to_numeric(texte, errors='coerce').to_numpy(dtype='float64')
+    ok = np.isfinite(num) & (num >= 1000) & (num < 100000) & (num == np.floor(num))
+    v = num[ok].astype('int64')
+    resultat[ok] = np.where(v >= 97000, (v // 100) * 1000 + v % 100, v)
+
+    # Corse: '2A004' / '2B033'
+    corse = texte.str.match(r'^2[AB]\d{3}$').to_numpy(dtype=bool)
+    if corse.any():
+        dep = texte[corse].str[:2].map(CORSE).to_numpy(dtype='int64')
+        com = texte[corse].str[2:].astype(int).to_numpy(dtype='int64')
+        resultat[corse] = dep * 1000 + com
+
+    return resultat
+
+
+def _parse_departements(uniques):
+
+    texte = uniques.astype(str).str.strip().str.upper()
+    dep = pd.to_numeric(texte.replace(CORSE), errors='coerce').to_numpy(dtype='float64')
+    valide = (
+        ((dep >= 1) & (dep <= 95)) | np.isin(dep, list(CORSE.values())) | ((dep >= 971) & (dep <= 989))
+    )
+    return np.where(valide, dep, CODE_INVALIDE).astype('int64')
+
+
+def _parse_numeros_commune(uniques):
+
+    com = pd.to_numeric(uniques.astype(str).str.strip(), errors='coerce').to_numpy(dtype='float64')
+    valide = np.isfinite(com) & (com >= 0) & (com <= 999)
+    return np.where(valide, com, CODE_INVALIDE).astype('int64')
+
+
+def depuis_code_insee(codes):
+
+    # Colonne de codes INSEE à 5 caractères ('01004', '2A004', '97101', ou 1004
+    # si Excel a mangé le zéro) -> tableau int32
+
+    return _depuis_uniques(codes, _parse_codes_insee)
+
+
+def depuis_dep_et_commune(departements, communes):
+
+    # Colonnes séparées (département, numéro de commune), comme dans les fichiers
+    # électoraux -> tableau int32. Outre-mer: le numéro peut contenir le dernier
+    # chiffre du département ('101' pour 97101), on garde les deux derniers chiffres.
+
+    dep = _depuis_uniques(departements, _parse_departements).astype('int64')
+    com = _depuis_uniques(communes, _parse_numeros_commune).astype('int64')
+
+    com = np.where(dep >= 970, com % 100, com)
+    code = dep * 1000 + com
+    invalide = (dep == CODE_INVALIDE) | (com == CODE_INVALIDE)
+    return np.where(invalide, CODE_INVALIDE, code).astype(DTYPE_CODE)
+
+
+def vers_code_insee(codes):
+
+    # Tableau d'entiers -> codes INSEE à 5 caractères (None pour CODE_INVALIDE)
+
+    codes = np.asarray(codes, dtype='int64')
+    dep = codes // 1000
+    com = codes % 1000
+
+    dep_txt = np.char.zfill(dep.astype(str), 2)
+    dep_txt = np.where(dep == CORSE['2A'], '2A', np.where(dep == CORSE['2B'], '2B', dep_txt))
+    com_txt = np.where(
+        dep >= 970,
+        np.char.zfill((com % 100).astype(str), 2),
+        np.char.zfill(com.astype(str), 3)
+    )
+
+    resultat = np.char.add(dep_txt, com_txt).astype(object)
+    resultat[codes == CODE_INVALIDE] = None
+    return resultat
+
+
+def departement(codes):
+
+    # Département de chaque commune (201/202 pour la Corse, 971... pour l'outre-mer)
+
+    return np.asarray(codes, dtype='int64') // 1000
+
+
+def vers_code_departement(departements):
+
+    # Numéros de département (voir departement) -> texte: 1 -> '01', 201 -> '2A', 971 -> '971'
+
+    departements = np.asarray(departements, dtype='int64')
+    texte = np.char.zfill(departements.astype(str), 2)
+    texte = np.where(departements == CORSE['2A'], '2A', np.where(departements == CORSE['2B'], '2B', texte))
+    return texte.astype(object)
+
+
+def est_metropole(codes):
+
+    return departement(codes) < 900
+
+
+def filtrer_invalides(df, col='COM', source=''):
+
+    # Supprime les lignes dont la clé n'a pas pu être décodée (et le signale)
+
+    with etape('filtre_cle', lignes_entree=len(df)) as mesure:
+        invalides = df[col].to_numpy() == CODE_INVALIDE
+        if invalides.any():
+            print(f"  ({source}) {invalides.sum()} lignes avec un code commune illisible supprimées")
+            df = df[~invalides].copy()
+        mesure['lignes_sortie'] = len(df)
+        mesure['details'] = {'source': source}
+    return df
+
+
+def formater_cle(df, col='COM'):
+
+    # Copie du DataFrame avec la clé remise au format texte INSEE (pour les CSV)
+
+    df = df.copy()
+    df[col] = vers_code_insee(df[col])
+    return df
@@ -0,0 +1,247 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from cache_sources import lire_avec_cache
+from code_commune import (
+    depuis_code_insee, depuis_dep_et_commune, filtrer_invalides, est_metropole
+)
+from stockage import ecrire_table, chemin_au_format, format_depuis_arguments
+import instrumentation
+from instrumentation import etape, instrumenter
+
+# BUT: nuance de la liste gagnante de chaque commune en 2020, en rapprochant les maires
+# élus (répertoire des élus, elus-conseillers-municipaux-cm.parquet) des têtes de liste
+# du livre des listes et candidats (livre-des-listes-et-candidats-2020.xlsb).
+#
+# Le notebook lisait tout le .xlsb (tous les candidats) avant de garder N° candidat == 1,
+# puis faisait un pd.merge sur (commune, nom, prénom) bruts: un accent ou une casse
+# différente ('Hélène' / 'HELENE') suffisait à perdre la commune.
+# Ici:
+#   - le classeur est lu ligne par ligne et seules les têtes de liste sont gardées
+#     (résultat mis en cache, voir cache_sources)
+#   - le parquet des élus n'est lu que pour les colonnes utiles, filtré sur les maires à la lecture
+#   - noms et prénoms sont normalisés une fois (sans accents, majuscules, ponctuation -> espace),
+#     sur les valeurs distinctes
+#   - la jointure se fait sur une clé entière: hachage 64 bits de (COM, nom, prénom)
+#
+# Usage: python elus_2020.py [--feather | --parquet]
+
+# PARAMETRES
+
+DOSSIER_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Data')
+PATH_ELUS_2020 = os.path.join(DOSSIER_DATA, 'elus-conseillers-municipaux-cm.parquet')
+PATH_CANDIDATS_2020 = os.path.join(DOSSIER_DATA, 'livre-des-listes-et-candidats-2020.xlsb')
+
+OUTPUT_FILE = 'nuances_gagnantes_2020.csv'
+
+# Livre des listes: deux lignes de titre avant l'en-tête (header=2 dans le notebook)
+LIGNE_ENTETE_CANDIDATS = 2
+
+COLS_CANDIDATS = {
+    'dep': 'Code du département',
+    'com_simple': 'Code commune',
+    'numero': 'N° candidat',
+    'nuance': 'Nuance Liste',
+    'nom': 'Nom candidat',
+    'prenom': 'Prénom candidat'
+}
+
+COLS_ELUS = {
+    'com': 'Code de la commune',
+    'nom': "Nom de l'élu",
+    'prenom': "Prénom de l'élu",
+    'fonction': 'Libellé de la fonction'
+}
+
+FONCTION_MAIRE = 'Maire'
+
+# Lettres sans équivalent décomposé (NFKD ne les sépare pas)
+LIGATURES = {'Œ': 'OE', 'Æ': 'AE', 'ß': 'SS'}
+
+
+
+def lignes_classeur(path):
+
+    # Lignes de la première feuille d'un classeur (.xlsb, ou .xlsx), lues en flux:
+    # une liste de valeurs par ligne, sans construire de DataFrame du classeur entier
+
+    if os.path.splitext(path)[1].lower() == '.xlsb':
+        try:
+            from pyxlsb import open_workbook
+        except ImportError as e:
+            print(f"ERREUR: pyxlsb est nécessaire pour lire {path} ({e})")
+            sys.exit()
+        with open_workbook(path) as classeur:
+            with classeur.get_sheet(1) as feuille:
+                for ligne in feuille.rows():
+                    yield [cellule.v for cellule in ligne]
+    else:
+        from openpyxl import load_workbook
+        classeur = load_workbook(path, read_only=True)
+        try:
+            for ligne in classeur.worksheets[0].iter_rows(values_only=True):
+                yield list(ligne)
+        finally:
+            classeur.close()
+
+
+def lire_tetes_de_liste(path, ligne_entete=LIGNE_ENTETE_CANDIDATS, numero=1):
+
+    # Têtes de liste du livre des listes: une ligne par liste, colonnes standard
+    # ('dep', 'com_simple', 'nuance', 'nom', 'prenom'), en texte.
+    # Le filtre sur le numéro du candidat est fait pendant la lecture.
+
+    lignes = lignes_classeur(path)
+    for _ in range(ligne_entete):
+        next(lignes)
+    entete = [str(valeur).strip() if valeur is not None else '' for valeur in next(lignes)]
+
+    manquantes = [col for col in COLS_CANDIDATS.values() if col not in entete]
+    if manquantes:
+        raise ValueError(f"Colonnes absentes de {path} (ligne d'en-tête {ligne_entete}): {manquantes}")
+    champs = [champ for champ in COLS_CANDIDATS if champ != 'numero']
+    positions = [entete.index(COLS_CANDIDATS[champ]) for champ in champs]
+    position_numero = entete.index(COLS_CANDIDATS['numero'])
+
+    # Le numéro arrive en nombre (1.0) ou en texte selon le lecteur
+    # Valeurs gardées en texte: types homogènes pour le cache Parquet
+    tetes = [
+        [None if ligne[p] is None else str(ligne[p]) for p in positions]
+        for ligne in lignes
+        if len(ligne) > position_numero and ligne[position_numero] in (numero, str(numero))
+    ]
+    return pd.DataFrame(tetes, columns=champs, dtype=object)
+
+
+def normaliser_noms(valeurs):
+
+    # 'Hélène-Marie  d'Arc' -> 'HELENE MARIE D ARC' ('' si manquant).
+    # Calculé sur les valeurs distinctes, puis redistribué sur les lignes.
+
+    codes, uniques = pd.factorize(pd.Series(valeurs).to_numpy(), use_na_sentinel=True)
+    texte = pd.Series(uniques, dtype=object).astype(str).str.upper()
+    for lettre, remplacement in LIGATURES.items():
+        texte = texte.str.replace(lettre, remplacement, regex=False)
+    # NFKD sépare les accents des lettres ('É' -> 'E' + accent), qu'on retire ensuite;
+    # tout le reste (tirets, apostrophes droites ou typographiques...) devient un espace
+    texte = (
+        texte.str.normalize('NFKD')
+        .str.replace('[\u0300-\u036f]', '', regex=True)
+        .str.replace(r'[^A-Z]+', ' ', regex=True)
+        .str.strip()
+    )
+    return np.append(texte.to_numpy(dtype=object), '')[codes] # code -1 (manquant) -> ''
+
+
+def cle_hachee(communes, noms, prenoms):
+
+    # Clé de jointure uint64: hachage de (COM, nom normalisé, prénom normalisé)
+
+    return pd.util.hash_pandas_object(
+        pd.DataFrame({'COM': communes, 'nom': normaliser_noms(noms), 'prenom': normaliser_noms(prenoms)}),
+        index=False
+    ).to_numpy()
+
+
+@instrumenter
+def charger_candidats(path=PATH_CANDIDATS_2020):
+
+    print(f"Lecture des têtes de liste de {path}...")
+    try:
+        df = lire_avec_cache(lire_tetes_de_liste, path)
+    except FileNotFoundError:
+        print(f"ERREUR FATALE: Fichier introuvable {path}"); sys.exit()
+    except ValueError as e:
+        print(f"ERREUR: {e}"); sys.exit()
+
+    # Paris, Lyon et Marseille: listes par secteur ('056SR01'), rattachées à la commune
+    numero_commune = df['com_simple'].str.strip().str.replace(r'\.0$', '', regex=True).str[:3]
+    df['COM'] = depuis_dep_et_commune(df['dep'], numero_commune)
+    df = filtrer_invalides(df, 'COM', 'Candidats 2020')
+    print(f"-> {len(df)} têtes de liste")
+    return df
+
+
+@instrumenter
+def charger_maires(path=PATH_ELUS_2020):
+
+    # Maires du répertoire des élus: seules les colonnes utiles sont lues, et le filtre
+    # sur la fonction est appliqué par le lecteur Parquet
+
+    print(f"Lecture des maires de {path}...")
+    try:
+        df = pd.read_parquet(
+            path,
+            columns=[COLS_ELUS[champ] for champ in ['com', 'nom', 'prenom']],
+            filters=[(COLS_ELUS['fonction'], '==', FONCTION_MAIRE)]
+        )
+    except FileNotFoundError:
+        print(f"ERREUR FATALE: Fichier introuvable {path}"); sys.exit()
+    except ImportError as e:
+        print(f"ERREUR: pyarrow est nécessaire pour lire {path} ({e})"); sys.exit()
+
+    df = df.rename(columns={col: champ for champ, col in COLS_ELUS.items()})
+    df['COM'] = depuis_code_insee(df['com'])
+    df = filtrer_invalides(df, 'COM', 'Maires 2020')
+    print(f"-> {len(df)} maires")
+    return df
+
+
+@instrumenter
+def nuances_gagnantes(maires, candidats, metropole_seule=True):
+
+    # Nuance de la liste du maire (= liste gagnante) par commune: COM, Nuance_Gagnante_2020.
+    # Jointure maire -> tête de liste sur la clé hachée (COM, nom, prénom).
+
+    with etape('jointure_elus', lignes_entree=len(maires)) as mesure:
+        cle_maires = cle_hachee(maires['COM'].to_numpy(), maires['nom'], maires['prenom'])
+        cle_candidats = cle_hachee(candidats['COM'].to_numpy(), candidats['nom'], candidats['prenom'])
+
+        # Une même personne peut conduire plusieurs listes (secteurs): on garde la première
+        doublon = pd.Index(cle_candidats).duplicated()
+        candidats, cle_candidats = candidats[~doublon], cle_candidats[~doublon]
+        positions = pd.Index(cle_candidats).get_indexer(cle_maires)
+
+        # Garde-fou contre une collision de hachage: la commune doit aussi correspondre
+        trouve = positions >= 0
+        trouve[trouve] = candidats['COM'].to_numpy()[positions[trouve]] == maires['COM'].to_numpy()[trouve]
+
+        df = pd.DataFrame({
+            'COM': maires['COM'].to_numpy()[trouve],
+            'Nuance_Gagnante_2020': candidats['nuance'].to_numpy()[positions[trouve]]
+        })
+        df = df.drop_duplicates(subset='COM').sort_values('COM').reset_index(drop=True)
+        if metropole_seule:
+            df = df[est_metropole(df['COM'].to_numpy())].reset_index(drop=True)
+        df['Nuance_Gagnante_2020'] = df['Nuance_Gagnante_2020'].astype('category')
+
+        mesure['lignes_sortie'] = len(df)
+        mesure['details'] = {'maires_sans_liste': int((~trouve).sum())}
+
+    print(f"-> {len(df)} communes avec la nuance de la liste gagnante "
+          f"({int((~trouve).sum())} maires sans tête de liste correspondante)")
+    return df
+
+
+def main(path_elus=PATH_ELUS_2020, path_candidats=PATH_CANDIDATS_2020, output_file=OUTPUT_FILE):
+
+    print("--- NUANCES DES LISTES GAGNANTES 2020 ---")
+    df = nuances_gagnantes(charger_maires(path_elus), charger_candidats(path_candidats))
+
+    if output_file is not None:
+        # CSV, feather ou parquet selon l'extension (voir stockage)
+        ecrire_table(df, output_file)
+        print(f"Fichier '{output_file}' créé.")
+
+    print("\nRépartition des listes gagnantes par nuance (2020):")
+    counts = df['Nuance_Gagnante_2020'].value_counts(normalize=True) * 100
+    print(counts[counts > 0].round(2))
+    return df
+
+
+if __name__ == "__main__":
+    instrumentation.demarrer_rapport()
+    main(output_file=chemin_au_format(OUTPUT_FILE, format_depuis_arguments(sys.argv)))
+    instrumentation.ecrire_rapport()
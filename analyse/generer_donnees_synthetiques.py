@@ -0,0 +1,372 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+import prepare_data
+import agregation_resultats_elec
+
+# BUT: écrire des fichiers sources synthétiques, au format de chaque source réelle,
+# pour mesurer le pipeline (voir benchmark.py) sans les fichiers de /Users/romain/...
+#
+# Fichiers produits (mêmes noms que dans PATHS / PATH_ELEC_*):
+#   - population_2020.CSV, diplome_2020.CSV: niveau IRIS, séparateur ';'
+#   - population_2014.xlsx, diplome_2014.xlsx, revenu_2013.xlsx: en-tête à la 6ème ligne (header=5)
+#   - revenu_2019.csv: Filosofi communal, cellules 's' (secret statistique), décimales à la virgule
+#   - elections_2014.txt: une ligne par (tour, bureau, liste), sans en-tête, latin-1
+#   - elections_2020.xlsx: une ligne par (commune, liste)
+#
+# Échelle: les communes sont celles de l'échantillon data/revenu_2019.csv (France entière,
+# ~35 000 communes). Le nombre de communes ne peut pas être multiplié (la clé INSEE est bornée
+# à 999 communes par département): l'échelle multiplie le nombre de lignes de détail
+# (IRIS, bureaux de vote, listes 2020). Les fichiers communaux gardent donc leur taille réelle.
+#
+# Les sources .xls de l'INSEE sont écrites au format xlsx (pas d'écrivain .xls dans pandas),
+# sous l'extension .xlsx: pd.read_excel détecte le format, la lecture est la même.
+#
+# Une feuille Excel est bornée à EXCEL_MAX_LIGNES lignes: à 100x, population_2014 et
+# elections_2020 la dépassent et sont tronquées (les loaders ne lisent qu'une feuille).
+# Ces sources ne sont donc pas à l'échelle demandée: le nombre de lignes générées et écrites
+# de chaque source est enregistré dans MANIFESTE (voir benchmark.py, colonne 'sources_tronquees').
+#
+# Usage: python generer_donnees_synthetiques.py [1x|10x|100x] [dossier]
+
+# PARAMETRES
+
+ECHELLES = {'1x': 1, '10x': 10, '100x': 100}
+
+DOSSIER_SORTIE = 'donnees_synthetiques'
+
+PATH_COMMUNES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'revenu_2019.csv')
+
+GRAINE = 0
+
+# Nombre moyen de lignes de détail par commune, à l'échelle 1x (ordres de grandeur nationaux:
+# ~49 000 IRIS, ~70 000 bureaux de vote)
+IRIS_PAR_COMMUNE = 1.4
+BUREAUX_PAR_COMMUNE = 2.0
+LISTES_PAR_BUREAU = 3.0
+LISTES_PAR_COMMUNE_2020 = 2.5
+
+# Part des communes avec un second tour, et part des cellules Filosofi sous secret statistique
+PART_SECOND_TOUR = 0.3
+PART_SECRET = 0.1
+
+# Colonnes sans intérêt ajoutées aux fichiers IRIS (les vrais en ont plusieurs dizaines):
+# c'est ce que la projection usecols évite de lire
+NB_COLONNES_INUTILES = 20
+
+# Lignes de titre au-dessus de l'en-tête des fichiers Excel de l'INSEE (header=5)
+NB_LIGNES_TITRE = 5
+
+# Limite de lignes d'une feuille Excel
+EXCEL_MAX_LIGNES = 1_048_576
+
+# Lignes générées / écrites par source, dans le dossier des fichiers
+MANIFESTE = 'manifeste.csv'
+
+NUANCES_2014 = sorted(set(sum(agregation_resultats_elec.BLOCS_2014.values(), []))) + ['LDIV', 'LAUT']
+NUANCES_2020 = sorted(set(sum(agregation_resultats_elec.BLOCS_2020.values(), []))) + ['LDIV', 'LEXG']
+
+# Codes département des fichiers électoraux pour l'outre-mer (écartés par le pipeline)
+DEP_OUTRE_MER = {'971': 'ZA', '972': 'ZB', '973': 'ZC', '974': 'ZD', '976': 'ZM'}
+
+
+
+def charger_communes(path=PATH_COMMUNES):
+
+    # Liste des codes INSEE des communes. Sans l'échantillon Filosofi, on fabrique
+    # 350 communes par département métropolitain.
+
+    if os.path.exists(path):
+        return pd.read_csv(path, sep=';', usecols=['CODGEO'], dtype=str)['CODGEO'].to_numpy()
+    print(f"ATTENTION: {path} introuvable, liste de communes fabriquée.")
+    deps = [f'{d:02d}' for d in range(1, 96) if d != 20] + ['2A', '2B']
+    return np.array([f'{d}{c:03d}' for d in deps for c in range(1, 351)])
+
+
+def repartir(rng, n_communes, moyenne):
+
+    # Nombre de lignes de détail par commune (au moins 1): loi géométrique,
+    # beaucoup de petites communes et quelques très grosses
+
+    return rng.geometric(1 / moyenne, size=n_communes)
+
+
+def colonnes_inutiles(rng, n, prefixe):
+    return {f'{prefixe}_AUTRE{i}': rng.uniform(0, 500, n).round(3) for i in range(NB_COLONNES_INUTILES)}
+
+
+def tronquer_excel(df, path, max_lignes):
+
+    # df limité à max_lignes (une feuille Excel), avec un avertissement
+
+    if len(df) > max_lignes:
+        print(f"ATTENTION: {path} tronqué à {max_lignes} lignes sur {len(df)} (limite d'une feuille Excel).")
+        return df.iloc[:max_lignes]
+    return df
+
+
+def ecrire_excel_insee(df, path):
+
+    # Feuille au format INSEE: NB_LIGNES_TITRE lignes de titre, puis l'en-tête.
+    # Renvoie (lignes générées, lignes écrites).
+
+    ecrit = tronquer_excel(df, path, EXCEL_MAX_LIGNES - NB_LIGNES_TITRE - 1)
+
+    titre = pd.DataFrame([['Fichier synthétique (generer_donnees_synthetiques.py)']] + [['']] * (NB_LIGNES_TITRE - 1))
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        titre.to_excel(writer, index=False, header=False)
+        ecrit.to_excel(writer, index=False, startrow=NB_LIGNES_TITRE)
+    return len(df), len(ecrit)
+
+
+def generer_iris(rng, communes, echelle):
+
+    # Table des IRIS (code IRIS, commune), commune répétée autant de fois qu'elle a d'IRIS
+
+    nb_iris = repartir(rng, len(communes), IRIS_PAR_COMMUNE * echelle)
+    com = np.repeat(communes, nb_iris)
+    rang = np.arange(len(com)) - np.repeat(np.cumsum(nb_iris) - nb_iris, nb_iris)
+    iris = np.char.add(com.astype(str), np.char.zfill(rang.astype(str), 4))
+    return iris, com
+
+
+def generer_population(rng, iris, com, annee, path, excel):
+
+    pop = rng.gamma(2.0, 600.0, len(com)).round(3)
+    pop15p = (pop * rng.uniform(0.75, 0.9, len(com))).round(3)
+    cadres = (pop15p * rng.beta(2, 12, len(com))).round(3)
+    df = pd.DataFrame({
+        'IRIS': iris,
+        'COM': com,
+        'LIBCOM': 'Commune',
+        f'P{annee}_POP': pop,
+        f'C{annee}_POP15P': pop15p,
+        f'C{annee}_POP15P_CS3': cadres,
+        **colonnes_inutiles(rng, len(com), f'P{annee}')
+    })
+    if excel:
+        return ecrire_excel_insee(df, path)
+    df.to_csv(path, sep=';', index=False)
+    return len(df), len(df)
+
+
+def generer_diplome_2020(rng, iris, com, path):
+
+    nscol = rng.gamma(2.0, 450.0, len(com)).round(3)
+    parts = rng.dirichlet([6, 1, 1, 1], len(com)) # [non diplômés sup, sup2, sup34, sup5]
+    df = pd.DataFrame({
+        'IRIS': iris,
+        'COM': com,
+        'LIBCOM': 'Commune',
+        'P20_NSCOL15P': nscol,
+        'P20_NSCOL15P_SUP2': (nscol * parts[:, 1]).round(3),
+        'P20_NSCOL15P_SUP34': (nscol * parts[:, 2]).round(3),
+        'P20_NSCOL15P_SUP5': (nscol * parts[:, 3]).round(3),
+        **colonnes_inutiles(rng, len(com), 'P20')
+    })
+    df.to_csv(path, sep=';', index=False)
+    return len(df), len(df)
+
+
+def generer_diplome_2014(rng, communes, path):
+
+    nscol = rng.gamma(2.0, 600.0, len(communes))
+    df = pd.DataFrame({
+        'CODGEO': communes,
+        'LIBGEO': 'Commune',
+        'P14_NSCOL15P': nscol,
+        'P14_NSCOL15P_SUP': nscol * rng.beta(2, 6, len(communes))
+    })
+    return ecrire_excel_insee(df, path)
+
+
+def generer_revenu_2019(rng, communes, path):
+
+    # Filosofi: effectifs entiers, taux à la virgule, 's' sous secret statistique
+
+    n = len(communes)
+    secret = rng.random(n) < PART_SECRET
+
+    def avec_secret(valeurs):
+        return np.where(secret, 's', valeurs)
+
+    df = pd.DataFrame({
+        'CODGEO': communes,
+        'NBMENFISC19': avec_secret(rng.integers(50, 20000, n).astype(str)),
+        'NBPERSMENFISC19': avec_secret(rng.integers(100, 45000, n).astype(str)),
+        'MED19': avec_secret(rng.normal(22000, 3000, n).round(-1).astype(int).astype(str)),
+        'PIMP19': avec_secret(rng.integers(30, 80, n).astype(str)),
+        'TP6019': avec_secret(np.char.replace(rng.uniform(5, 30, n).round(1).astype(str), '.', ','))
+    })
+    df.to_csv(path, sep=';', index=False)
+    return len(df), len(df)
+
+
+def generer_revenu_2013(rng, communes, path):
+
+    n = len(communes)
+    med13 = rng.normal(20500, 2800, n).round(1).astype(object)
+    med13[rng.random(n) < PART_SECRET] = 's'
+    df = pd.DataFrame({'CODGEO': communes, 'LIBGEO': 'Commune', 'MED13': med13})
+    return ecrire_excel_insee(df, path)
+
+
+def codes_elections(communes):
+
+    # Code INSEE -> (département, numéro de commune) des fichiers électoraux
+
+    communes = pd.Series(communes)
+    outre_mer = communes.str[:2] == '97'
+    dep = communes.str[:2].where(~outre_mer, communes.str[:3].map(DEP_OUTRE_MER).fillna('ZZ'))
+    com = communes.str[2:].where(~outre_mer, communes.str[3:])
+    return dep.to_numpy(), com.to_numpy()
+
+
+def generer_elections_2014(rng, communes, echelle, path):
+
+    # Une ligne par (tour, bureau, liste); colonnes lues par COLS_2014:
+    # 0=Tour, 1=DEP, 2=COM_simple, 4=Bureau, 7=Exprimes, 11=Nuance, 12=Voix
+
+    dep, com = codes_elections(communes)
+    nb_bureaux = repartir(rng, len(communes), BUREAUX_PAR_COMMUNE * echelle)
+
+    # Bureaux
+    i_commune = np.repeat(np.arange(len(communes)), nb_bureaux)
+    num_bureau = np.arange(len(i_commune)) - np.repeat(np.cumsum(nb_bureaux) - nb_bureaux, nb_bureaux) + 1
+    exprimes = rng.integers(100, 1200, len(i_commune))
+    second_tour = (rng.random(len(communes)) < PART_SECOND_TOUR)[i_commune]
+
+    # (tour, bureau): T1 pour tous les bureaux, T2 pour ceux des communes concernées
+    tour = np.concatenate([np.ones(len(i_commune), dtype=int), np.full(second_tour.sum(), 2)])
+    bureau = np.concatenate([np.arange(len(i_commune)), np.flatnonzero(second_tour)])
+
+    # (tour, bureau, liste)
+    nb_listes = repartir(rng, len(tour), LISTES_PAR_BUREAU)
+    ligne_bureau = np.repeat(bureau, nb_listes)
+    parts = rng.random(len(ligne_bureau))
+    somme_parts = np.bincount(np.repeat(np.arange(len(tour)), nb_listes), weights=parts)
+    voix = np.floor(
+        exprimes[ligne_bureau] * parts / np.repeat(somme_parts, nb_listes)
+    ).astype(int)
+
+    i_commune_ligne = i_commune[ligne_bureau]
+    df = pd.DataFrame({
+        'tour': np.repeat(tour, nb_listes),
+        'dep': dep[i_commune_ligne],
+        'com': com[i_commune_ligne],
+        'libelle': 'Commune',
+        'bureau': np.char.zfill(num_bureau[ligne_bureau].astype(str), 4),
+        'inscrits': (exprimes[ligne_bureau] * 1.6).astype(int),
+        'votants': (exprimes[ligne_bureau] * 1.05).astype(int),
+        'exprimes': exprimes[ligne_bureau],
+        'panneau': np.repeat(nb_listes, nb_listes),
+        'nom': 'NOM',
+        'prenom': 'Prénom',
+        'nuance': rng.choice(NUANCES_2014, len(ligne_bureau)),
+        'voix': voix
+    })
+    df.to_csv(path, sep=';', header=False, index=False, encoding='latin1')
+    return len(df), len(df)
+
+
+def generer_elections_2020(rng, communes, echelle, path):
+
+    # Une ligne par (commune, liste), colonnes de COLS_2020
+
+    dep, com = codes_elections(communes)
+    nb_listes = repartir(rng, len(communes), LISTES_PAR_COMMUNE_2020 * echelle)
+    i_commune = np.repeat(np.arange(len(communes)), nb_listes)
+    exprimes = rng.integers(100, 5000, len(communes))
+
+    parts = rng.random(len(i_commune))
+    somme_parts = np.bincount(i_commune, weights=parts)
+    voix = np.floor(exprimes[i_commune] * parts / somme_parts[i_commune]).astype(int)
+
+    cols = agregation_resultats_elec.COLS_2020
+    df = pd.DataFrame({
+        cols['dep']: dep[i_commune],
+        'Libellé du département': 'Département',
+        cols['com_simple']: pd.Series(com[i_commune]).str.lstrip('0').to_numpy(), # comme dans le fichier du ministère
+        'Libellé de la commune': 'Commune',
+        'Inscrits': (exprimes[i_commune] * 1.6).astype(int),
+        cols['exp']: exprimes[i_commune],
+        cols['nuance']: rng.choice(NUANCES_2020, len(i_commune)),
+        cols['voix']: voix
+    })
+
+    ecrit = tronquer_excel(df, path, EXCEL_MAX_LIGNES - 1)
+    ecrit.to_excel(path, index=False)
+    return len(df), len(ecrit)
+
+
+def chemins_synthetiques(dossier):
+
+    # Chemins des fichiers générés dans 'dossier', avec les clés de prepare_data.PATHS
+    # plus 'elec_2020' et 'elec_2014' (.xls -> .xlsx, voir plus haut)
+
+    def nom_fichier(path):
+        base, extension = os.path.splitext(os.path.basename(path))
+        return base + ('.xlsx' if extension.lower() == '.xls' else extension)
+
+    chemins = {nom: os.path.join(dossier, nom_fichier(path)) for nom, path in prepare_data.PATHS.items()}
+    chemins['elec_2020'] = os.path.join(dossier, os.path.basename(agregation_resultats_elec.PATH_ELEC_2020))
+    chemins['elec_2014'] = os.path.join(dossier, os.path.basename(agregation_resultats_elec.PATH_ELEC_2014))
+    return chemins
+
+
+def generer(echelle='1x', dossier=None, graine=GRAINE):
+
+    # Écrit tous les fichiers sources à l'échelle demandée.
+    # Renvoie le dict des chemins (voir chemins_synthetiques).
+
+    if echelle not in ECHELLES:
+        print(f"ERREUR: échelle inconnue '{echelle}' (attendu: {list(ECHELLES)})"); sys.exit()
+    facteur = ECHELLES[echelle]
+    dossier = dossier or os.path.join(DOSSIER_SORTIE, echelle)
+    os.makedirs(dossier, exist_ok=True)
+    chemins = chemins_synthetiques(dossier)
+
+    rng = np.random.default_rng(graine)
+    communes = charger_communes()
+    print(f"Génération des données synthétiques ({echelle}, {len(communes)} communes) dans {dossier}...")
+
+    iris20, com20 = generer_iris(rng, communes, facteur)
+    iris14, com14 = generer_iris(rng, communes, facteur)
+
+    lignes = {
+        'pop_2020': generer_population(rng, iris20, com20, 20, chemins['pop_2020'], excel=False),
+        'pop_2014': generer_population(rng, iris14, com14, 14, chemins['pop_2014'], excel=True),
+        'diplo_2020': generer_diplome_2020(rng, iris20, com20, chemins['diplo_2020']),
+        'diplo_2014': generer_diplome_2014(rng, communes, chemins['diplo_2014']),
+        'rev_2019': generer_revenu_2019(rng, communes, chemins['rev_2019']),
+        'rev_2013': generer_revenu_2013(rng, communes, chemins['rev_2013']),
+        'elec_2014': generer_elections_2014(rng, communes, facteur, chemins['elec_2014']),
+        'elec_2020': generer_elections_2020(rng, communes, facteur, chemins['elec_2020'])
+    }
+    manifeste = pd.DataFrame(
+        [(nom, os.path.basename(chemins[nom]), generees, ecrites) for nom, (generees, ecrites) in lignes.items()],
+        columns=['source', 'fichier', 'lignes_generees', 'lignes_ecrites']
+    )
+    manifeste['tronque'] = manifeste['lignes_ecrites'] < manifeste['lignes_generees']
+    manifeste.to_csv(os.path.join(dossier, MANIFESTE), sep=';', index=False)
+
+    for nom, (generees, ecrites) in lignes.items():
+        print(f"  -> {chemins[nom]}: {ecrites} lignes" + (f" (sur {generees} générées)" if ecrites < generees else ""))
+
+    return chemins
+
+
+def sources_tronquees(dossier):
+
+    # Noms des sources de 'dossier' tronquées à l'écriture (d'après MANIFESTE)
+
+    manifeste = pd.read_csv(os.path.join(dossier, MANIFESTE), sep=';')
+    return manifeste.loc[manifeste['tronque'], 'source'].tolist()
+
+
+if __name__ == "__main__":
+    echelle = sys.argv[1] if len(sys.argv) > 1 else '1x'
+    dossier = sys.argv[2] if len(sys.argv) > 2 else None
+    generer(echelle, dossier)
@@ -0,0 +1,190 @@
+import functools
+import os
+import numpy as np
+import pandas as pd
+
+from code_commune import depuis_code_insee, CODE_INVALIDE, DTYPE_CODE
+from instrumentation import etape
+
+# BUT: ramener toutes les sources sur la même géographie communale (celle de 2020)
+# et agréger les lignes IRIS (ou communales) par commune en une passe.
+#
+# Entre 2014 et 2020, de nombreuses communes ont fusionné ("communes nouvelles"):
+# un code de 2014 absent de 2020 disparaissait des jointures internes. La table de
+# passage est construite à partir de l'historique du COG de l'INSEE (fichier des
+# mouvements de communes, v_mvt_commune_AAAA.csv), en suivant les chaînes
+# (A -> B en 2016 puis B -> C en 2019: A -> C).
+# Sans ce fichier, les codes sont gardés tels quels (table identité).
+#
+# Agrégation: codes -> table de passage -> indices entiers denses (0..G-1), puis
+# les colonnes de comptage sommées par np.bincount (pas de tri, pas de hachage).
+# Les médianes de revenu ne se somment pas (voir remapper_medianes): une commune nouvelle
+# issue de plusieurs communes de la source n'a pas de médiane, elle sort de l'analyse.
+
+# PARAMETRES
+
+PATH_COG_HISTORIQUE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'v_mvt_commune_2023.csv'
+)
+
+# Géographie cible: mouvements effectifs jusqu'à cette date incluse (COG des municipales 2020)
+DATE_GEOGRAPHIE = '2020-01-01'
+
+# Mouvements qui font disparaître un code: fusions (31 à 34), changements de code (41, 50)
+MODS_REMAPPAGE = [31, 32, 33, 34, 41, 50]
+
+# Colonnes du fichier des mouvements
+COLS_COG = {
+    'mod': 'MOD',
+    'date': 'DATE_EFF',
+    'type_avant': 'TYPECOM_AV',
+    'com_avant': 'COM_AV',
+    'type_apres': 'TYPECOM_AP',
+    'com_apres': 'COM_AP'
+}
+
+# Garde-fou pour le suivi des chaînes de fusions
+MAX_ITERATIONS_CHAINES = 50
+
+
+
+@functools.lru_cache(maxsize=None)
+def table_passage(path=PATH_COG_HISTORIQUE, date=DATE_GEOGRAPHIE):
+
+    # Renvoie (anciens, nouveaux): codes entiers (voir code_commune), 'anciens' trié.
+    # Chaque ancien code est envoyé sur son code à la date 'date'.
+    # Lue une fois par processus (lru_cache).
+
+    if not os.path.exists(path):
+        print(f"ATTENTION: historique du COG introuvable ({path}), codes communes gardés tels quels.")
+        return np.array([], dtype=DTYPE_CODE), np.array([], dtype=DTYPE_CODE)
+
+    mvt = pd.read_csv(path, usecols=list(COLS_COG.values()), dtype=str)
+    mvt = mvt[
+        pd.to_numeric(mvt[COLS_COG['mod']], errors='coerce').isin(MODS_REMAPPAGE)
+        & (mvt[COLS_COG['type_avant']] == 'COM')
+        & (mvt[COLS_COG['type_apres']] == 'COM')
+        & (mvt[COLS_COG['date']] <= date) # dates ISO: l'ordre du texte est celui des dates
+    ]
+
+    # Un même code peut bouger plusieurs fois: on garde son dernier mouvement
+    mvt = mvt.sort_values(COLS_COG['date']).drop_duplicates(subset=COLS_COG['com_avant'], keep='last')
+    anciens = depuis_code_insee(mvt[COLS_COG['com_avant']])
+    nouveaux = depuis_code_insee(mvt[COLS_COG['com_apres']])
+    change = (anciens != nouveaux) & (anciens != CODE_INVALIDE) & (nouveaux != CODE_INVALIDE)
+    anciens, nouveaux = anciens[change], nouveaux[change]
+
+    ordre = np.argsort(anciens)
+    anciens, nouveaux = anciens[ordre], nouveaux[ordre]
+
+    # Chaînes: on réapplique la table aux codes d'arrivée jusqu'à stabilité
+    for _ in range(MAX_ITERATIONS_CHAINES):
+        suivants = _appliquer(nouveaux, anciens, nouveaux)
+        if np.array_equal(suivants, nouveaux):
+            break
+        nouveaux = suivants
+    else:
+        print("ATTENTION: chaînes de fusions non résolues (cycle dans l'historique du COG ?)")
+
+    print(f"Table de passage vers la géographie du {date}: {len(anciens)} anciens codes.")
+    return anciens, nouveaux
+
+
+def _appliquer(codes, anciens, nouveaux):
+
+    # Remplace chaque code présent dans 'anciens' par son 'nouveau' (recherche dichotomique)
+
+    codes = np.asarray(codes, dtype=DTYPE_CODE)
+    if len(anciens) == 0:
+        return codes.copy()
+    positions = np.searchsorted(anciens, codes)
+    positions = np.minimum(positions, len(anciens) - 1)
+    trouve = anciens[positions] == codes
+    resultat = codes.copy()
+    resultat[trouve] = nouveaux[positions[trouve]]
+    return resultat
+
+
+def remapper_communes(codes, table=None):
+
+    # Codes communes entiers -> codes de la géographie cible
+
+    anciens, nouveaux = table_passage() if table is None else table
+    return _appliquer(codes, anciens, nouveaux)
+
+
+def agreger_par_commune(df, cle, colonnes, table=None):
+
+    # Somme des 'colonnes' par commune, après passage des codes de 'cle' dans la table.
+    # Remplace df.groupby(cle)[colonnes].sum(min_count=1): les NaN comptent pour 0, sauf
+    # si toutes les lignes de la commune sont NaN (résultat NaN). Le résultat est trié
+    # par commune et les colonnes gardent leur type.
+
+    with etape('agregation_communes', lignes_entree=len(df)) as mesure:
+        codes = remapper_communes(df[cle].to_numpy(), table)
+        nb_remappees = int((codes != df[cle].to_numpy()).sum())
+
+        # Indices denses sans tri ni hachage: la clé est un petit entier (< 1 000 000,
+        # voir code_commune), un premier bincount marque les communes présentes et
+        # donne directement leur rang (dans l'ordre des codes)
+        if len(codes) and codes.min() < 0:
+            raise ValueError(f"Codes communes invalides dans '{cle}' (filtrer_invalides d'abord).")
+        presentes = np.bincount(codes)
+        communes = np.flatnonzero(presentes)
+        rang = np.zeros(len(presentes), dtype='int64')
+        rang[communes] = np.arange(len(communes))
+        inverse = rang[codes]
+
+        # Sommes: un bincount par colonne de comptage (NaN comptés pour 0), et un second
+        # pour le nombre de valeurs renseignées: une commune sans aucune valeur garde NaN
+        # (comme groupby().sum(min_count=1)), au lieu d'un 0 inventé
+        valeurs = df[colonnes].to_numpy(dtype='float64')
+        renseignees = ~np.isnan(valeurs)
+        sommes = np.column_stack([
+            np.bincount(inverse, weights=np.where(renseignees[:, j], valeurs[:, j], 0), minlength=len(communes))
+            for j in range(len(colonnes))
+        ])
+        nb_renseignees = np.column_stack([
+            np.bincount(inverse, weights=renseignees[:, j], minlength=len(communes))
+            for j in range(len(colonnes))
+        ])
+        sommes[nb_renseignees == 0] = np.nan
+
+        df_agg = pd.DataFrame({cle: communes.astype(DTYPE_CODE)})
+        for j, col in enumerate(colonnes):
+            df_agg[col] = sommes[:, j].astype(df[col].dtype)
+
+        mesure['lignes_sortie'] = len(communes)
+        mesure['details'] = {'lignes_remappees': nb_remappees}
+
+    if nb_remappees:
+        print(f"  {nb_remappees} lignes rattachées à leur commune de {DATE_GEOGRAPHIE[:4]} (fusions)")
+    return df_agg
+
+
+def remapper_medianes(df, cle, colonnes, table=None):
+
+    # Statistiques non additives (médianes de revenu): codes ramenés sur la géographie 2020,
+    # sans somme. Une commune de 2020 qui reçoit plusieurs lignes de la source (fusion de
+    # communes présentes dans la source, chef-lieu compris) n'a pas de médiane connue:
+    # la médiane de la commune nouvelle n'est pas une combinaison de celles des anciennes.
+    # Ses 'colonnes' passent à NaN (la commune sera écartée par le dropna).
+    # Une seule ligne (simple changement de code): valeur gardée. Une ligne par commune.
+
+    with etape('remappage_medianes', lignes_entree=len(df)) as mesure:
+        codes = remapper_communes(df[cle].to_numpy(), table)
+        nb_remappees = int((codes != df[cle].to_numpy()).sum())
+
+        communes, premieres, effectifs = np.unique(codes, return_index=True, return_counts=True)
+        df_com = df.iloc[premieres].reset_index(drop=True)
+        df_com[cle] = communes.astype(DTYPE_CODE)
+        fusionnees = effectifs > 1
+        for col in colonnes:
+            df_com[col] = df_com[col].where(~fusionnees)
+
+        mesure['lignes_sortie'] = len(df_com)
+        mesure['details'] = {'lignes_remappees': nb_remappees, 'communes_fusionnees': int(fusionnees.sum())}
+
+    if fusionnees.any():
+        print(f"  {int(fusionnees.sum())} communes fusionnées depuis la source: médiane inconnue (NaN)")
+    return df_com
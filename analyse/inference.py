@@ -0,0 +1,291 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+from analyse import INPUT_DATA, SPEC_V2, COV_ROBUSTE, charger_donnees, matrice_plan, mco
+from code_commune import departement
+from instrumentation import instrumenter
+
+# BUT: intervalles de confiance et tests par rééchantillonnage pour les coefficients
+# des deltas (Delta_Cadres, Delta_Diplomes) du modèle de analyse.py.
+#   - bootstrap par paires (communes tirées avec remise)
+#   - bootstrap par département (départements entiers tirés avec remise: erreurs corrélées
+#     entre communes d'un même département)
+#   - test de permutation (Freedman-Lane: on permute les résidus du modèle sans la variable testée;
+#     la statistique comparée est le t robuste, pas le coefficient: elle reste pivotale
+#     quand la variance des erreurs varie d'une commune à l'autre)
+#
+# Les milliers de ré-estimations sont réparties sur un pool de processus. X, y et les
+# départements sont copiés une seule fois en mémoire partagée (multiprocessing.shared_memory),
+# en lecture seule: chaque tâche ne reçoit que sa graine et son nombre de tirages.
+# Graines: SeedSequence(GRAINE).spawn(nombre de lots), un flux indépendant par lot.
+# Les résultats ne dépendent donc pas du nombre de processus.
+
+# PARAMETRES
+
+VARIABLES_INTERET = ['Delta_Cadres', 'Delta_Diplomes']
+
+N_BOOTSTRAP = 2000
+N_PERMUTATIONS = 2000
+
+# Niveau des intervalles de confiance (percentiles du bootstrap)
+NIVEAU_IC = 0.95
+
+GRAINE = 2020
+
+# Nombre de tirages par tâche envoyée au pool
+TAILLE_LOT = 100
+
+N_WORKERS = os.cpu_count() or 1
+
+# Tableaux partagés, vus par les processus du pool (remplis par _attacher)
+_PARTAGE = {}
+
+
+
+def _partager(tableaux):
+
+    # Copie chaque tableau (dict nom -> np.ndarray) dans un bloc de mémoire partagée.
+    # Renvoie (blocs, description): les blocs sont à fermer/libérer par l'appelant,
+    # la description (nom du bloc, forme, type) suffit aux processus pour s'y attacher.
+
+    blocs = {}
+    description = {}
+    for nom, tableau in tableaux.items():
+        bloc = shared_memory.SharedMemory(create=True, size=max(tableau.nbytes, 1))
+        np.ndarray(tableau.shape, dtype=tableau.dtype, buffer=bloc.buf)[...] = tableau
+        blocs[nom] = bloc
+        description[nom] = (bloc.name, tableau.shape, tableau.dtype.str)
+    return blocs, description
+
+
+def _attacher(description):
+
+    # Initialisation d'un processus du pool: vues en lecture seule sur les blocs partagés
+
+    for nom, (nom_bloc, forme, dtype) in description.items():
+        bloc = shared_memory.SharedMemory(name=nom_bloc)
+        tableau = np.ndarray(forme, dtype=dtype, buffer=bloc.buf)
+        tableau.flags.writeable = False
+        _PARTAGE[nom] = tableau
+        _PARTAGE[f'_bloc_{nom}'] = bloc # garder le bloc ouvert tant que le processus vit
+
+
+def _coefficients_ponderes(X, y, poids):
+
+    # MCO pondérés par le nombre de fois où chaque observation est tirée
+    # (équivalent à ré-estimer sur l'échantillon bootstrap, sans le recopier)
+
+    Xw = X * poids[:, None]
+    try:
+        return np.linalg.solve(X.T @ Xw, Xw.T @ y)
+    except np.linalg.LinAlgError:
+        # Tirage dégénéré (ex: un seul département tiré): coefficients indéfinis
+        return np.full(X.shape[1], np.nan)
+
+
+def _lot_bootstrap(graine, nb_tirages, colonnes, par_departement):
+
+    X, y = _PARTAGE['X'], _PARTAGE['y']
+    rng = np.random.default_rng(graine)
+    n = len(y)
+    resultats = np.empty((nb_tirages, len(colonnes)))
+
+    if par_departement:
+        groupes = _PARTAGE['groupes']
+        nb_groupes = int(groupes.max()) + 1
+
+    for b in range(nb_tirages):
+        if par_departement:
+            tires = rng.integers(0, nb_groupes, nb_groupes)
+            poids = np.bincount(tires, minlength=nb_groupes)[groupes].astype('float64')
+        else:
+            poids = np.bincount(rng.integers(0, n, n), minlength=n).astype('float64')
+        resultats[b] = _coefficients_ponderes(X, y, poids)[colonnes]
+
+    return resultats
+
+
+def _correction_hc(X, projection, cov_robuste):
+
+    # Poids w des résidus au carré dans le sandwich (comme analyse.mco):
+    # 1 (HC0), n / ddl (HC1) ou 1 / (1 - h)² (HC3, h: levier)
+
+    n, k = X.shape
+    if cov_robuste == 'HC0':
+        return 1.0
+    if cov_robuste == 'HC1':
+        return n / (n - k)
+    if cov_robuste == 'HC3':
+        levier = np.einsum('ij,ji->i', X, projection)
+        return 1 / (1 - levier)**2
+    raise ValueError(f"Type de covariance robuste inconnu '{cov_robuste}'.")
+
+
+def _t_robuste(X, y, projection, correction, j):
+
+    # t robuste du coefficient j: seule la ligne j du sandwich est nécessaire,
+    # var(beta_j) = somme_i P[j, i]² w_i e_i² (P: projection, beta = P @ y)
+
+    beta = projection @ y
+    residus = y - X @ beta
+    return beta[j] / np.sqrt(projection[j]**2 @ (correction * residus**2))
+
+
+def _lot_permutation(graine, nb_tirages, colonnes, cov_robuste):
+
+    # Freedman-Lane: pour chaque variable testée, modèle réduit (sans elle) -> valeurs
+    # ajustées + résidus permutés = y sous l'hypothèse nulle, puis t robuste de la variable
+    # dans le modèle complet
+
+    X, y = _PARTAGE['X'], _PARTAGE['y']
+    rng = np.random.default_rng(graine)
+    projection = np.linalg.solve(X.T @ X, X.T) # beta = projection @ y
+    correction = _correction_hc(X, projection, cov_robuste)
+    resultats = np.empty((nb_tirages, len(colonnes)))
+
+    for i, j in enumerate(colonnes):
+        Z = np.delete(X, j, axis=1)
+        ajuste = Z @ np.linalg.lstsq(Z, y, rcond=None)[0]
+        residus = y - ajuste
+        for b in range(nb_tirages):
+            resultats[b, i] = _t_robuste(X, ajuste + rng.permutation(residus), projection, correction, j)
+
+    return resultats
+
+
+def _executer_lots(tache, tableaux, n_tirages, graine, n_workers, *args):
+
+    # Découpe n_tirages en lots de TAILLE_LOT, un flux aléatoire par lot, et les
+    # exécute sur le pool (ou dans ce processus si n_workers == 1).
+    # Renvoie les résultats des lots empilés, dans l'ordre des lots.
+
+    tailles = [TAILLE_LOT] * (n_tirages // TAILLE_LOT)
+    if n_tirages % TAILLE_LOT:
+        tailles.append(n_tirages % TAILLE_LOT)
+    graines = np.random.SeedSequence(graine).spawn(len(tailles))
+
+    if n_workers <= 1:
+        _PARTAGE.update(tableaux)
+        try:
+            return np.vstack([tache(g, t, *args) for g, t in zip(graines, tailles)])
+        finally:
+            _PARTAGE.clear()
+
+    blocs, description = _partager(tableaux)
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_attacher, initargs=(description,)) as executor:
+            futures = [executor.submit(tache, g, t, *args) for g, t in zip(graines, tailles)]
+            return np.vstack([future.result() for future in futures])
+    finally:
+        for bloc in blocs.values():
+            bloc.close()
+            bloc.unlink()
+
+
+def _preparer(df, spec, variables):
+
+    # Matrice de plan (analyse.matrice_plan) + départements des lignes gardées,
+    # codés 0..G-1, et position des variables d'intérêt dans X
+
+    y, X, noms, garde = matrice_plan(df, spec)
+    manquantes = [v for v in variables if v not in noms]
+    if manquantes:
+        raise KeyError(f"Variables absentes de la spécification: {manquantes}")
+    colonnes = [noms.index(v) for v in variables]
+    groupes, _ = pd.factorize(departement(df['COM'].to_numpy()[garde]))
+    return {'X': X, 'y': y, 'groupes': groupes.astype('int32')}, noms, colonnes
+
+
+@instrumenter
+def bootstrap(df, spec=SPEC_V2, variables=VARIABLES_INTERET, n_tirages=N_BOOTSTRAP,
+              par_departement=False, graine=GRAINE, n_workers=N_WORKERS, niveau=NIVEAU_IC):
+
+    # Intervalles de confiance bootstrap (percentiles) des coefficients de 'variables'.
+    # par_departement=True: bootstrap par grappes (départements entiers).
+    # Renvoie un DataFrame: une ligne par variable.
+
+    tableaux, noms, colonnes = _preparer(df, spec, variables)
+    estimation = mco(tableaux['y'], tableaux['X'], noms)
+
+    type_bootstrap = 'départements' if par_departement else 'paires'
+    print(f"Bootstrap ({type_bootstrap}): {n_tirages} tirages sur {len(tableaux['y'])} communes, "
+          f"{n_workers} processus...")
+    tirages = _executer_lots(
+        _lot_bootstrap, tableaux, n_tirages, graine, n_workers, colonnes, par_departement
+    )
+
+    valides = np.isfinite(tirages).all(axis=1)
+    if not valides.all():
+        print(f"  {int((~valides).sum())} tirages dégénérés écartés")
+    tirages = tirages[valides]
+
+    alpha = (1 - niveau) / 2
+    return pd.DataFrame({
+        'variable': variables,
+        'coef': estimation['coefficients'][variables].to_numpy(),
+        'se_bootstrap': tirages.std(axis=0, ddof=1),
+        'ic_bas': np.quantile(tirages, alpha, axis=0),
+        'ic_haut': np.quantile(tirages, 1 - alpha, axis=0),
+        'n_tirages': len(tirages),
+        'bootstrap': type_bootstrap
+    })
+
+
+@instrumenter
+def test_permutation(df, spec=SPEC_V2, variables=VARIABLES_INTERET, n_permutations=N_PERMUTATIONS,
+                     graine=GRAINE, n_workers=N_WORKERS, cov_robuste=COV_ROBUSTE):
+
+    # Test de permutation (Freedman-Lane) de la nullité de chaque coefficient de 'variables'.
+    # Statistique: t robuste (cov_robuste, comme mco), recalculé à chaque permutation.
+    # p-valeur bilatérale: (1 + #{|t permuté| >= |t|}) / (1 + n_permutations)
+
+    tableaux, noms, colonnes = _preparer(df, spec, variables)
+    estimation = mco(tableaux['y'], tableaux['X'], noms, cov_robuste)
+    coefs = estimation['coefficients'][variables].to_numpy()
+    t_observes = estimation['t_robuste'][variables].to_numpy()
+
+    print(f"Test de permutation: {n_permutations} permutations, {n_workers} processus...")
+    tableaux.pop('groupes')
+    tirages = _executer_lots(
+        _lot_permutation, tableaux, n_permutations, graine, n_workers, colonnes, cov_robuste
+    )
+
+    extremes = (np.abs(tirages) >= np.abs(t_observes)).sum(axis=0)
+    return pd.DataFrame({
+        'variable': variables,
+        'coef': coefs,
+        't_robuste': t_observes,
+        'p_permutation': (1 + extremes) / (1 + n_permutations),
+        'n_permutations': n_permutations
+    })
+
+
+def main(input_path=INPUT_DATA):
+
+    print("--- INFÉRENCE PAR RÉÉCHANTILLONNAGE ---")
+    df = charger_donnees(input_path)
+
+    try:
+        resultats = [
+            bootstrap(df),
+            bootstrap(df, par_departement=True)
+        ]
+        permutations = test_permutation(df)
+    except (KeyError, ValueError) as e:
+        print(f"ERREUR: {e}")
+        sys.exit()
+
+    print("\nIntervalles de confiance bootstrap:")
+    print(pd.concat(resultats, ignore_index=True).to_string(index=False))
+    print("\nTests de permutation:")
+    print(permutations.to_string(index=False))
+
+    return resultats, permutations
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# BUT: mesurer chaque étape des scripts (chargements, agrégations, fusions, dropna)
+# et écrire un rapport d'exécution JSON, exploitable d'une exécution à l'autre.
+# Les print de progression restent: le rapport s'y ajoute.
+#
+# Pour chaque étape: temps réel, temps CPU, mémoire, lignes en entrée, lignes en sortie,
+# lignes perdues, et des détails libres (ex: rapport de jointure).
+#
+#     with etape('agregation', lignes_entree=len(df)) as mesure:
+#         df_agg = df.groupby('COM').sum()
+#         mesure['lignes_sortie'] = len(df_agg)
+#
+# Les étapes peuvent être imbriquées: leur nom complet est 'parent > enfant'.
+# Mémoire: par défaut, le maximum de mémoire résidente du processus depuis son début
+# (resource.getrusage, gratuit, mais jamais remis à zéro: 'rss_max_mo'). Le pic propre à
+# chaque étape ('pic_memoire_mo', tracemalloc) est optionnel: tracemalloc ralentit fortement
+# les allocations (x5 sur une lecture Excel). Activé par INSTRUMENTATION_MEMOIRE=1
+# ou demarrer_rapport(memoire=True); sinon il vaut None.
+# Les étapes ne sont enregistrées qu'entre demarrer_rapport() et ecrire_rapport():
+# utilisés comme bibliothèque (benchmark, analyse), les modules n'accumulent rien.
+
+# PARAMETRES
+
+RAPPORT_FILE = 'rapport_execution.json'
+
+MEMOIRE_DETAILLEE = os.environ.get('INSTRUMENTATION_MEMOIRE', '0') not in ('', '0')
+
+_RAPPORT = {'debut': None, 'etapes': [], 'actif': False}
+_PILE = []
+
+
+
+def rss_max_mo():
+
+    # Maximum de mémoire résidente du processus, en Mo (None si resource est absent: Windows)
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024**2 if sys.platform == 'darwin' else rss / 1024 # octets sur macOS, Ko ailleurs
+
+
+def demarrer_rapport(memoire=None):
+
+    # Remet le rapport à zéro et commence l'enregistrement des étapes (à appeler au début
+    # d'un point d'entrée). memoire=None: MEMOIRE_DETAILLEE
+
+    memoire = MEMOIRE_DETAILLEE if memoire is None else memoire
+    _RAPPORT['debut'] = datetime.now().isoformat(timespec='seconds')
+    _RAPPORT['etapes'] = []
+    _RAPPORT['actif'] = True
+    _PILE.clear()
+    if memoire and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not memoire and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+@contextmanager
+def etape(nom, lignes_entree=None):
+
+    # Mesure le bloc 'with'. Le bloc peut renseigner mesure['lignes_sortie']
+    # et mesure['details'] (dict ou liste sérialisable en JSON).
+
+    mesure = {
+        'etape': ' > '.join([parent['etape'] for parent in _PILE[-1:]] + [nom]),
+        'lignes_entree': lignes_entree,
+        'lignes_sortie': None,
+        'details': None
+    }
+
+    # tracemalloc n'a qu'un pic, global: on le remet à zéro pour cette étape et on
+    # garde celui de l'étape parente pour le lui rendre à la fin
+    memoire = tracemalloc.is_tracing()
+    if memoire:
+        pic_parent = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+    mesure['_pic_enfants'] = 0
+
+    _PILE.append(mesure)
+    debut, debut_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield mesure
+    finally:
+        mesure['secondes'] = time.perf_counter() - debut
+        mesure['secondes_cpu'] = time.process_time() - debut_cpu
+        _PILE.pop()
+
+        pic = None
+        if memoire and tracemalloc.is_tracing():
+            pic = max(tracemalloc.get_traced_memory()[1], mesure['_pic_enfants'])
+            if _PILE:
+                _PILE[-1]['_pic_enfants'] = max(_PILE[-1]['_pic_enfants'], pic_parent, pic)
+        del mesure['_pic_enfants']
+        mesure['pic_memoire_mo'] = None if pic is None else pic / 1024**2
+        mesure['rss_max_mo'] = rss_max_mo()
+
+        if mesure['lignes_entree'] is not None and mesure['lignes_sortie'] is not None:
+            mesure['lignes_perdues'] = mesure['lignes_entree'] - mesure['lignes_sortie']
+        else:
+            mesure['lignes_perdues'] = None
+
+        if _RAPPORT['actif']:
+            _RAPPORT['etapes'].append(mesure)
+
+
+def instrumenter(fonction):
+
+    # Décorateur: la fonction entière est une étape (nom de la fonction);
+    # si elle renvoie un DataFrame, son nombre de lignes est la sortie de l'étape
+
+    @functools.wraps(fonction)
+    def fonction_instrumentee(*args, **kwargs):
+        with etape(fonction.__name__) as mesure:
+            resultat = fonction(*args, **kwargs)
+            if hasattr(resultat, 'shape'):
+                mesure['lignes_sortie'] = int(resultat.shape[0])
+            return resultat
+
+    return fonction_instrumentee
+
+
+def appel_instrumente(fonction, *args, memoire=None):
+
+    # Pour les processus de ProcessPoolExecutor: leurs étapes ne sont pas dans le
+    # rapport du processus principal. Renvoie (résultat, étapes mesurées dans ce
+    # processus), à reverser au rapport principal avec ajouter_etapes().
+
+    # (état du rapport rétabli ensuite: rien ne s'accumule dans un processus réutilisé)
+    rapport, pile = dict(_RAPPORT), list(_PILE)
+    demarrer_rapport(memoire)
+    try:
+        resultat = fonction(*args)
+        return resultat, _RAPPORT['etapes']
+    finally:
+        _RAPPORT.update(rapport)
+        _PILE[:] = pile
+
+
+def ajouter_etapes(etapes):
+    if _RAPPORT['actif']:
+        _RAPPORT['etapes'].extend(etapes)
+
+
+def memoire_suivie():
+    return tracemalloc.is_tracing()
+
+
+def etapes():
+    return list(_RAPPORT['etapes'])
+
+
+def ecrire_rapport(path=RAPPORT_FILE):
+
+    # Écrit le rapport JSON et termine l'enregistrement. Les étapes sont dans l'ordre
+    # où elles se terminent (une étape parente après ses enfants).
+
+    rapport = {
+        'debut': _RAPPORT['debut'],
+        'fin': datetime.now().isoformat(timespec='seconds'),
+        'etapes': _RAPPORT['etapes']
+    }
+    with open(path, 'w') as f:
+        json.dump(rapport, f, indent=2, ensure_ascii=False, default=str)
+    _RAPPORT['etapes'], _RAPPORT['actif'] = [], False
+    print(f"Rapport d'exécution écrit dans '{path}' ({len(rapport['etapes'])} étapes).")
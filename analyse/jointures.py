@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# BUT: jointure interne de N DataFrames sur une même clé, en une seule passe.
+# Remplace les pd.merge(..., how='inner') en série: chaque source est indexée
+# une seule fois, les clés communes sont calculées d'emblée, et les colonnes
+# de sortie sont assemblées directement à partir de ces clés.
+
+
+
+def fusion_multiple(data_frames, cle, noms=None):
+
+    # data_frames: liste de DataFrames contenant tous la colonne 'cle' (unique dans chacun)
+    # noms: noms des sources pour le rapport (par défaut 'df #0', 'df #1'...)
+    # Renvoie (df_fusionne, rapport). L'ordre des lignes est celui de la première
+    # source, comme avec des pd.merge inner enchaînés. Le rapport donne, pour
+    # chaque source, le nombre de lignes perdues par la jointure.
+    #
+    # Deux différences voulues avec les pd.merge enchaînés:
+    #   - une clé en double dans une source lève ValueError (les scripts l'affichent puis
+    #     sys.exit()), là où merge multipliait les lignes en silence: les sources sont
+    #     agrégées par commune, un doublon est une erreur en amont
+    #   - une clé manquante (NaN) ne joint jamais, là où merge faisait correspondre les NaN
+    #     entre eux: une commune sans code n'est pas une commune. (Les clés communes sont
+    #     des entiers, voir code_commune: ce cas ne se présente que pour d'autres clés.)
+    # Le moteur Polars fait de même (join validate='1:1', clés nulles jamais jointes).
+
+    if noms is None:
+        noms = [f"df #{i}" for i in range(len(data_frames))]
+
+    # Étape 1: indexer chaque source une seule fois sur la clé
+    index_sources = []
+    for nom, df in zip(noms, data_frames):
+        if cle not in df.columns:
+            raise KeyError(f"Clé '{cle}' manquante dans la source '{nom}'.")
+        index = pd.Index(df[cle])
+        if not index.is_unique:
+            raise ValueError(f"Clé '{cle}' non unique dans la source '{nom}'.")
+        index_sources.append(index)
+
+    # Étape 2: intersection des clés, dans l'ordre de la première source
+    index_base = index_sources[0]
+    garde = index_base.notna()
+    for index in index_sources[1:]:
+        garde &= index_base.isin(index)
+    cles_communes = index_base[garde]
+
+    # Étape 3: assembler les colonnes de sortie à partir des positions des clés communes
+    colonnes = {cle: pd.Series(cles_communes, name=cle)}
+    for nom, df, index in zip(noms, data_frames, index_sources):
+        positions = index.get_indexer(cles_communes)
+        for col in df.columns:
+            if col == cle:
+                continue
+            if col in colonnes:
+                raise ValueError(f"Colonne '{col}' présente dans plusieurs sources (dont '{nom}').")
+            colonnes[col] = df[col].take(positions).reset_index(drop=True)
+
+    df_fusionne = pd.DataFrame(colonnes)
+
+    rapport = [
+        {
+            'source': nom,
+            'lignes': len(df),
+            'lignes_perdues': len(df) - len(cles_communes)
+        }
+        for nom, df in zip(noms, data_frames)
+    ]
+
+    return df_fusionne, rapport
+
+
+def afficher_rapport(rapport):
+
+    for ligne in rapport:
+        print(f"  -> {ligne['source']}: {ligne['lignes']} lignes, "
+              f"{ligne['lignes_perdues']} perdues par la jointure")
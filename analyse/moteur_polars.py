@@ -0,0 +1,448 @@
+import contextlib
+import functools
+import io
+import operator
+import os
+import sys
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+import prepare_data
+import calcul_deltas_et_NaN
+import agregation_resultats_elec
+from cache_sources import lire_avec_cache
+from code_commune import depuis_code_insee, depuis_dep_et_commune, CODE_INVALIDE
+from geographie import remapper_communes
+from instrumentation import etape
+
+# BUT: exécuter les trois étapes du pipeline avec Polars (moteur en colonnes, multi-thread)
+# au lieu de pandas, derrière les mêmes points d'entrée:
+#   prepare_data.main, calcul_deltas_et_NaN.clean_and_transform,
+#   agregation_resultats_elec.ajouter_donnees_electorales (argument backend='polars')
+#
+# Chaque étape est décrite comme un plan paresseux (LazyFrame): lectures, filtres
+# (tour 1, appartenance aux blocs), agrégations IRIS et jointures. Le plan n'est exécuté
+# qu'une fois, par collecter(): Polars pousse les projections jusqu'aux lecteurs CSV et
+# répartit lectures, group_by et jointures sur tous les cœurs.
+# Le résultat est rendu en DataFrame pandas, avec les mêmes colonnes, types et lignes
+# que le chemin pandas (voir verifier_parite).
+#
+# Ce qui reste à pandas, pour garantir le même résultat:
+#   - les fichiers Excel (pas de lecteur Excel dans Polars sans dépendance en plus): lus
+#     par cache_sources, avec les mêmes arguments que pandas (même cache Parquet)
+#   - le décodage des codes communes (code_commune) et le passage à la géographie 2020
+#     (geographie), appliqués dans le plan par map_batches
+#
+# Choix du moteur: BACKEND (variable d'environnement PIPELINE_BACKEND), ou argument backend.
+# Usage: python moteur_polars.py [1x|10x|100x]   (parité pandas/Polars sur les données synthétiques)
+
+# PARAMETRES
+
+BACKENDS = ['pandas', 'polars']
+
+BACKEND = os.environ.get('PIPELINE_BACKEND', 'pandas')
+
+# Tolérance relative de verifier_parite (les sommes flottantes peuvent être faites dans un autre ordre)
+RTOL_PARITE = 1e-9
+
+
+
+def choisir_backend(backend=None):
+
+    # backend=None: BACKEND. Vérifie que le moteur demandé est utilisable.
+
+    backend = BACKEND if backend is None else backend
+    if backend not in BACKENDS:
+        print(f"ERREUR: moteur inconnu '{backend}' (attendu: {BACKENDS})"); sys.exit()
+    if backend == 'polars' and pl is None:
+        print("ERREUR: polars est nécessaire pour le moteur 'polars' (pip install polars)"); sys.exit()
+    return backend
+
+
+def collecter(plan, nom):
+
+    # Exécute le plan (une seule fois) et le rend en DataFrame pandas
+
+    with etape(nom) as mesure:
+        try:
+            df = plan.collect().to_pandas()
+        except pl.exceptions.PolarsError as e:
+            # Colonne manquante, clé non unique dans une source, fichier illisible...
+            print(f"ERREUR (moteur Polars, étape '{nom}'): {e}")
+            sys.exit()
+        mesure['lignes_sortie'] = len(df)
+    return df
+
+
+def _verifier_fichier(path):
+
+    if not os.path.exists(path):
+        print(f"ERREUR: Fichier introuvable {path}"); sys.exit()
+
+
+# Clés communes (mêmes fonctions que le chemin pandas)
+
+def _code_insee(col):
+
+    return pl.col(col).map_batches(
+        lambda s: pl.Series(depuis_code_insee(s.to_numpy())), return_dtype=pl.Int32, is_elementwise=True
+    )
+
+
+def _code_dep_et_commune(col_dep, col_com):
+
+    return pl.struct(col_dep, col_com).map_batches(
+        lambda s: pl.Series(depuis_dep_et_commune(
+            s.struct.field(col_dep).to_numpy(), s.struct.field(col_com).to_numpy()
+        )),
+        return_dtype=pl.Int32,
+        is_elementwise=True
+    )
+
+
+def _geographie_2020(col):
+
+    return pl.col(col).map_batches(
+        lambda s: pl.Series(remapper_communes(s.to_numpy())), return_dtype=pl.Int32, is_elementwise=True
+    )
+
+
+def _avec_cle(plan, cle, expression):
+
+    # Clé décodée (int32), lignes illisibles supprimées (voir code_commune.filtrer_invalides)
+
+    return plan.with_columns(expression.alias(cle)).filter(pl.col(cle) != CODE_INVALIDE)
+
+
+def _agreger_par_commune(plan, cle, colonnes):
+
+    # Équivalent de geographie.agreger_par_commune: codes ramenés à la géographie 2020,
+    # sommes en float64 (NaN et valeurs manquantes comptent pour 0, mais une commune sans
+    # aucune valeur renseignée reste manquante), type d'origine gardé, résultat trié par commune
+
+    schema = plan.collect_schema()
+    valeurs = {col: pl.col(col).cast(pl.Float64).fill_nan(None) for col in colonnes}
+    return (
+        plan.with_columns(_geographie_2020(cle).alias(cle))
+        .group_by(cle)
+        .agg([
+            pl.when(valeurs[col].count() > 0).then(valeurs[col].sum()).cast(schema[col]).alias(col)
+            for col in colonnes
+        ])
+        .sort(cle)
+    )
+
+
+def _remapper_medianes(plan, cle, colonnes):
+
+    # Équivalent de geographie.remapper_medianes: une ligne par commune de 2020,
+    # médianes manquantes pour les communes qui reçoivent plusieurs lignes (fusions)
+
+    return (
+        plan.with_columns(_geographie_2020(cle).alias(cle))
+        .group_by(cle, maintain_order=True)
+        .agg([pl.when(pl.len() == 1).then(pl.col(col).first()).alias(col) for col in colonnes])
+    )
+
+
+def _ratio(numerateur, denominateur, nom):
+
+    # En %, en float64 (comme pandas: float32 / float32 promu en float64)
+
+    return (pl.col(numerateur).cast(pl.Float64) / pl.col(denominateur).cast(pl.Float64) * 100).alias(nom)
+
+
+def _sans_manquants(plan):
+
+    # dropna() de pandas: NaN et inf (divisions par zéro) deviennent des valeurs manquantes
+
+    flottants = pl.col(pl.Float32, pl.Float64)
+    return plan.with_columns(
+        pl.when(flottants.is_finite()).then(flottants).otherwise(None)
+    ).drop_nulls()
+
+
+# Étape 1: sources INSEE (voir prepare_data)
+
+def _lire_csv(path, cle, variables, texte=(), **options):
+
+    # Lecture paresseuse: seules la clé et les variables sont lues (projection poussée au lecteur)
+    # texte: variables lues en texte puis converties sans erreur (non numérique -> manquant),
+    # comme pd.to_numeric(errors='coerce') dans les loaders
+
+    _verifier_fichier(path)
+    colonnes = [prepare_data.COLS[cle]] + [prepare_data.COLS[v] for v in variables]
+    schema = {colonnes[0]: pl.String}
+    schema.update({prepare_data.COLS[v]: pl.Float32 for v in variables if v not in texte})
+    # infer_schema=False: les autres colonnes restent en texte (pas d'erreur d'inférence
+    # sur une colonne qu'on ne lit pas, ex: IRIS '2A0010000')
+    return pl.scan_csv(
+        path, separator=';', infer_schema=False, schema_overrides=schema, **options
+    ).select(colonnes).with_columns([
+        pl.col(prepare_data.COLS[v]).str.strip_chars().cast(pl.Float32, strict=False) for v in texte
+    ])
+
+
+def _lire_excel(path, cle, variables, texte=False):
+
+    # Mêmes arguments que les loaders pandas: même entrée dans le cache Parquet.
+    # texte=True: variables lues sans type imposé (texte possible, ex: MED13),
+    # converties comme dans les loaders (pd.to_numeric, puis float32)
+
+    _verifier_fichier(path)
+    df = lire_avec_cache(
+        pd.read_excel, path, header=5,
+        **prepare_data.projection(cle, variables, dtype_variables=None if texte else prepare_data.DTYPE_COMPTAGE)
+    )
+    if texte:
+        for v in variables:
+            col = prepare_data.COLS[v]
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(prepare_data.DTYPE_COMPTAGE)
+    return pl.from_pandas(df).lazy()
+
+
+def plan_fusion_insee(paths):
+
+    # Les six sources, agrégées par commune et jointes sur COM, en un seul plan.
+    # Colonnes et ordre des lignes de prepare_data.main (ordre de Pop 2020, triée par commune).
+
+    COLS = prepare_data.COLS
+    cle_iris, cle_com, cle = COLS['key_iris_com'], COLS['key_com'], COLS['key_final']
+
+    # Population 2020 et 2014 (IRIS)
+    pop = {}
+    for annee, source in [('20', _lire_csv), ('14', _lire_excel)]:
+        variables = [f'pop{annee}_pop_totale', f'pop{annee}_pop15p', f'pop{annee}_cadres']
+        plan = source(paths[f'pop_20{annee}'], 'key_iris_com', variables)
+        plan = _avec_cle(plan, cle_iris, _code_insee(cle_iris))
+        plan = _agreger_par_commune(plan, cle_iris, [COLS[v] for v in variables])
+        pop[annee] = plan.select(
+            pl.col(cle_iris).alias(cle),
+            _ratio(COLS[f'pop{annee}_cadres'], COLS[f'pop{annee}_pop15p'], f'ratio_cadres_{annee}'),
+            pl.col(COLS[f'pop{annee}_pop_totale'])
+        )
+
+    # Diplômes 2020 (IRIS): somme des trois niveaux du supérieur, puis agrégation
+    cols_sup_20 = [COLS['diplo20_sup2'], COLS['diplo20_sup34'], COLS['diplo20_sup5']]
+    diplo20 = _lire_csv(
+        paths['diplo_2020'], 'key_iris_com', ['diplo20_pop15p', 'diplo20_sup2', 'diplo20_sup34', 'diplo20_sup5'],
+        texte=['diplo20_sup2', 'diplo20_sup34', 'diplo20_sup5']
+    )
+    diplo20 = _avec_cle(diplo20, cle_iris, _code_insee(cle_iris))
+    # Somme de gauche à droite, valeurs manquantes à 0: mêmes arrondis float32 que sum(axis=1)
+    # de pandas (pl.sum_horizontal associe les termes autrement)
+    diplo_sup = functools.reduce(operator.add, [pl.col(col).fill_nan(0).fill_null(0) for col in cols_sup_20])
+    diplo20 = diplo20.with_columns(diplo_sup.alias('diplo_sup_20_agg'))
+    diplo20 = _agreger_par_commune(diplo20, cle_iris, [COLS['diplo20_pop15p'], 'diplo_sup_20_agg'])
+    diplo20 = diplo20.select(
+        pl.col(cle_iris).alias(cle), _ratio('diplo_sup_20_agg', COLS['diplo20_pop15p'], 'ratio_sup_20')
+    )
+
+    # Diplômes 2014 (communal, Excel)
+    diplo14 = _lire_excel(paths['diplo_2014'], 'key_com', ['diplo14_pop15p', 'diplo14_sup'])
+    diplo14 = _avec_cle(diplo14, cle_com, _code_insee(cle_com))
+    diplo14 = _agreger_par_commune(diplo14, cle_com, [COLS['diplo14_pop15p'], COLS['diplo14_sup']])
+    diplo14 = diplo14.select(
+        pl.col(cle_com).alias(cle), _ratio(COLS['diplo14_sup'], COLS['diplo14_pop15p'], 'ratio_sup_14')
+    )
+
+    # Revenus 2019 (communal, décimales à la virgule, 's' = secret statistique)
+    rev19 = _lire_csv(paths['rev_2019'], 'key_com', ['rev19_med'], decimal_comma=True, null_values='s')
+    rev19 = _avec_cle(rev19, cle_com, _code_insee(cle_com))
+    rev19 = _remapper_medianes(rev19, cle_com, [COLS['rev19_med']]).rename({cle_com: cle})
+
+    # Revenus 2013 (communal, Excel): MED13 peut contenir du texte (secret statistique)
+    rev13 = _lire_excel(paths['rev_2013'], 'key_com', ['rev13_med'], texte=True)
+    rev13 = _avec_cle(rev13, cle_com, _code_insee(cle_com))
+    rev13 = _remapper_medianes(rev13, cle_com, [COLS['rev13_med']]).rename({cle_com: cle})
+
+    # Jointure interne de toutes les sources, dans l'ordre de Pop 2020 (voir jointures.fusion_multiple)
+    plan = pop['20']
+    for source in [pop['14'], diplo20, diplo14, rev19, rev13]:
+        plan = plan.join(source, on=cle, how='inner', validate='1:1', maintain_order='left')
+    return plan
+
+
+# Étape 2: deltas (voir calcul_deltas_et_NaN)
+
+# Mêmes opérations que calcul_deltas_et_NaN.OPERATIONS_DELTA, en expressions Polars
+OPERATIONS_DELTA = {
+    'difference': lambda recent, ancien: recent - ancien,
+    'log_difference': lambda recent, ancien: recent.log() - ancien.log(),
+    'taux': lambda recent, ancien: (recent / ancien - 1) * 100
+}
+
+
+def plan_deltas(plan, specs=None):
+
+    specs = calcul_deltas_et_NaN.SPECS_DELTAS if specs is None else specs
+    calcul_deltas_et_NaN.verifier_specs(specs)
+    deltas = []
+    for nom, spec in specs.items():
+        recent, ancien = calcul_deltas_et_NaN.colonnes_delta(spec)
+        deltas.append(
+            OPERATIONS_DELTA[spec['type']](
+                pl.col(recent).cast(pl.Float64), pl.col(ancien).cast(pl.Float64)
+            ).alias(nom)
+        )
+    plan = plan.with_columns(deltas)
+    return _sans_manquants(plan.select(calcul_deltas_et_NaN.FINAL_COLS))
+
+
+# Étape 3: données électorales (voir agregation_resultats_elec)
+
+def _lire_election(spec):
+
+    # Colonnes standard ('dep', 'com_simple', 'nuance'...), comme lire_source
+
+    colonnes = spec['colonnes']
+    if spec['format'] == 'excel':
+        _verifier_fichier(spec['path'])
+        df = next(iter(agregation_resultats_elec.lire_source(spec)))
+        df['nuance'] = df['nuance'].astype(str).where(df['nuance'].notna())
+        return pl.from_pandas(df).lazy()
+
+    # CSV: tout en texte, converti dans le plan. Sans en-tête, colonnes prises par position
+    # ('utf8-lossy': les colonnes lues sont en ASCII, les accents des autres colonnes,
+    # en latin1, ne sont pas décodés)
+    _verifier_fichier(spec['path'])
+    entete = spec.get('entete', True)
+    plan = pl.scan_csv(
+        spec['path'],
+        separator=spec.get('sep', ';'),
+        has_header=entete,
+        infer_schema=False,
+        encoding='utf8-lossy'
+    )
+    return plan.select([
+        (pl.col(colonne) if entete else pl.nth(colonne)).alias(champ)
+        for champ, colonne in colonnes.items()
+    ])
+
+
+def plan_election(annee, spec):
+
+    # Scores de tous les blocs d'une année par commune: COM, Score_<bloc>_<annee>
+    # (même calcul que agreger_morceau + process_election)
+
+    agregation_resultats_elec.verifier_source(annee, spec)
+    plan = _lire_election(spec)
+
+    if spec.get('tour') is not None:
+        plan = plan.filter(pl.col('tour').cast(pl.Float64, strict=False) == spec['tour'])
+    plan = _avec_cle(plan, 'COM', _code_dep_et_commune('dep', 'com_simple'))
+
+    def entier(col):
+        return pl.col(col).cast(pl.Float64, strict=False).fill_nan(0).fill_null(0).cast(pl.Int32)
+
+    plan = plan.with_columns(
+        entier('voix').alias('voix'), entier('exp').alias('exp'), _geographie_2020('COM').alias('COM_2020')
+    )
+
+    # Exprimés uniques par bureau, ou premier exprimés rencontré par commune (sur le code
+    # de la source), puis sommés par commune de la géographie 2020
+    if spec['niveau'] == 'bureau':
+        exprimes = plan.select('COM', 'bureau', 'exp', 'COM_2020').unique(
+            subset=['COM', 'bureau', 'exp'], maintain_order=True
+        )
+    else:
+        exprimes = plan.group_by('COM').agg(pl.col('COM_2020').first(), pl.col('exp').first())
+    exprimes = exprimes.group_by('COM_2020').agg(pl.col('exp').sum().alias('Exprim_Total'))
+
+    # Voix de tous les blocs en un seul group_by (appartenance de la nuance au bloc)
+    nuance = pl.col('nuance').cast(pl.String)
+    voix = plan.group_by('COM_2020').agg([
+        pl.when(nuance.is_in(nuances)).then(pl.col('voix')).otherwise(0).cast(pl.Float64).sum().alias(nom)
+        for nom, nuances in spec['blocs'].items()
+    ])
+
+    # Exprimés nuls: score manquant (comme replace(0, np.nan))
+    total = pl.when(pl.col('Exprim_Total') != 0).then(pl.col('Exprim_Total').cast(pl.Float64))
+    return (
+        exprimes.join(voix, on='COM_2020', how='inner')
+        .select(
+            pl.col('COM_2020').alias('COM'),
+            *[(pl.col(nom) / total * 100).alias(f'Score_{nom}_{annee}') for nom in spec['blocs']]
+        )
+        .sort('COM')
+    )
+
+
+def plan_elections(plan_x, sources=None):
+
+    # Régresseurs + scores de toutes les années (jointure interne sur COM), puis dropna
+
+    sources = agregation_resultats_elec.SOURCES_ELECTIONS if sources is None else sources
+    plan = plan_x
+    for annee, spec in sources.items():
+        plan = plan.join(plan_election(annee, spec), on='COM', how='inner', validate='1:1', maintain_order='left')
+    return _sans_manquants(plan)
+
+
+def depuis_pandas(df):
+
+    return pl.from_pandas(df.reset_index(drop=True)).lazy()
+
+
+# Parité avec pandas
+
+def executer(paths, sources=None, backend=None):
+
+    # Les trois étapes en mémoire avec le moteur demandé.
+    # Renvoie {'fusion_insee': ..., 'deltas': ..., 'elections': ...} (DataFrames pandas).
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        master_df = prepare_data.main(n_workers=1, output_path=None, backend=backend, paths=paths)
+        df_model = calcul_deltas_et_NaN.clean_and_transform(master_df, backend=backend)
+        df_final = agregation_resultats_elec.ajouter_donnees_electorales(
+            df_model, sources=sources, backend=backend
+        )
+    return {'fusion_insee': master_df, 'deltas': df_model, 'elections': df_final}
+
+
+def verifier_parite(paths, sources=None, rtol=RTOL_PARITE):
+
+    # Exécute les deux moteurs sur les mêmes fichiers et compare chaque étape
+    # (colonnes, types, lignes, valeurs à rtol près). Renvoie True si tout est identique.
+
+    choisir_backend('polars')
+    resultats = {backend: executer(paths, sources, backend) for backend in BACKENDS}
+
+    identiques = True
+    for nom, df_pandas in resultats['pandas'].items():
+        df_polars = resultats['polars'][nom]
+        try:
+            pd.testing.assert_frame_equal(
+                df_pandas.reset_index(drop=True), df_polars.reset_index(drop=True),
+                check_exact=False, rtol=rtol
+            )
+            print(f"  [{nom}] identique: {df_pandas.shape}")
+        except AssertionError as e:
+            identiques = False
+            print(f"  [{nom}] ÉCART pandas/polars:\n{e}")
+    return identiques
+
+
+if __name__ == "__main__":
+    from generer_donnees_synthetiques import ECHELLES, DOSSIER_SORTIE, chemins_synthetiques, generer
+
+    echelle = sys.argv[1] if len(sys.argv) > 1 else '1x'
+    if echelle not in ECHELLES:
+        print(f"ERREUR: échelle inconnue '{echelle}' (attendu: {list(ECHELLES)})"); sys.exit()
+    dossier = os.path.join(DOSSIER_SORTIE, echelle)
+    chemins = chemins_synthetiques(dossier)
+    if not all(os.path.exists(path) for path in chemins.values()):
+        generer(echelle, dossier)
+
+    sources = {
+        annee: dict(spec, path=chemins[f'elec_{annee}'])
+        for annee, spec in agregation_resultats_elec.SOURCES_ELECTIONS.items()
+    }
+    print(f"--- PARITÉ PANDAS / POLARS ({echelle}) ---")
+    if not verifier_parite(chemins, sources):
+        sys.exit(1)
+    print("--- PARITÉ VÉRIFIÉE ---")
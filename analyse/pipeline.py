@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import sys
+
+import prepare_data
+import calcul_deltas_et_NaN
+import agregation_resultats_elec
+import geographie
+import spatial
+import moteur_polars
+import cache_sources
+import code_commune
+import jointures
+import stockage
+import instrumentation
+
+# BUT: enchaîner les trois scripts (fusion INSEE -> deltas -> données électorales),
+# puis les variables spatialement décalées si la liste d'adjacence est présente (voir spatial),
+# et ne relancer que les étapes dont les entrées ou les paramètres ont changé.
+# Chaque étape déclare ses fichiers d'entrée, ses fichiers de sortie et ses paramètres;
+# son empreinte (contenu des entrées + paramètres + code) est comparée
+# à celle de la dernière exécution réussie, enregistrée dans ETAT_FILE.
+# Le code d'une étape ('code'): son script et les modules dont son résultat dépend
+# (code_commune, geographie, jointures...). Modifier agregation_resultats_elec.py ne
+# relance pas la fusion INSEE. Le moteur (pandas / Polars) fait partie des paramètres.
+#
+# Usage: python pipeline.py          (étapes modifiées uniquement)
+#        python pipeline.py --force  (tout relancer)
+#        python pipeline.py --memoire [--intermediaires]  (tout en mémoire, voir executer_en_memoire)
+#        ... --polars  (moteur Polars au lieu de pandas, voir moteur_polars)
+
+# PARAMETRES
+
+ETAT_FILE = '.pipeline_etat.json'
+
+# Fichiers intermédiaires (les sorties d'une étape sont les entrées de la suivante)
+MASTER_FILE = prepare_data.OUTPUT_FILE
+X_FILE = calcul_deltas_et_NaN.OUTPUT_FILE
+FINAL_FILE = agregation_resultats_elec.OUTPUT_FINAL_FILE
+SPATIAL_FILE = spatial.OUTPUT_FILE
+
+
+
+def fichiers(*modules):
+
+    # Chemins des scripts des modules (pour 'code')
+
+    return [module.__file__ for module in modules]
+
+
+def definir_etapes():
+
+    # Les étapes, dans l'ordre d'exécution
+
+    etapes = [
+        {
+            'nom': 'fusion_insee',
+            'code': fichiers(prepare_data, cache_sources, code_commune, geographie, jointures, moteur_polars),
+            'entrees': list(prepare_data.PATHS.values()) + [
+                path for path in [geographie.PATH_COG_HISTORIQUE] if os.path.exists(path)
+            ],
+            'sorties': [MASTER_FILE],
+            'parametres': {
+                'COLS': prepare_data.COLS,
+                'DATE_GEOGRAPHIE': geographie.DATE_GEOGRAPHIE,
+                'BACKEND': moteur_polars.BACKEND
+            },
+            'executer': lambda: prepare_data.main(output_path=MASTER_FILE)
+        },
+        {
+            'nom': 'deltas',
+            'code': fichiers(calcul_deltas_et_NaN, stockage, code_commune, moteur_polars),
+            'entrees': [MASTER_FILE],
+            'sorties': [X_FILE],
+            'parametres': {
+                'SPECS_DELTAS': calcul_deltas_et_NaN.SPECS_DELTAS,
+                'FINAL_COLS': calcul_deltas_et_NaN.FINAL_COLS,
+                'BACKEND': moteur_polars.BACKEND
+            },
+            'executer': lambda: calcul_deltas_et_NaN.clean_and_transform(MASTER_FILE, X_FILE)
+        },
+        {
+            'nom': 'elections',
+            'code': fichiers(
+                agregation_resultats_elec, cache_sources, code_commune, geographie, jointures, stockage,
+                moteur_polars
+            ),
+            'entrees': [X_FILE] + [
+                spec['path'] for spec in agregation_resultats_elec.SOURCES_ELECTIONS.values()
+            ] + [path for path in [geographie.PATH_COG_HISTORIQUE] if os.path.exists(path)],
+            'sorties': [FINAL_FILE],
+            'parametres': {
+                'SOURCES_ELECTIONS': agregation_resultats_elec.SOURCES_ELECTIONS,
+                'DATE_GEOGRAPHIE': geographie.DATE_GEOGRAPHIE,
+                'BACKEND': moteur_polars.BACKEND
+            },
+            'executer': lambda: agregation_resultats_elec.main(
+                input_x_file=X_FILE, output_file=FINAL_FILE
+            )
+        }
+    ]
+
+    # Variables spatialement décalées: seulement si la liste d'adjacence est fournie
+    if os.path.exists(spatial.PATH_ADJACENCE):
+        etapes.append({
+            'nom': 'spatial',
+            'code': fichiers(spatial, cache_sources, code_commune, geographie, stockage),
+            'entrees': [FINAL_FILE, spatial.PATH_ADJACENCE] + [
+                path for path in [geographie.PATH_COG_HISTORIQUE] if os.path.exists(path)
+            ],
+            'sorties': [SPATIAL_FILE],
+            'parametres': {
+                'COLS_ADJACENCE': spatial.COLS_ADJACENCE,
+                'VARIABLES_DECALEES': spatial.VARIABLES_DECALEES,
+                'DATE_GEOGRAPHIE': geographie.DATE_GEOGRAPHIE
+            },
+            'executer': lambda: spatial.main(input_file=FINAL_FILE, output_file=SPATIAL_FILE)
+        })
+
+    return etapes
+
+
+def charger_etat(path=ETAT_FILE):
+
+    if not os.path.exists(path):
+        return {'etapes': {}, 'fichiers': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def sauver_etat(etat, path=ETAT_FILE):
+
+    with open(path, 'w') as f:
+        json.dump(etat, f, indent=2)
+
+
+def empreinte_memorisee(path, etat):
+
+    # sha256 du fichier, recalculé seulement si sa taille ou sa date de modification
+    # ont changé depuis la dernière fois (hacher les gros CSV IRIS prend du temps)
+
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    connu = etat['fichiers'].get(path)
+    if connu and connu['signature'] == signature:
+        return connu['sha256']
+
+    sha = cache_sources.empreinte_fichier(path)
+    etat['fichiers'][path] = {'signature': signature, 'sha256': sha}
+    return sha
+
+
+def empreinte_etape(etape, etat):
+
+    h = hashlib.sha256()
+    h.update(etape['nom'].encode())
+    for path in etape['code'] + etape['entrees']:
+        h.update(path.encode())
+        h.update(empreinte_memorisee(path, etat).encode())
+    h.update(json.dumps(etape['parametres'], sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def executer_pipeline(forcer=False):
+
+    print("--- PIPELINE INCRÉMENTAL ---")
+    etat = charger_etat()
+
+    for etape in definir_etapes():
+        nom = etape['nom']
+
+        manquantes = [path for path in etape['entrees'] if not os.path.exists(path)]
+        if manquantes:
+            print(f"ERREUR FATALE: entrées manquantes pour l'étape '{nom}': {manquantes}")
+            sys.exit()
+
+        empreinte = empreinte_etape(etape, etat)
+        sorties_presentes = all(os.path.exists(path) for path in etape['sorties'])
+
+        if not forcer and sorties_presentes and etat['etapes'].get(nom) == empreinte:
+            print(f"[{nom}] inchangée, étape sautée.")
+            continue
+
+        print(f"\n[{nom}] exécution...")
+        with instrumentation.etape(nom):
+            etape['executer']()
+
+        # L'empreinte n'est enregistrée qu'après succès (un sys.exit() en cours d'étape
+        # laisse l'ancienne empreinte, l'étape sera relancée la prochaine fois)
+        etat['etapes'][nom] = empreinte
+        sauver_etat(etat)
+
+    sauver_etat(etat)
+    print("\n--- PIPELINE À JOUR ---")
+
+
+def executer_en_memoire(sorties_intermediaires=False, output_file=FINAL_FILE):
+
+    # Les trois étapes enchaînées dans le même processus: les DataFrames passent
+    # d'une étape à l'autre en mémoire (pas d'écriture/relecture des CSV à la virgule).
+    # sorties_intermediaires=True écrit quand même MASTER_FILE et X_FILE, à titre de trace.
+    # Renvoie le DataFrame final (output_file=None: pas d'écriture du tout).
+
+    print("--- PIPELINE EN MÉMOIRE ---")
+    with instrumentation.etape('fusion_insee') as mesure:
+        master_df = prepare_data.main(
+            output_path=MASTER_FILE if sorties_intermediaires else None
+        )
+        mesure['lignes_sortie'] = len(master_df)
+    df_model = calcul_deltas_et_NaN.clean_and_transform(
+        master_df, X_FILE if sorties_intermediaires else None
+    )
+    df_final = agregation_resultats_elec.ajouter_donnees_electorales(df_model, output_file)
+    if not os.path.exists(spatial.PATH_ADJACENCE):
+        return df_final
+    return spatial.ajouter_decalages_spatiaux(
+        df_final, output_file=SPATIAL_FILE if output_file is not None else None
+    )
+
+
+if __name__ == "__main__":
+    instrumentation.demarrer_rapport()
+    if '--polars' in sys.argv:
+        moteur_polars.BACKEND = moteur_polars.choisir_backend('polars')
+    if '--memoire' in sys.argv:
+        executer_en_memoire(sorties_intermediaires='--intermediaires' in sys.argv)
+    else:
+        executer_pipeline(forcer='--force' in sys.argv)
+    instrumentation.ecrire_rapport()
@@ -1,6 +1,15 @@
 import pandas as pd
 import sys
 import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from cache_sources import lire_avec_cache
+from jointures import fusion_multiple, afficher_rapport
+from code_commune import depuis_code_insee, filtrer_invalides, formater_cle
+from geographie import agreger_par_commune, remapper_medianes
+import instrumentation
+from instrumentation import etape, instrumenter
 
 
 PATHS = {
@@ -12,6 +21,12 @@ PATHS = {
     'rev_2013': "/Users/romain/Desktop/Projets DS/Python-project/analyse/data/revenu_2013.xls"
 }
 
+# Fichier fusionné en sortie (lu par calcul_deltas_et_NaN.py)
+OUTPUT_FILE = 'master_data_fusionne.csv'
+
+# Nombre de processus pour charger les sources (1 = chargement en série)
+N_WORKERS = min(len(PATHS), os.cpu_count() or 1)
+
 # df_pop2020 = pd.read_csv(PATHS['pop_2020'], sep=";")
 # print(df_pop2020.head())
 
@@ -65,26 +80,44 @@ COLS = {
     'rev13_med': 'MED13' 
 }
 
+# Type des comptages lus (effectifs IRIS, médianes): float32 divise la mémoire par deux
+DTYPE_COMPTAGE = 'float32'
 
 
-def load_population_data(path_2020, path_2014):
+def projection(cle, variables, dtype_variables=DTYPE_COMPTAGE):
     
-    # Charge les données de Population (Recensement) 2020 et 2014.
-    # Les deux sont au niveau IRIS et doivent être agrégées au niveau Communal.
+    # Arguments usecols/dtype à passer au lecteur, dérivés des noms de COLS:
+    # on ne lit que la clé et les variables utilisées (projection poussée à la lecture)
+    # dtype_variables=None: type laissé au lecteur (colonnes converties après coup)
+    
+    colonnes = [COLS[cle]] + [COLS[v] for v in variables]
+    dtype = {COLS[cle]: str}
+    if dtype_variables is not None:
+        dtype.update({COLS[v]: dtype_variables for v in variables})
+    return {'usecols': colonnes, 'dtype': dtype}
+
+
+
+
+@instrumenter
+def load_pop_2020(path):
+    
+    # Population 2020: niveau IRIS, agrégée au niveau Communal.
     
     print("Chargement Population 2020 (IRIS)...")
     try:
         # Spécifier dtype pour les clés résout les DtypeWarning
-        df_pop20 = pd.read_csv(
-            path_2020, 
+        df_pop20 = lire_avec_cache(
+            pd.read_csv,
+            path, 
             sep=';', 
-            dtype={
-                COLS['key_iris_com']: str,
-                COLS['key_iris_iris']: str
-            }
+            **projection('key_iris_com', ['pop20_pop_totale', 'pop20_pop15p', 'pop20_cadres'])
         )
     except FileNotFoundError:
-        print(f"ERREUR: Fichier introuvable {path_2020}"); sys.exit()
+        print(f"ERREUR: Fichier introuvable {path}"); sys.exit()
+        
+    df_pop20[COLS['key_iris_com']] = depuis_code_insee(df_pop20[COLS['key_iris_com']])
+    df_pop20 = filtrer_invalides(df_pop20, COLS['key_iris_com'], 'Pop 2020')
         
     cols_to_keep_20 = [
         COLS['key_iris_com'], 
@@ -94,25 +127,38 @@ def load_population_data(path_2020, path_2014):
     ]
     df_pop20 = df_pop20[cols_to_keep_20]
     
-    df_pop20_agg = df_pop20.groupby(COLS['key_iris_com']).sum().reset_index()
+    # Somme des IRIS par commune, codes ramenés à la géographie 2020 (voir geographie)
+    df_pop20_agg = agreger_par_commune(df_pop20, COLS['key_iris_com'], cols_to_keep_20[1:])
     df_pop20_agg['ratio_cadres_20'] = (
-        df_pop20_agg[COLS['pop20_cadres']] / df_pop20_agg[COLS['pop20_pop15p']]
+        df_pop20_agg[COLS['pop20_cadres']].astype('float64') / df_pop20_agg[COLS['pop20_pop15p']]
     ) * 100
     df_pop20_final = df_pop20_agg.rename(columns={COLS['key_iris_com']: COLS['key_final']})
     df_pop20_final = df_pop20_final[[COLS['key_final'], 'ratio_cadres_20', COLS['pop20_pop_totale']]]
     print(f"-> Pop 2020 agrégée : {df_pop20_final.shape}")
+    
+    return df_pop20_final
 
 
+@instrumenter
+def load_pop_2014(path):
+    
+    # Population 2014: niveau IRIS, agrégée au niveau Communal.
+    
     print("Chargement Population 2014 (IRIS)...")
     try:
         # L'ANALYSE PREALABLE A MONTRE QUE L'en-tête (les COLS) est à l'index 5 (6ème ligne) 
-        df_pop14 = pd.read_excel(
-            path_2014, 
+        df_pop14 = lire_avec_cache(
+            pd.read_excel,
+            path, 
             header=5, 
-            dtype={COLS['key_iris_com']: str}
+            **projection('key_iris_com', ['pop14_pop_totale', 'pop14_pop15p', 'pop14_cadres'])
         )
     except FileNotFoundError:
-        print(f"ERREUR: Fichier introuvable {path_2014}"); sys.exit()
+        print(f"ERREUR: Fichier introuvable {path}"); sys.exit()
+    except ValueError as e:
+        # usecols: pandas refuse de lire si une colonne demandée n'existe pas
+        print(f"ERREUR: Colonnes manquantes dans Pop 2014 (header=5): {e}")
+        sys.exit()
     except KeyError as e:
         print(f"ERREUR (KeyError) : Une colonne n'a pas été trouvée à header=5.")
         print(f"Assurez-vous que '{COLS['key_iris_com']}' existe.")
@@ -125,44 +171,44 @@ def load_population_data(path_2020, path_2014):
         COLS['pop14_pop15p'], 
         COLS['pop14_cadres']
     ]
-    # Vérification que toutes les colonnes existent 
-    missing_cols = [col for col in cols_to_keep_14 if col not in df_pop14.columns]
-    if missing_cols:
-        print(f"ERREUR: Colonnes manquantes dans Pop 2014: {missing_cols}")
-        print(f"Colonnes disponibles: {df_pop14.columns.tolist()[:15]}...") # Affiche les 15 premières
-        sys.exit()
+    df_pop14[COLS['key_iris_com']] = depuis_code_insee(df_pop14[COLS['key_iris_com']])
+    df_pop14 = filtrer_invalides(df_pop14, COLS['key_iris_com'], 'Pop 2014')
         
     df_pop14 = df_pop14[cols_to_keep_14]
     
-    df_pop14_agg = df_pop14.groupby(COLS['key_iris_com']).sum().reset_index()
+    # Somme des IRIS par commune, codes ramenés à la géographie 2020 (voir geographie)
+    df_pop14_agg = agreger_par_commune(df_pop14, COLS['key_iris_com'], cols_to_keep_14[1:])
     df_pop14_agg['ratio_cadres_14'] = (
-        df_pop14_agg[COLS['pop14_cadres']] / df_pop14_agg[COLS['pop14_pop15p']]
+        df_pop14_agg[COLS['pop14_cadres']].astype('float64') / df_pop14_agg[COLS['pop14_pop15p']]
     ) * 100
     df_pop14_final = df_pop14_agg.rename(columns={COLS['key_iris_com']: COLS['key_final']})
     df_pop14_final = df_pop14_final[[COLS['key_final'], 'ratio_cadres_14', COLS['pop14_pop_totale']]]
     print(f"-> Pop 2014 agrégée : {df_pop14_final.shape}")
     
-    return df_pop20_final, df_pop14_final
+    return df_pop14_final
 
 
-def load_diplome_data(path_2020, path_2014):
+@instrumenter
+def load_diplo_2020(path):
+    
+    # Diplômes 2020: niveau IRIS (agrégation).
     
-    # Charge les données de Diplômes.
-    # 2020 est IRIS (agrégation).
-    # 2014 est Communal.
-   
     print("Chargement Diplômes 2020 (IRIS)...")
+    # Niveaux du supérieur lus sans type imposé: une cellule non numérique y devient NaN
+    # (pd.to_numeric plus bas) au lieu de faire échouer la lecture
+    lecture = projection('key_iris_com', ['diplo20_pop15p', 'diplo20_sup2', 'diplo20_sup34', 'diplo20_sup5'])
+    for v in ['diplo20_sup2', 'diplo20_sup34', 'diplo20_sup5']:
+        del lecture['dtype'][COLS[v]]
     try:
-        df_diplo20 = pd.read_csv(
-            path_2020, 
-            sep=';', 
-            dtype={
-                COLS['key_iris_com']: str,
-                COLS['key_iris_iris']: str
-            }
-        )
+        df_diplo20 = lire_avec_cache(pd.read_csv, path, sep=';', **lecture)
     except FileNotFoundError:
-        print(f"ERREUR: Fichier introuvable {path_2020}"); sys.exit()
+        print(f"ERREUR: Fichier introuvable {path}"); sys.exit()
+    except ValueError as e:
+        print(f"ERREUR: Colonnes manquantes ou non numériques dans Diplo 2020: {e}")
+        sys.exit()
+        
+    df_diplo20[COLS['key_iris_com']] = depuis_code_insee(df_diplo20[COLS['key_iris_com']])
+    df_diplo20 = filtrer_invalides(df_diplo20, COLS['key_iris_com'], 'Diplo 2020')
         
     cols_sup_20 = [
         COLS['diplo20_sup2'], 
@@ -171,7 +217,7 @@ def load_diplome_data(path_2020, path_2014):
     ]
     # S'assurer que les colonnes soient numériques
     for col in cols_sup_20:
-        df_diplo20[col] = pd.to_numeric(df_diplo20[col], errors='coerce')
+        df_diplo20[col] = pd.to_numeric(df_diplo20[col], errors='coerce').astype(DTYPE_COMPTAGE)
 
     df_diplo20['diplo_sup_20_agg'] = df_diplo20[cols_sup_20].sum(axis=1)
     
@@ -182,28 +228,47 @@ def load_diplome_data(path_2020, path_2014):
     ]
     df_diplo20 = df_diplo20[cols_to_keep_20]
     
-    df_diplo20_agg = df_diplo20.groupby(COLS['key_iris_com']).sum().reset_index()
+    # Somme des IRIS par commune, codes ramenés à la géographie 2020 (voir geographie)
+    df_diplo20_agg = agreger_par_commune(df_diplo20, COLS['key_iris_com'], cols_to_keep_20[1:])
     df_diplo20_agg['ratio_sup_20'] = (
-        df_diplo20_agg['diplo_sup_20_agg'] / df_diplo20_agg[COLS['diplo20_pop15p']]
+        df_diplo20_agg['diplo_sup_20_agg'].astype('float64') / df_diplo20_agg[COLS['diplo20_pop15p']]
     ) * 100
     df_diplo20_final = df_diplo20_agg.rename(columns={COLS['key_iris_com']: COLS['key_final']})
     df_diplo20_final = df_diplo20_final[[COLS['key_final'], 'ratio_sup_20']]
     print(f"-> Diplo 2020 agrégé : {df_diplo20_final.shape}")
+    
+    return df_diplo20_final
 
 
+@instrumenter
+def load_diplo_2014(path):
+    
+    # Diplômes 2014: niveau Communal.
+    
     print("Chargement Diplômes 2014 (Communal)...")
     try:
         # L'ANALYSE PREALABLE A MONTRE QUE L'en-tête (les COLS) est à l'index 5 (6ème ligne) 
-        df_diplo14 = pd.read_excel(
-            path_2014, 
+        df_diplo14 = lire_avec_cache(
+            pd.read_excel,
+            path, 
             header=5, 
-            dtype={COLS['key_com']: str}
+            **projection('key_com', ['diplo14_pop15p', 'diplo14_sup'])
         )
     except FileNotFoundError:
-        print(f"ERREUR: Fichier introuvable {path_2014}"); sys.exit()
+        print(f"ERREUR: Fichier introuvable {path}"); sys.exit()
+    except ValueError as e:
+        print(f"ERREUR: Colonnes manquantes dans Diplo 2014 (header=5): {e}")
+        sys.exit()
+        
+    df_diplo14[COLS['key_com']] = depuis_code_insee(df_diplo14[COLS['key_com']])
+    df_diplo14 = filtrer_invalides(df_diplo14, COLS['key_com'], 'Diplo 2014')
         
+    # Communes fusionnées depuis 2014: effectifs sommés sur la commune de 2020
+    df_diplo14 = agreger_par_commune(
+        df_diplo14, COLS['key_com'], [COLS['diplo14_pop15p'], COLS['diplo14_sup']]
+    )
     df_diplo14['ratio_sup_14'] = (
-        df_diplo14[COLS['diplo14_sup']] / df_diplo14[COLS['diplo14_pop15p']]
+        df_diplo14[COLS['diplo14_sup']].astype('float64') / df_diplo14[COLS['diplo14_pop15p']]
     ) * 100
     
     df_diplo14_final = df_diplo14.rename(
@@ -212,106 +277,206 @@ def load_diplome_data(path_2020, path_2014):
     df_diplo14_final = df_diplo14_final[[COLS['key_final'], 'ratio_sup_14']]
     print(f"-> Diplo 2014 chargé : {df_diplo14_final.shape}")
     
-    return df_diplo20_final, df_diplo14_final
+    return df_diplo14_final
 
 
-def load_revenu_data(path_2019, path_2013):
-     
-    # Charge les données de Revenus (Filosofi).
-    # Les deux sont au niveau Communal.
+@instrumenter
+def load_rev_2019(path):
+    
+    # Revenus 2019 (Filosofi): niveau Communal.
     
     print("Chargement Revenus 2019 (Communal)...")
     try:
-        df_rev19 = pd.read_csv(
-            path_2019, 
+        df_rev19 = lire_avec_cache(
+            pd.read_csv,
+            path, 
             sep=';', 
             decimal=',', 
-            na_values='s',
-            dtype={COLS['key_com']: str}
+            na_values='s', # secret statistique
+            **projection('key_com', ['rev19_med'])
         )
     except FileNotFoundError:
-        print(f"ERREUR: Fichier introuvable {path_2019}"); sys.exit()
+        print(f"ERREUR: Fichier introuvable {path}"); sys.exit()
+        
+    df_rev19[COLS['key_com']] = depuis_code_insee(df_rev19[COLS['key_com']])
+    df_rev19 = filtrer_invalides(df_rev19, COLS['key_com'], 'Rev 2019')
         
     df_rev19[COLS['rev19_med']] = pd.to_numeric(
         df_rev19[COLS['rev19_med']], errors='coerce'
     )
+    # Géographie 2020: les médianes ne se somment pas, communes fusionnées mises à NaN
+    df_rev19 = remapper_medianes(df_rev19, COLS['key_com'], [COLS['rev19_med']])
     df_rev19_final = df_rev19.rename(
         columns={COLS['key_com']: COLS['key_final']}
     )
     df_rev19_final = df_rev19_final[[COLS['key_final'], COLS['rev19_med']]]
     print(f"-> Rev 2019 chargé : {df_rev19_final.shape}")
 
+    return df_rev19_final
+
 
+@instrumenter
+def load_rev_2013(path):
+    
+    # Revenus 2013 (Filosofi): niveau Communal.
+    
     print("Chargement Revenus 2013 (Communal)...")
     try:
         # L'ANALYSE PREALABLE A MONTRE QUE L'en-tête (les COLS) est à l'index 5 (6ème ligne) 
-        df_rev13 = pd.read_excel(
-            path_2013, 
+        df_rev13 = lire_avec_cache(
+            pd.read_excel,
+            path, 
             header=5, 
-            dtype={COLS['key_com']: str}
+            # MED13 peut contenir du texte (secret statistique): converti plus bas
+            **projection('key_com', ['rev13_med'], dtype_variables=None)
         )
     except FileNotFoundError:
-        print(f"ERREUR: Fichier introuvable {path_2013}"); sys.exit()
-        
-    # Vérification que la colonne MED13 existe
-    if COLS['rev13_med'] not in df_rev13.columns:
-        print(f"ERREUR: Colonne '{COLS['rev13_med']}' introuvable dans {path_2013}.")
-        print(f"Colonnes disponibles: {df_rev13.columns.tolist()[:15]}...")
+        print(f"ERREUR: Fichier introuvable {path}"); sys.exit()
+    except ValueError as e:
+        # Vérification que la colonne MED13 existe (usecols)
+        print(f"ERREUR: Colonne '{COLS['rev13_med']}' introuvable dans {path}: {e}")
         sys.exit()
 
+    df_rev13[COLS['key_com']] = depuis_code_insee(df_rev13[COLS['key_com']])
+    df_rev13 = filtrer_invalides(df_rev13, COLS['key_com'], 'Rev 2013')
+
     df_rev13[COLS['rev13_med']] = pd.to_numeric(
         df_rev13[COLS['rev13_med']], errors='coerce'
-    )
+    ).astype(DTYPE_COMPTAGE)
+    # Géographie 2020: les médianes ne se somment pas, communes fusionnées mises à NaN
+    df_rev13 = remapper_medianes(df_rev13, COLS['key_com'], [COLS['rev13_med']])
     df_rev13_final = df_rev13.rename(
         columns={COLS['key_com']: COLS['key_final']}
     )
     df_rev13_final = df_rev13_final[[COLS['key_final'], COLS['rev13_med']]]
     print(f"-> Rev 2013 chargé : {df_rev13_final.shape}")
 
-    return df_rev19_final, df_rev13_final
+    return df_rev13_final
+
+
+def load_population_data(path_2020, path_2014):
+    
+    # Charge les données de Population (Recensement) 2020 et 2014.
+    # Les deux sont au niveau IRIS et doivent être agrégées au niveau Communal.
+    
+    return load_pop_2020(path_2020), load_pop_2014(path_2014)
+
+
+def load_diplome_data(path_2020, path_2014):
+    
+    # Charge les données de Diplômes.
+    # 2020 est IRIS (agrégation).
+    # 2014 est Communal.
+   
+    return load_diplo_2020(path_2020), load_diplo_2014(path_2014)
+
+
+def load_revenu_data(path_2019, path_2013):
+     
+    # Charge les données de Revenus (Filosofi).
+    # Les deux sont au niveau Communal.
+    
+    return load_rev_2019(path_2019), load_rev_2013(path_2013)
+
+
+# Une fonction de chargement par source (même clés que PATHS)
+LOADERS = {
+    'pop_2020': load_pop_2020,
+    'pop_2014': load_pop_2014,
+    'diplo_2020': load_diplo_2020,
+    'diplo_2014': load_diplo_2014,
+    'rev_2019': load_rev_2019,
+    'rev_2013': load_rev_2013
+}
+
+
+def load_all_sources_parallel(paths, n_workers=N_WORKERS):
+    
+    # Charge et pré-agrège les six sources en même temps, une par processus.
+    # Les sources sont indépendantes et le parsing (Excel surtout) est limité
+    # par le CPU: le temps total est proche de celui du fichier le plus lent.
+    # Renvoie un dict nom de source -> DataFrame (mêmes résultats qu'en série).
+    
+    print(f"Chargement parallèle de {len(LOADERS)} sources ({n_workers} processus)...")
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        # Chaque processus renvoie aussi ses mesures (voir instrumentation.appel_instrumente)
+        futures = {
+            nom: executor.submit(
+                instrumentation.appel_instrumente, loader, paths[nom],
+                memoire=instrumentation.memoire_suivie()
+            ) 
+            for nom, loader in LOADERS.items()
+        }
+        # .result() relance dans ce processus les erreurs (et sys.exit) des workers
+        sources = {}
+        for nom, future in futures.items():
+            sources[nom], etapes = future.result()
+            instrumentation.ajouter_etapes(etapes)
+        return sources
 
 
 #  FONCTION PRINCIPALE (PIPELINE) 
 
-def main():
-    print("DÉBUT DU PIPELINE DE FUSION ")
+def fusionner_sources(paths, n_workers=N_WORKERS):
+    
+    # Étapes 1 à 3 avec pandas: chargement des six sources, puis jointure sur COM
     
     # Étape 1: Charger toutes les briques de données
-    df_pop20, df_pop14 = load_population_data(PATHS['pop_2020'], PATHS['pop_2014'])
-    df_diplo20, df_diplo14 = load_diplome_data(PATHS['diplo_2020'], PATHS['diplo_2014'])
-    df_rev19, df_rev13 = load_revenu_data(PATHS['rev_2019'], PATHS['rev_2013'])
+    if n_workers > 1:
+        sources = load_all_sources_parallel(paths, n_workers)
+    else:
+        sources = {nom: LOADERS[nom](paths[nom]) for nom in LOADERS}
+    
+    df_pop20, df_pop14 = sources['pop_2020'], sources['pop_2014']
+    df_diplo20, df_diplo14 = sources['diplo_2020'], sources['diplo_2014']
+    df_rev19, df_rev13 = sources['rev_2019'], sources['rev_2013']
     
     # Étape 2: Harmoniser les clés de jointure
     # Toutes les fonctions retournent maintenant un DataFrame
     # avec la clé harmonisée COLS['key_final'] ('COM')
     
     data_frames = [
+        df_pop20,
         df_pop14,
         df_diplo20,
         df_diplo14,
         df_rev19,
         df_rev13
     ]
+    noms = ['Pop 2020', 'Pop 2014', 'Diplo 2020', 'Diplo 2014', 'Rev 2019', 'Rev 2013']
     
-    # Étape 3: Fusionner en série
+    # Étape 3: Fusionner toutes les sources en une seule jointure
     print("\nDÉBUT DES FUSIONS ")
+    print(f"Base de départ (Pop 2020): {df_pop20.shape[0]} communes")
     
-    master_df = df_pop20
-    print(f"Base de départ (Pop 2020): {master_df.shape[0]} communes")
-    
-    for i, df_to_merge in enumerate(data_frames, 1):
-        # Vérification des colonnes avant fusion
-        if COLS['key_final'] not in df_to_merge.columns:
-            print(f"ERREUR: Clé '{COLS['key_final']}' manquante dans le df #{i}.")
+    with etape('fusion_insee', lignes_entree=df_pop20.shape[0]) as mesure:
+        try:
+            master_df, rapport = fusion_multiple(data_frames, COLS['key_final'], noms)
+        except (KeyError, ValueError) as e:
+            print(f"ERREUR: {e}")
             sys.exit()
+        mesure['lignes_sortie'] = len(master_df)
+        mesure['details'] = rapport
+    
+    afficher_rapport(rapport)
+    print(f"  -> Après fusion: {master_df.shape[0]} communes restantes")
+    
+    return master_df
 
-        master_df = pd.merge(
-            master_df, 
-            df_to_merge, 
-            on=COLS['key_final'], 
-            how='inner'
-        )
-        print(f"  -> Après fusion #{i}... {master_df.shape[0]} communes restantes")
+
+def main(n_workers=N_WORKERS, output_path=OUTPUT_FILE, backend=None, paths=PATHS):
+    print("DÉBUT DU PIPELINE DE FUSION ")
+    
+    # backend: 'pandas' ou 'polars' (None: moteur_polars.BACKEND)
+    # (moteur_polars importé ici: il importe ce module, pas d'import circulaire au chargement)
+    import moteur_polars
+    if moteur_polars.choisir_backend(backend) == 'polars':
+        # Chargements, agrégations IRIS et fusions en un seul plan paresseux
+        print("Moteur Polars: sources et fusions en un seul plan...")
+        master_df = moteur_polars.collecter(moteur_polars.plan_fusion_insee(paths), 'fusion_insee')
+        print(f"  -> Après fusion: {master_df.shape[0]} communes restantes")
+    else:
+        master_df = fusionner_sources(paths, n_workers)
         
     if master_df.empty:
         print("ERREUR FATALE: La fusion a produit un DataFrame vide.")
@@ -320,17 +485,23 @@ def main():
         
     print("FUSIONS TERMINÉES")
 
-    # Étape 4: Sauvegarde du fichier fusionné
-    output_path = 'master_data_fusionne.csv'
-    master_df.to_csv(output_path, index=False, sep=';', decimal=',')
+    # Étape 4: Sauvegarde du fichier fusionné (optionnelle: output_path=None
+    # pour passer directement le DataFrame à l'étape suivante)
+    if output_path is not None:
+        # La clé entière est remise au format INSEE ('01004', '2A004') dans le CSV
+        formater_cle(master_df, COLS['key_final']).to_csv(output_path, index=False, sep=';', decimal=',')
+        print(f"Fichier fusionné '{output_path}' créé avec succès.")
     
     print(f"\n--- PIPELINE TERMINÉ ---")
-    print(f"Fichier fusionné '{output_path}' créé avec succès.")
     print(f"Taille finale: {master_df.shape[0]} lignes (communes), {master_df.shape[1]} colonnes")
     print("\nAperçu du master_df:")
     print(master_df.head())
+    
+    return master_df
 
 
 #  EXÉCUTION DU SCRIPT 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    instrumentation.demarrer_rapport()
+    main()
+    instrumentation.ecrire_rapport()
\ No newline at end of file
@@ -0,0 +1,163 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from agregation_resultats_elec import BLOCS_2014, voix_par_bloc, colonnes_voix, calculer_scores
+from code_commune import depuis_dep_et_commune, filtrer_invalides
+
+# BUT: lire les résultats 2014 "par commune" (Data/muni-2014-resultats-com-1000-et-plus-t2.txt)
+# Une ligne par commune, puis un nombre variable de blocs de 11 champs (un par liste).
+# Le notebook dépliait les blocs dans une boucle Python; ici on lit le .txt (latin-1,
+# sans passer par Excel) et on découpe les blocs par un reshape à pas fixe.
+# En une passe: table longue typée, vainqueur par commune et scores des blocs.
+
+PATH_RESULTATS_2014_T2 = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Data', 'muni-2014-resultats-com-1000-et-plus-t2.txt'
+)
+
+# Position des champs (0-based) dans le fichier
+NB_CHAMPS_COMMUNE = 17
+CHAMPS_COMMUNE = {
+    'DEP': 1,
+    'COM_simple': 4,
+    'Libelle': 5,
+    'Exprimes': 14
+}
+
+# Champs d'un bloc candidat, dans l'ordre physique
+CANDIDATE_FIELDS = [
+    'Code Nuance', 'Sexe', 'Nom', 'Prénom', 'Liste',
+    'Sièges / Elu', 'Sièges Secteur', 'Sièges CC', 'Voix', '% Voix/Ins', '% Voix/Exp'
+]
+CHAMPS_BLOC = {
+    'Nuance': CANDIDATE_FIELDS.index('Code Nuance'),
+    'Sieges': CANDIDATE_FIELDS.index('Sièges / Elu'),
+    'Voix': CANDIDATE_FIELDS.index('Voix')
+}
+
+
+
+def compter_blocs(path, encoding='latin-1'):
+
+    # Nombre maximal de blocs candidats sur une ligne (les lignes n'ont pas toutes
+    # la même longueur: read_csv a besoin de connaître la largeur maximale)
+
+    with open(path, encoding=encoding) as f:
+        next(f) # en-tête
+        nb_champs = max(ligne.rstrip('\r\n').rstrip(';').count(';') + 1 for ligne in f)
+    return (nb_champs - NB_CHAMPS_COMMUNE) // len(CANDIDATE_FIELDS)
+
+
+def lire_resultats_listes(path=PATH_RESULTATS_2014_T2, blocs=BLOCS_2014, suffixe='2014_T2'):
+
+    # Renvoie (long_df, communes_df):
+    # - long_df: une ligne par (commune, liste): COM, Secteur, Ordre_candidat, Nuance, Voix, Exprimes, Sieges
+    # - communes_df: une ligne par commune (par secteur pour Paris, Lyon et Marseille):
+    #   COM, Secteur, Libelle, Exprimes, nuance et voix
+    #   de la liste gagnante, et Score_<bloc>_<suffixe> pour chaque bloc
+
+    print(f"Lecture de {path}...")
+    try:
+        nblocks = compter_blocs(path)
+    except FileNotFoundError:
+        print(f"ERREUR FATALE: Fichier introuvable {path}"); sys.exit()
+    if nblocks <= 0:
+        raise ValueError("Aucun bloc candidat complet détecté après 'Code Nuance'.")
+
+    k = len(CANDIDATE_FIELDS)
+    debuts = NB_CHAMPS_COMMUNE + k * np.arange(nblocks)
+
+    # On ne lit que les champs utiles: ceux de la commune + 3 champs par bloc
+    positions = {nom: debuts + decalage for nom, decalage in CHAMPS_BLOC.items()}
+    usecols = list(CHAMPS_COMMUNE.values()) + [int(p) for pos in positions.values() for p in pos]
+    dtypes = {CHAMPS_COMMUNE['DEP']: str, CHAMPS_COMMUNE['COM_simple']: str, CHAMPS_COMMUNE['Libelle']: str}
+    dtypes.update({int(p): str for p in np.concatenate([positions['Nuance'], positions['Sieges']])})
+    dtypes.update({int(p): 'float64' for p in positions['Voix']})
+
+    df = pd.read_csv(
+        path,
+        sep=';',
+        encoding='latin-1',
+        header=None,
+        skiprows=1,
+        names=range(NB_CHAMPS_COMMUNE + k * nblocks + 1), # + le champ vide après le ";" final
+        usecols=usecols,
+        dtype=dtypes,
+        low_memory=False # sinon le parseur C valide usecols sur la largeur du premier morceau
+    )
+
+    # Clé commune (les codes 'ZA'... de l'outre-mer sont écartés, comme dans le notebook).
+    # Paris, Lyon et Marseille sont découpés en secteurs ('055SR01'): la clé est celle
+    # de la commune, le secteur est gardé à part.
+    code_simple = df[CHAMPS_COMMUNE['COM_simple']].str.strip()
+    df['COM'] = depuis_dep_et_commune(df[CHAMPS_COMMUNE['DEP']], code_simple.str[:3])
+    df['Secteur'] = code_simple.str[3:]
+    df = filtrer_invalides(df, 'COM', 'Résultats 2014')
+    n = len(df)
+
+    # Reshape: une matrice (communes x blocs) par champ
+    nuances = df[list(positions['Nuance'])].to_numpy()
+    voix = df[list(positions['Voix'])].to_numpy(dtype='float64')
+    # 'Sièges / Elu' vaut parfois 'Oui' (sections de Polynésie): non numérique -> 0 siège
+    sieges = df[list(positions['Sieges'])].apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+    exprimes = pd.to_numeric(df[CHAMPS_COMMUNE['Exprimes']], errors='coerce').fillna(0).to_numpy()
+
+    presente = pd.notna(nuances) & np.isfinite(voix)
+    voix = np.where(presente, voix, 0)
+
+    # Table longue: on aplatit (commune, bloc) et on garde les blocs remplis
+    lignes, ordre = np.nonzero(presente)
+    long_df = pd.DataFrame({
+        'COM': df['COM'].to_numpy()[lignes],
+        'Secteur': df['Secteur'].to_numpy()[lignes],
+        'Ordre_candidat': (ordre + 1).astype('int16'),
+        'Nuance': pd.Categorical(nuances[lignes, ordre]),
+        'Voix': voix[lignes, ordre].astype('int32'),
+        'Exprimes': exprimes[lignes].astype('int32'),
+        'Sieges': np.nan_to_num(sieges[lignes, ordre]).astype('int16')
+    })
+    print(f"Blocs détectés: {nblocks} — Lignes candidats produites: {len(long_df)}")
+
+    # Vainqueur: la liste avec le plus de voix (les blocs vides valent -1)
+    gagnant = np.where(presente, voix, -1).argmax(axis=1)
+    rangs = np.arange(n)
+
+    # Voix de chaque bloc politique, sur les matrices (communes x blocs)
+    voix_blocs = voix_par_bloc(
+        pd.Series(nuances.ravel()), voix.ravel(), blocs
+    ).reshape(n, nblocks, len(blocs)).sum(axis=1)
+
+    communes_df = pd.DataFrame(voix_blocs, columns=colonnes_voix(blocs))
+    communes_df['COM'] = df['COM'].to_numpy()
+    communes_df['Exprim_Total'] = exprimes
+    scores = calculer_scores(communes_df, blocs, suffixe)
+
+    communes_df = pd.DataFrame({
+        'COM': df['COM'].to_numpy(),
+        'Secteur': df['Secteur'].to_numpy(),
+        'Libelle': df[CHAMPS_COMMUNE['Libelle']].to_numpy(),
+        'Exprimes': exprimes.astype('int32'),
+        'Nuance_Gagnante': pd.Categorical(nuances[rangs, gagnant]),
+        'Voix_Gagnante': voix[rangs, gagnant].astype('int32')
+    })
+    communes_df = pd.concat([communes_df, scores.drop(columns='COM')], axis=1)
+
+    return long_df, communes_df
+
+
+def main():
+
+    long_df, communes_df = lire_resultats_listes()
+
+    print(f"\nNombre de communes : {len(communes_df)}")
+    print(communes_df.head(10))
+
+    # Répartition des vainqueurs par nuance (en pourcentage)
+    counts = communes_df['Nuance_Gagnante'].value_counts(normalize=True) * 100
+    print("\nRépartition des vainqueurs par Code Nuance (2014):")
+    print(counts[counts > 0].round(2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import hashlib
+import os
+import sys
+import numpy as np
+import pandas as pd
+import scipy
+import scipy.sparse as sp
+
+import cache_sources
+import geographie
+import agregation_resultats_elec
+from code_commune import depuis_code_insee, CODE_INVALIDE, DTYPE_CODE
+from stockage import lire_table, ecrire_table, chemin_au_format, format_depuis_arguments
+import instrumentation
+from instrumentation import etape, instrumenter
+
+# BUT: variables spatialement décalées (W·X): pour chaque commune, moyenne d'une variable
+# sur ses communes voisines. Les résidus de Score_Gauche_Ecolo_2020 sont regroupés dans
+# l'espace; ces colonnes ('W_Delta_Cadres'...) peuvent entrer dans SPEC_V2 (voir analyse.py).
+#
+# Voisinage: liste d'arêtes locale (une ligne par couple de communes contiguës, codes INSEE),
+# rapportée à la géographie 2020 (voir geographie) et symétrisée.
+# W est une matrice creuse (CSR), normalisée en ligne (chaque voisin pèse 1 / nb de voisins),
+# construite une fois puis mise en cache en .npz dans le dossier de cache_sources
+# (clé: contenu du fichier d'arêtes + colonnes + géographie cible).
+# Sur un échantillon de communes (lignes supprimées par les dropna), W est restreinte aux
+# communes présentes puis renormalisée: les voisins absents ne comptent pas.
+# Une commune sans voisin dans l'échantillon (île, voisins tous supprimés) a un décalage NaN.
+#
+# Usage: python spatial.py [--feather | --parquet]
+
+# PARAMETRES
+
+PATH_ADJACENCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'adjacence_communes.csv')
+
+# Colonnes de la liste d'arêtes
+COLS_ADJACENCE = {
+    'commune': 'COM',
+    'voisin': 'COM_VOISIN'
+}
+
+# Variables décalées par défaut, et préfixe des colonnes produites ('W_Delta_Cadres')
+VARIABLES_DECALEES = ['Delta_Cadres', 'Score_Bloc_Gauche_2014']
+PREFIXE_DECALAGE = 'W_'
+
+INPUT_FILE = agregation_resultats_elec.OUTPUT_FINAL_FILE
+OUTPUT_FILE = 'data_spatial_pour_regression.csv'
+
+
+
+def lire_aretes(path=PATH_ADJACENCE):
+
+    # Arêtes (communes, voisins): codes entiers de la géographie 2020, sans boucle ni doublon,
+    # dans les deux sens
+
+    try:
+        df = pd.read_csv(path, usecols=list(COLS_ADJACENCE.values()), dtype=str)
+    except FileNotFoundError:
+        print(f"ERREUR FATALE: Fichier d'adjacence introuvable {path}"); sys.exit()
+    except ValueError as e:
+        print(f"ERREUR: colonnes {list(COLS_ADJACENCE.values())} attendues dans {path} ({e})"); sys.exit()
+
+    communes = geographie.remapper_communes(depuis_code_insee(df[COLS_ADJACENCE['commune']]))
+    voisins = geographie.remapper_communes(depuis_code_insee(df[COLS_ADJACENCE['voisin']]))
+    # (après remappage, deux communes fusionnées deviennent une boucle: écartée)
+    garde = (communes != CODE_INVALIDE) & (voisins != CODE_INVALIDE) & (communes != voisins)
+    if (~garde).any():
+        print(f"  {int((~garde).sum())} arêtes écartées (codes illisibles ou communes fusionnées)")
+
+    communes, voisins = communes[garde], voisins[garde]
+    return np.concatenate([communes, voisins]), np.concatenate([voisins, communes])
+
+
+def construire_matrice(communes, voisins):
+
+    # (codes, W): 'codes' trié, W[i, j] = 1 / nb de voisins de codes[i] si codes[j] est voisin
+
+    codes, inverse = np.unique(np.concatenate([communes, voisins]), return_inverse=True)
+    n = len(codes)
+    lignes, colonnes = inverse[:len(communes)], inverse[len(communes):]
+
+    # Conversion en CSR: les doublons sont sommés, on les ramène à 1 (contiguïté binaire)
+    adjacence = sp.csr_matrix((np.ones(len(lignes)), (lignes, colonnes)), shape=(n, n))
+    adjacence.data[:] = 1.0
+    return codes.astype(DTYPE_CODE), normaliser_lignes(adjacence)
+
+
+def normaliser_lignes(matrice):
+
+    # Chaque ligne divisée par sa somme (lignes vides laissées à 0)
+
+    sommes = np.asarray(matrice.sum(axis=1)).ravel()
+    inverses = np.divide(1.0, sommes, out=np.zeros_like(sommes), where=sommes > 0)
+    return sp.csr_matrix(sp.diags(inverses) @ matrice)
+
+
+def cle_matrice(path):
+
+    # Même principe que cache_sources.cle_cache: contenu du fichier + paramètres + versions
+
+    h = hashlib.sha256()
+    h.update(cache_sources.empreinte_fichier(path).encode())
+    h.update(repr(sorted(COLS_ADJACENCE.items())).encode())
+    for table in geographie.table_passage():
+        h.update(table.tobytes())
+    h.update(scipy.__version__.encode())
+    return h.hexdigest()
+
+
+@instrumenter
+def charger_matrice(path=PATH_ADJACENCE):
+
+    # (codes, W) depuis le cache .npz, ou construits depuis la liste d'arêtes et mis en cache
+
+    chemin_cache = os.path.join(cache_sources.CACHE_DIR, f"adjacence_{cle_matrice(path)}.npz")
+
+    if os.path.exists(chemin_cache):
+        try:
+            with np.load(chemin_cache) as npz:
+                codes = npz['codes']
+                poids = sp.csr_matrix(
+                    (npz['data'], npz['indices'], npz['indptr']), shape=(len(codes), len(codes))
+                )
+            os.utime(chemin_cache) # marque le fichier comme récemment utilisé
+            print(f"  (cache) {path}")
+            return codes, poids
+        except Exception as e:
+            print(f"ATTENTION: cache illisible pour {path}, reconstruction de la matrice ({e})")
+
+    print(f"Construction de la matrice de voisinage depuis {path}...")
+    with etape('matrice_voisinage') as mesure:
+        codes, poids = construire_matrice(*lire_aretes(path))
+        mesure['lignes_sortie'] = len(codes)
+        mesure['details'] = {'aretes': int(poids.nnz)}
+    print(f"-> {len(codes)} communes, {poids.nnz} liens de voisinage")
+
+    # Écriture dans un fichier temporaire puis renommage (voir cache_sources)
+    chemin_tmp = f"{chemin_cache}.{os.getpid()}.tmp.npz"
+    try:
+        os.makedirs(cache_sources.CACHE_DIR, exist_ok=True)
+        np.savez(chemin_tmp, codes=codes, data=poids.data, indices=poids.indices, indptr=poids.indptr)
+        os.replace(chemin_tmp, chemin_cache)
+        cache_sources.evincer(cache_sources.CACHE_DIR)
+    except Exception as e:
+        print(f"ATTENTION: matrice de voisinage non mise en cache ({e})")
+        if os.path.exists(chemin_tmp):
+            os.remove(chemin_tmp)
+
+    return codes, poids
+
+
+def restreindre(codes, poids, communes):
+
+    # W restreinte aux 'communes' (dans leur ordre) et renormalisée.
+    # Les communes absentes de la liste d'arêtes n'ont aucun voisin.
+
+    communes = np.asarray(communes, dtype=DTYPE_CODE)
+    positions = np.minimum(np.searchsorted(codes, communes), max(len(codes) - 1, 0))
+    connue = (codes[positions] == communes) if len(codes) else np.zeros(len(communes), dtype=bool)
+
+    # Sélecteur creux (communes x codes): une ligne par commune connue
+    lignes = np.flatnonzero(connue)
+    selecteur = sp.csr_matrix(
+        (np.ones(len(lignes)), (lignes, positions[connue])), shape=(len(communes), len(codes))
+    )
+    return normaliser_lignes(selecteur @ poids @ selecteur.T)
+
+
+@instrumenter
+def ajouter_decalages_spatiaux(df, colonnes=VARIABLES_DECALEES, path=PATH_ADJACENCE, output_file=None):
+
+    # Ajoute une colonne PREFIXE_DECALAGE + col (W·X) par variable de 'colonnes'.
+    # Un seul produit matrice creuse x matrice dense (communes x variables) pour toutes les colonnes.
+    # Renvoie un nouveau DataFrame (df n'est pas modifié).
+
+    manquantes = [col for col in colonnes if col not in df.columns]
+    if manquantes:
+        print(f"ERREUR: colonnes absentes du fichier final: {manquantes}")
+        sys.exit()
+
+    codes, poids = charger_matrice(path)
+
+    with etape('decalages_spatiaux', lignes_entree=len(df)) as mesure:
+        w = restreindre(codes, poids, df['COM'].to_numpy())
+        valeurs = df[colonnes].to_numpy(dtype='float64', na_value=np.nan)
+        decalages = w @ valeurs
+
+        isolees = np.diff(w.indptr) == 0
+        decalages[isolees] = np.nan
+
+        df_spatial = df.assign(**{
+            f"{PREFIXE_DECALAGE}{col}": decalages[:, j] for j, col in enumerate(colonnes)
+        })
+        mesure['lignes_sortie'] = len(df_spatial)
+        mesure['details'] = {'communes_sans_voisin': int(isolees.sum())}
+
+    if isolees.any():
+        print(f"ATTENTION: {int(isolees.sum())} communes sans voisin dans l'échantillon (décalage NaN)")
+    print(f"-> Variables décalées ajoutées: {[PREFIXE_DECALAGE + col for col in colonnes]}")
+
+    if output_file is not None:
+        # CSV, feather ou parquet selon l'extension (voir stockage)
+        ecrire_table(df_spatial, output_file)
+        print(f"Le fichier '{output_file}' est prêt pour l'analyse.")
+
+    return df_spatial
+
+
+def main(input_file=INPUT_FILE, output_file=OUTPUT_FILE, colonnes=VARIABLES_DECALEES):
+
+    print("--- VARIABLES SPATIALEMENT DÉCALÉES ---")
+    print(f"Chargement de {input_file}...")
+    try:
+        df = lire_table(input_file)
+    except FileNotFoundError:
+        print(f"ERREUR FATALE: Fichier '{input_file}' introuvable.")
+        print("Lancez d'abord agregation_resultats_elec.py.")
+        sys.exit()
+
+    return ajouter_decalages_spatiaux(df, colonnes, output_file=output_file)
+
+
+if __name__ == "__main__":
+    instrumentation.demarrer_rapport()
+    main(output_file=chemin_au_format(OUTPUT_FILE, format_depuis_arguments(sys.argv)))
+    instrumentation.ecrire_rapport()
@@ -0,0 +1,274 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import prepare_data
+import agregation_resultats_elec
+from stockage import format_fichier
+import instrumentation
+from instrumentation import etape, instrumenter
+
+# BUT: statistiques descriptives (summary(df) de regression.R, isnull().sum() du nettoyage)
+# de n'importe quelle sortie du pipeline, sans charger le fichier en mémoire.
+# Le fichier est lu par blocs de TAILLE_BLOC lignes; chaque bloc est résumé par un
+# "accumulateur" (par colonne: effectif, NaN, inf, moyenne, somme des carrés des écarts,
+# min, max, échantillon), et les accumulateurs se fusionnent deux à deux:
+#   - moyenne et variance: formules de Welford / Chan (pas de somme des carrés brute,
+#     pas de perte de précision quand la moyenne est grande devant l'écart-type)
+#   - quantiles approchés: échantillon "bottom-k" (les TAILLE_ECHANTILLON lignes de plus petit
+#     hachage): un échantillon uniforme, identique quel que soit le découpage en blocs,
+#     exact tant que la colonne a moins de TAILLE_ECHANTILLON valeurs
+# Les colonnes sont réparties en groupes, un groupe par processus.
+#
+# Usage: python statistiques.py [fichier ...]  (par défaut: les sorties du pipeline présentes)
+
+# PARAMETRES
+
+FICHIERS = [prepare_data.OUTPUT_FILE, agregation_resultats_elec.OUTPUT_FINAL_FILE]
+
+# Colonnes non résumées (clé commune)
+COLONNES_EXCLUES = ['COM']
+
+TAILLE_BLOC = 200_000
+TAILLE_ECHANTILLON = 10_000
+QUANTILES = [0.01, 0.25, 0.5, 0.75, 0.99]
+
+GRAINE = 0
+
+N_WORKERS = os.cpu_count() or 1
+
+
+
+def colonnes_numeriques(path):
+
+    # Colonnes numériques du fichier, sans le lire en entier (schéma, ou premières lignes du CSV)
+
+    format_entree = format_fichier(path)
+    if format_entree == 'csv':
+        apercu = pd.read_csv(path, sep=';', decimal=',', nrows=1000)
+        colonnes = [col for col in apercu.columns if pd.api.types.is_numeric_dtype(apercu[col])]
+    else:
+        import pyarrow.types as types
+        if format_entree == 'parquet':
+            from pyarrow import parquet
+            schema = parquet.read_schema(path)
+        else:
+            from pyarrow import ipc, memory_map
+            schema = ipc.open_file(memory_map(path)).schema
+        colonnes = [champ.name for champ in schema if types.is_integer(champ.type) or types.is_floating(champ.type)]
+    return [col for col in colonnes if col not in COLONNES_EXCLUES]
+
+
+def lire_blocs(path, colonnes, taille_bloc=TAILLE_BLOC):
+
+    # Blocs (lignes x colonnes) du fichier en float64, seules les 'colonnes' sont lues.
+    # Texte non numérique dans une colonne du CSV ('s' du secret statistique...) -> NaN
+
+    format_entree = format_fichier(path)
+    if format_entree == 'csv':
+        for bloc in pd.read_csv(path, sep=';', decimal=',', usecols=colonnes, chunksize=taille_bloc):
+            for col in colonnes:
+                if not pd.api.types.is_numeric_dtype(bloc[col]):
+                    bloc[col] = pd.to_numeric(bloc[col].str.replace(',', '.', regex=False), errors='coerce')
+            yield _en_float(bloc, colonnes)
+    elif format_entree == 'parquet':
+        from pyarrow import parquet
+        for lot in parquet.ParquetFile(path).iter_batches(batch_size=taille_bloc, columns=colonnes):
+            yield _en_float(lot.to_pandas(), colonnes)
+    else:
+        # Feather non compressé: les lots sont lus en mémoire projetée
+        from pyarrow import ipc, memory_map
+        lecteur = ipc.open_file(memory_map(path))
+        for i in range(lecteur.num_record_batches):
+            lot = lecteur.get_batch(i).select(colonnes)
+            for debut in range(0, lot.num_rows, taille_bloc):
+                yield _en_float(lot.slice(debut, taille_bloc).to_pandas(), colonnes)
+
+
+def _en_float(df, colonnes):
+
+    return np.column_stack([df[col].to_numpy(dtype='float64', na_value=np.nan) for col in colonnes])
+
+
+def _hacher(lignes, graine=GRAINE):
+
+    # Hachage 64 bits des numéros de ligne (splitmix64): le rang de hachage d'une ligne
+    # ne dépend pas du bloc où elle tombe
+
+    z = (lignes.astype('uint64') + np.uint64(graine)) * np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _plus_petits(hachages, valeurs, k):
+
+    # Les k couples de plus petit hachage
+
+    if len(hachages) <= k:
+        return hachages, valeurs
+    garde = np.argpartition(hachages, k - 1)[:k]
+    return hachages[garde], valeurs[garde]
+
+
+def resumer_bloc(valeurs, premiere_ligne, colonnes, taille_echantillon=TAILLE_ECHANTILLON):
+
+    # Accumulateur d'un bloc (lignes x colonnes, float64) dont la première ligne a le
+    # numéro 'premiere_ligne' dans le fichier. Toutes les colonnes en une passe vectorisée.
+
+    finies = np.isfinite(valeurs)
+    n = finies.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        moyenne = np.where(finies, valeurs, 0).sum(axis=0) / n
+        m2 = np.where(finies, valeurs - moyenne, 0)
+    hachages = _hacher(np.arange(premiere_ligne, premiere_ligne + len(valeurs)))
+
+    return {
+        'colonnes': list(colonnes),
+        'lignes': len(valeurs),
+        'n': n,
+        'nan': np.isnan(valeurs).sum(axis=0),
+        'inf': np.isinf(valeurs).sum(axis=0),
+        'moyenne': np.where(n > 0, moyenne, 0.0),
+        'm2': (m2 * m2).sum(axis=0),
+        'min': np.where(finies, valeurs, np.inf).min(axis=0, initial=np.inf),
+        'max': np.where(finies, valeurs, -np.inf).max(axis=0, initial=-np.inf),
+        'echantillon': [
+            _plus_petits(hachages[finies[:, j]], valeurs[finies[:, j], j], taille_echantillon)
+            for j in range(len(colonnes))
+        ]
+    }
+
+
+def fusionner(a, b, taille_echantillon=TAILLE_ECHANTILLON):
+
+    # Accumulateur de la réunion des lignes de a et de b (mêmes colonnes).
+    # Moyenne et somme des carrés des écarts: formule de Chan et al.
+
+    if a['colonnes'] != b['colonnes']:
+        raise ValueError("Accumulateurs sur des colonnes différentes.")
+
+    n = a['n'] + b['n']
+    delta = b['moyenne'] - a['moyenne']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        part_b = np.where(n > 0, b['n'] / n, 0.0)
+    return {
+        'colonnes': a['colonnes'],
+        'lignes': a['lignes'] + b['lignes'],
+        'n': n,
+        'nan': a['nan'] + b['nan'],
+        'inf': a['inf'] + b['inf'],
+        'moyenne': a['moyenne'] + delta * part_b,
+        'm2': a['m2'] + b['m2'] + delta**2 * a['n'] * part_b,
+        'min': np.minimum(a['min'], b['min']),
+        'max': np.maximum(a['max'], b['max']),
+        'echantillon': [
+            _plus_petits(np.concatenate([ha, hb]), np.concatenate([va, vb]), taille_echantillon)
+            for (ha, va), (hb, vb) in zip(a['echantillon'], b['echantillon'])
+        ]
+    }
+
+
+def accumuler_fichier(path, colonnes, taille_bloc=TAILLE_BLOC, taille_echantillon=TAILLE_ECHANTILLON):
+
+    # Accumulateur des 'colonnes' sur tout le fichier, bloc par bloc (mémoire bornée
+    # par la taille d'un bloc et de l'échantillon)
+
+    with etape('statistiques_colonnes') as mesure:
+        acc = None
+        for valeurs in lire_blocs(path, colonnes, taille_bloc):
+            premiere_ligne = 0 if acc is None else acc['lignes']
+            bloc = resumer_bloc(valeurs, premiere_ligne, colonnes, taille_echantillon)
+            acc = bloc if acc is None else fusionner(acc, bloc, taille_echantillon)
+        if acc is None: # fichier vide
+            acc = resumer_bloc(np.empty((0, len(colonnes))), 0, colonnes, taille_echantillon)
+        mesure['lignes_entree'] = acc['lignes']
+    return acc
+
+
+def rapport(acc, quantiles=QUANTILES):
+
+    # Tableau des statistiques: une ligne par colonne (comme describe().T)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = np.where(acc['n'] > 1, acc['m2'] / (acc['n'] - 1), np.nan)
+    vide = acc['n'] == 0
+    tableau = pd.DataFrame({
+        'n': acc['n'],
+        'nan': acc['nan'],
+        'inf': acc['inf'],
+        'moyenne': np.where(vide, np.nan, acc['moyenne']),
+        'ecart_type': np.sqrt(variance),
+        'variance': variance,
+        'min': np.where(vide, np.nan, acc['min']),
+        'max': np.where(vide, np.nan, acc['max'])
+    }, index=pd.Index(acc['colonnes'], name='variable'))
+
+    # Quantiles approchés, depuis l'échantillon (exacts si n <= TAILLE_ECHANTILLON)
+    for q in quantiles:
+        tableau[f"q{q * 100:g}"] = [
+            np.quantile(valeurs, q) if len(valeurs) else np.nan for _, valeurs in acc['echantillon']
+        ]
+    return tableau[['n', 'nan', 'inf', 'moyenne', 'ecart_type', 'variance', 'min',
+                    *[f"q{q * 100:g}" for q in quantiles], 'max']]
+
+
+@instrumenter
+def statistiques_fichier(path, colonnes=None, n_workers=N_WORKERS, taille_bloc=TAILLE_BLOC,
+                         taille_echantillon=TAILLE_ECHANTILLON, quantiles=QUANTILES):
+
+    # Statistiques descriptives des colonnes numériques de path (toutes par défaut).
+    # Colonnes réparties en n_workers groupes, un processus par groupe.
+
+    if not os.path.exists(path):
+        print(f"ERREUR FATALE: Fichier '{path}' introuvable.")
+        sys.exit()
+    colonnes = colonnes_numeriques(path) if colonnes is None else list(colonnes)
+    if not colonnes:
+        print(f"ATTENTION: aucune colonne numérique dans {path}.")
+        return rapport(resumer_bloc(np.empty((0, 0)), 0, []), quantiles)
+
+    groupes = [list(groupe) for groupe in np.array_split(colonnes, min(n_workers, len(colonnes)))]
+    if len(groupes) > 1:
+        print(f"Statistiques de {path}: {len(colonnes)} colonnes, {len(groupes)} processus...")
+        with ProcessPoolExecutor(max_workers=len(groupes)) as executor:
+            futures = [
+                executor.submit(
+                    instrumentation.appel_instrumente, accumuler_fichier, path, groupe,
+                    taille_bloc, taille_echantillon, memoire=instrumentation.memoire_suivie()
+                )
+                for groupe in groupes
+            ]
+            accumulateurs = []
+            for future in futures:
+                acc, etapes = future.result()
+                accumulateurs.append(acc)
+                instrumentation.ajouter_etapes(etapes)
+    else:
+        print(f"Statistiques de {path}: {len(colonnes)} colonnes...")
+        accumulateurs = [accumuler_fichier(path, colonnes, taille_bloc, taille_echantillon)]
+
+    return pd.concat([rapport(acc, quantiles) for acc in accumulateurs])
+
+
+def main(fichiers=None):
+
+    fichiers = [path for path in FICHIERS if os.path.exists(path)] if fichiers is None else fichiers
+    if not fichiers:
+        print(f"ERREUR: aucun fichier à résumer (sorties du pipeline attendues: {FICHIERS}).")
+        sys.exit()
+
+    tableaux = {}
+    for path in fichiers:
+        print(f"\n--- STATISTIQUES DESCRIPTIVES: {path} ---")
+        tableaux[path] = statistiques_fichier(path)
+        print(tableaux[path].to_string(float_format=lambda x: f"{x:.4g}"))
+    return tableaux
+
+
+if __name__ == "__main__":
+    instrumentation.demarrer_rapport()
+    main(sys.argv[1:] or None)
+    instrumentation.ecrire_rapport()
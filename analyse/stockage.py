@@ -0,0 +1,104 @@
+import os
+import sys
+import pandas as pd
+
+from code_commune import depuis_code_insee, filtrer_invalides, formater_cle, DTYPE_CODE
+
+# BUT: écrire et relire les tables du pipeline dans un format binaire en colonnes,
+# en plus du CSV historique (';' et décimales à la virgule).
+#   - 'feather' (Arrow IPC, non compressé): lisible en mémoire projetée (memory map),
+#     sans parsing, depuis Python (pyarrow) comme depuis R (arrow::read_feather)
+#   - 'parquet': compressé, plus petit sur disque, à relire entièrement
+# Les colonnes gardent leur type. La clé COM est écrite au format INSEE ('01004', '2A004')
+# dans les CSV, et reparsée à la lecture; dans les formats binaires elle reste l'entier
+# int32 de code_commune (pas de reparsing à la lecture; depuis R: dep = COM %/% 1000, avec
+# 201/202 pour la Corse). Les anciens fichiers binaires à clé texte restent lisibles.
+# Le format est déduit de l'extension du fichier.
+
+# PARAMETRES
+
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.parquet': 'parquet'
+}
+
+
+
+def format_fichier(path):
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        print(f"ERREUR: extension '{extension}' non prise en charge ({list(EXTENSIONS)}): {path}")
+        sys.exit()
+    return EXTENSIONS[extension]
+
+
+def chemin_au_format(path, format_sortie):
+
+    # 'data.csv', 'feather' -> 'data.feather'
+
+    return os.path.splitext(path)[0] + '.' + format_sortie
+
+
+def format_depuis_arguments(arguments, defaut='csv'):
+
+    # Option de ligne de commande '--feather' / '--parquet' (csv par défaut)
+
+    for format_sortie in set(EXTENSIONS.values()):
+        if f'--{format_sortie}' in arguments:
+            return format_sortie
+    return defaut
+
+
+def ecrire_table(df, path, cle='COM'):
+
+    # Écrit df dans path, au format de l'extension: clé remise au format INSEE pour le CSV,
+    # entier int32 pour feather/parquet
+
+    format_sortie = format_fichier(path)
+
+    if format_sortie == 'csv':
+        df = formater_cle(df, cle).reset_index(drop=True)
+        df.to_csv(path, index=False, sep=';', decimal=',')
+        return
+
+    df = df.reset_index(drop=True)
+    df[cle] = df[cle].astype(DTYPE_CODE)
+
+    try:
+        if format_sortie == 'feather':
+            # Non compressé: condition pour la lecture en mémoire projetée
+            df.to_feather(path, compression='uncompressed')
+        else:
+            df.to_parquet(path, index=False)
+    except ImportError as e:
+        print(f"ERREUR: pyarrow est nécessaire pour écrire {path} ({e})")
+        sys.exit()
+
+
+def lire_table(path, cle='COM'):
+
+    # Relit une table écrite par ecrire_table (clé COM entière).
+    # Feather: le fichier est projeté en mémoire et converti avec split_blocks=True
+    # (pas de consolidation en blocs 2D): les colonnes numériques sans valeur manquante
+    # sont des vues en lecture seule sur le fichier projeté, sans copie; les autres
+    # (valeurs manquantes, texte, catégories) sont copiées à la conversion.
+
+    format_sortie = format_fichier(path)
+    try:
+        if format_sortie == 'csv':
+            df = pd.read_csv(path, sep=';', decimal=',', dtype={cle: str})
+        elif format_sortie == 'feather':
+            from pyarrow import feather
+            df = feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+        else:
+            df = pd.read_parquet(path)
+    except ImportError as e:
+        print(f"ERREUR: pyarrow est nécessaire pour lire {path} ({e})")
+        sys.exit()
+
+    if not pd.api.types.is_integer_dtype(df[cle]):
+        df[cle] = depuis_code_insee(df[cle])
+    return filtrer_invalides(df, cle, path)
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import analyse
+
+
+def donnees(n=3000, graine=0):
+
+    rng = np.random.default_rng(graine)
+    com = rng.choice(np.arange(1000, 96000), n, replace=False).astype('int32')
+    df = pd.DataFrame({
+        'COM': com,
+        'Delta_Cadres': rng.random(n),
+        'Delta_Diplomes': rng.random(n),
+        'MED13': rng.random(n) * 2e4,
+        'P20_POP': np.exp(rng.normal(7, 1.5, n)),
+        'Score_Bloc_Gauche_2014': rng.random(n)
+    })
+    df['Score_Gauche_Ecolo_2020'] = (
+        0.3 * df['Delta_Cadres'] + com // 1000 / 50 + rng.normal(0, 0.1, n) * (1 + df['Delta_Diplomes'])
+    )
+    return df
+
+
+@pytest.mark.parametrize('cov_robuste', ['HC1', 'HC3'])
+def test_effets_fixes_identiques_aux_indicatrices(cov_robuste):
+
+    df = donnees()
+    resultats = analyse.regression(df, cov_robuste=cov_robuste, effets_fixes=('departement',), cache=False)
+
+    y, X, _, garde = analyse.matrice_plan(df)
+    indicatrices = pd.get_dummies(df['COM'].to_numpy()[garde] // 1000).to_numpy(dtype='float64')
+    reference = analyse.mco(y, np.column_stack([X[:, 1:], indicatrices]), cov_robuste=cov_robuste)
+
+    k = X.shape[1] - 1
+    np.testing.assert_allclose(resultats['coefficients'], reference['coefficients'][:k], rtol=1e-8)
+    np.testing.assert_allclose(resultats['se_robuste'], reference['se_robuste'][:k], rtol=1e-7)
+    assert resultats['ddl'] == reference['ddl']
+
+
+def test_hc3_refuse_plusieurs_effets_fixes():
+
+    with pytest.raises(ValueError):
+        analyse.regression(donnees(), cov_robuste='HC3', effets_fixes=('departement', 'taille'), cache=False)
+
+
+def test_departement_a_y_constant_signale(recwarn):
+
+    df = donnees()
+    constant = df['COM'] // 1000 == df['COM'].iloc[0] // 1000
+    df.loc[constant, 'Score_Gauche_Ecolo_2020'] = 0.37
+    resultats = analyse.regression_par_departement(df, min_communes=5, cache=False)
+
+    dep = analyse.vers_code_departement(analyse.departement(df['COM'].to_numpy()[:1]))[0]
+    lignes = resultats[resultats['departement'] == dep]
+    assert (lignes['statut'] == 'y_constant').all()
+    assert lignes['t_robuste'].isna().all()
+    assert (resultats.loc[resultats['departement'] != dep, 'statut'] != 'y_constant').all()
+    assert not [w for w in recwarn if issubclass(w.category, RuntimeWarning)]
+
+
+@pytest.mark.parametrize('cov_robuste', ['HC0', 'HC1', 'HC3'])
+def test_par_departement_identique_a_mco(cov_robuste):
+
+    df = donnees()
+    tableau = analyse.regression_par_departement(df, min_communes=5, cache=False, cov_robuste=cov_robuste)
+
+    dep = analyse.departement(df['COM'].to_numpy()[:1])
+    sous_df = df[analyse.departement(df['COM'].to_numpy()) == dep[0]]
+    y, X, noms, _ = analyse.matrice_plan(sous_df)
+    reference = analyse.mco(y, X, noms, cov_robuste=cov_robuste)
+
+    lignes = tableau[tableau['departement'] == analyse.vers_code_departement(dep)[0]]
+    np.testing.assert_allclose(lignes['coef'], reference['coefficients'], rtol=1e-8)
+    np.testing.assert_allclose(lignes[f'se_{cov_robuste}'], reference['se_robuste'], rtol=1e-7)
+
+
+def test_p_valeurs_student():
+
+    # Valeurs de R: 2 * pt(-2, 5) et 2 * pt(-2, 1e6)
+    np.testing.assert_allclose(analyse.p_valeurs(2.0, 5), [0.1019395], rtol=1e-6)
+    np.testing.assert_allclose(analyse.p_valeurs([-2.0], 10**6), [0.04550035], rtol=1e-5)
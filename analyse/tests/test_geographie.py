@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from geographie import agreger_par_commune
+
+# Table de passage vide: codes gardés tels quels
+TABLE_IDENTITE = (np.array([], dtype='int32'), np.array([], dtype='int32'))
+
+
+def diplomes():
+
+    # Commune 1001: une seule ligne, diplômés manquants. Commune 1002: une ligne sur deux manquante.
+    return pd.DataFrame({
+        'COM': np.array([1001, 1002, 1002, 1003], dtype='int32'),
+        'P14_NSCOL15P': np.array([100, 50, 70, 30], dtype='float32'),
+        'P14_NSCOL15P_SUP': np.array([np.nan, 10, np.nan, 5], dtype='float32')
+    })
+
+
+def test_commune_sans_valeur_reste_manquante():
+
+    df = diplomes()
+    agg = agreger_par_commune(df, 'COM', ['P14_NSCOL15P', 'P14_NSCOL15P_SUP'], TABLE_IDENTITE)
+    attendu = (
+        df.groupby('COM', as_index=False)[['P14_NSCOL15P', 'P14_NSCOL15P_SUP']].sum(min_count=1)
+    )
+    pd.testing.assert_frame_equal(agg, attendu)
+    assert np.isnan(agg.loc[agg['COM'] == 1001, 'P14_NSCOL15P_SUP']).all()
+    assert agg['P14_NSCOL15P_SUP'].dtype == 'float32'
+
+
+def test_moteur_polars_identique():
+
+    pl = pytest.importorskip('polars')
+    import moteur_polars
+
+    df = diplomes()
+    attendu = agreger_par_commune(df, 'COM', ['P14_NSCOL15P', 'P14_NSCOL15P_SUP'])
+    resultat = moteur_polars._agreger_par_commune(
+        pl.from_pandas(df).lazy(), 'COM', ['P14_NSCOL15P', 'P14_NSCOL15P_SUP']
+    ).collect().to_pandas()
+    pd.testing.assert_frame_equal(resultat, attendu)
+
+
+def test_medianes_des_communes_fusionnees_inconnues():
+
+    from geographie import remapper_medianes
+
+    # 1002 et 1003 fusionnent dans 1002 (chef-lieu qui garde son code); 1004 change de code (-> 1005)
+    table = (np.array([1003, 1004], dtype='int32'), np.array([1002, 1005], dtype='int32'))
+    df = pd.DataFrame({
+        'COM': np.array([1001, 1002, 1003, 1004], dtype='int32'),
+        'MED13': np.array([20000, 21000, 19000, 18000], dtype='float32')
+    })
+    resultat = remapper_medianes(df, 'COM', ['MED13'], table)
+    assert resultat['COM'].tolist() == [1001, 1002, 1005]
+    assert resultat['MED13'].tolist()[0] == 20000
+    assert np.isnan(resultat['MED13'].iloc[1])
+    assert resultat['MED13'].iloc[2] == 18000
+
+
+def test_medianes_moteur_polars_identique(monkeypatch):
+
+    pl = pytest.importorskip('polars')
+    import geographie
+    import moteur_polars
+
+    table = (np.array([1003, 1004], dtype='int32'), np.array([1002, 1005], dtype='int32'))
+    monkeypatch.setattr(geographie, 'table_passage', lambda *args: table)
+    df = pd.DataFrame({
+        'COM': np.array([1001, 1002, 1003, 1004], dtype='int32'),
+        'MED13': np.array([20000, 21000, 19000, 18000], dtype='float32')
+    })
+    attendu = geographie.remapper_medianes(df, 'COM', ['MED13'])
+    resultat = moteur_polars._remapper_medianes(pl.from_pandas(df).lazy(), 'COM', ['MED13']).collect()
+    pd.testing.assert_frame_equal(resultat.to_pandas().sort_values('COM', ignore_index=True), attendu)
+
+
+@pytest.mark.parametrize('niveau', ['bureau', 'commune'])
+def test_elections_communes_fusionnees(monkeypatch, tmp_path, niveau):
+
+    import geographie
+    import agregation_resultats_elec
+
+    # 1002 fusionne dans 1001 (même numéro de bureau dans les deux communes)
+    table = (np.array([1002], dtype='int32'), np.array([1001], dtype='int32'))
+    monkeypatch.setattr(geographie, 'table_passage', lambda *args: table)
+    path = tmp_path / 'elections.csv'
+    path.write_text(
+        "dep;com;bureau;nuance;voix;exp\n"
+        "01;001;0001;LSOC;30;100\n"
+        "01;001;0001;LUMP;70;100\n"
+        "01;002;0001;LSOC;10;50\n"
+        "01;002;0001;LUMP;40;50\n"
+        "01;003;0001;LSOC;5;20\n"
+    )
+    colonnes = {'dep': 'dep', 'com_simple': 'com', 'nuance': 'nuance', 'voix': 'voix', 'exp': 'exp'}
+    if niveau == 'bureau':
+        colonnes['bureau'] = 'bureau'
+    spec = {
+        'path': str(path), 'format': 'csv', 'sep': ';', 'colonnes': colonnes,
+        'tour': None, 'niveau': niveau, 'blocs': {'Gauche': ['LSOC']}
+    }
+
+    scores = agregation_resultats_elec.process_election(2014, spec)
+    assert scores['COM'].tolist() == [1001, 1003]
+    np.testing.assert_allclose(scores['Score_Gauche_2014'], [40 / 150 * 100, 25])
+
+    pl = pytest.importorskip('polars')
+    import moteur_polars
+    resultat = moteur_polars.plan_election(2014, spec).collect().to_pandas()
+    pd.testing.assert_frame_equal(resultat, scores)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+import analyse
+import inference
+from test_analyse import donnees
+
+
+@pytest.mark.parametrize('cov_robuste', ['HC0', 'HC1', 'HC3'])
+def test_t_robuste_identique_a_mco(cov_robuste):
+
+    y, X, noms, _ = analyse.matrice_plan(donnees())
+    projection = np.linalg.solve(X.T @ X, X.T)
+    correction = inference._correction_hc(X, projection, cov_robuste)
+    reference = analyse.mco(y, X, noms, cov_robuste)['t_robuste'].to_numpy()
+    t = [inference._t_robuste(X, y, projection, correction, j) for j in range(X.shape[1])]
+    np.testing.assert_allclose(t, reference, rtol=1e-8)
+
+
+def test_permutation_reproductible():
+
+    df = donnees(n=500)
+    a = inference.test_permutation(df, n_permutations=50, n_workers=1)
+    b = inference.test_permutation(df, n_permutations=50, n_workers=2)
+    assert a.equals(b)
+    # Delta_Cadres a un effet (0.3): t observé dépassé par aucune permutation
+    assert a.loc[a['variable'] == 'Delta_Cadres', 'p_permutation'].iloc[0] == 1 / 51
@@ -0,0 +1,37 @@
+import os
+import numpy as np
+import pytest
+
+DONNEES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'donnees')
+
+# Petites sources au format des vraies (quelques dizaines de communes, Corse comprise)
+PATHS = {
+    'pop_2020': 'pop20.csv',
+    'pop_2014': 'pop14.xlsx',
+    'diplo_2020': 'dip20.csv',
+    'diplo_2014': 'dip14.xlsx',
+    'rev_2019': 'rev19.csv',
+    'rev_2013': 'rev13.xlsx'
+}
+ELECTIONS = {2020: 'e20.xlsx', 2014: 'e14.txt'}
+
+
+def test_parite_pandas_polars(monkeypatch, tmp_path):
+
+    pytest.importorskip('polars')
+    import agregation_resultats_elec
+    import cache_sources
+    import geographie
+    import moteur_polars
+
+    # 1004 absorbée par 1003, 1006 change de code: sommes et médianes passent par le remappage
+    table = (np.array([1004, 1006], dtype='int32'), np.array([1003, 1040], dtype='int32'))
+    monkeypatch.setattr(geographie, 'table_passage', lambda *args: table)
+    monkeypatch.setattr(cache_sources, 'CACHE_DIR', str(tmp_path))
+
+    paths = {nom: os.path.join(DONNEES, fichier) for nom, fichier in PATHS.items()}
+    sources = {
+        annee: dict(spec, path=os.path.join(DONNEES, ELECTIONS[annee]))
+        for annee, spec in agregation_resultats_elec.SOURCES_ELECTIONS.items()
+    }
+    assert moteur_polars.verifier_parite(paths, sources)